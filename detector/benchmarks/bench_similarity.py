@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark for similarity pruning in DuplicatedCode.
+
+Runs the DuplicatedCode detector over generated methods (or the given
+Python files) with pruning off and on, and reports the time, how many
+pairs each bound rejected, and whether the findings are identical. With
+--processes, the pruned run is repeated with method pairs compared in a
+process pool.
+
+Usage:
+    python benchmarks/bench_similarity.py --methods 150
+    python benchmarks/bench_similarity.py --methods 2000 --short --processes 4 --no-full
+    python benchmarks/bench_similarity.py ../smelly_code/ /usr/lib/python3.12/json/
+"""
+
+import argparse
+import ast
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from main import CodeSmellDetector
+from detectors.duplicated_code import DuplicatedCodeDetector
+
+
+def generate_module(method_count, seed, short=False):
+    """Build a module of methods of varied size, some of them near-copies."""
+    rng = random.Random(seed)
+    max_steps = 6 if short else 30
+    templates = []
+    lines = ["class Generated:"]
+    for index in range(method_count):
+        if templates and rng.random() < 0.1:
+            # Near-copy of an earlier method with one constant changed
+            body = [line.replace('1', '2', 1) for line in rng.choice(templates)]
+        else:
+            body = []
+            for step in range(rng.randint(3, max_steps)):
+                name = rng.choice(['total', 'count', 'value', 'result', 'offset'])
+                body.append(f"        {name} = {name} * {rng.randint(1, 99)} + self.{name}_{step}")
+            body.append("        return total")
+            templates.append(body)
+        lines.append(f"    def method_{index}(self, total, count, value, result, offset):")
+        lines.extend(body)
+        lines.append("")
+    return '\n'.join(lines) + '\n'
+
+
+def load_sources(paths, seed, method_count, short):
+    """Sources to run on: the given files, or one generated module."""
+    if not paths:
+        return [('generated.py', generate_module(method_count, seed, short))]
+    detector = CodeSmellDetector()
+    sources = []
+    for filepath in detector._collect_python_files(paths):
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                sources.append((filepath, f.read()))
+        except (OSError, UnicodeDecodeError):
+            continue
+    return sources
+
+
+def run(detector, trees, stats):
+    """Run the detector over every tree; return wall time and findings."""
+    start = time.perf_counter()
+    findings = []
+    for filepath, tree, source_code in trees:
+        findings.append(detector.detect_cached(tree, source_code, filepath, None, stats=stats))
+    return time.perf_counter() - start, findings
+
+
+def main():
+    """Run the benchmark and print unpruned vs pruned timings and counts."""
+    parser = argparse.ArgumentParser(description='Benchmark DuplicatedCode similarity pruning')
+    parser.add_argument('paths', nargs='*', help='Python files or directories (default: generated)')
+    parser.add_argument('--methods', type=int, default=150, help='Methods in the generated module')
+    parser.add_argument('--short', action='store_true',
+                        help='Generate methods of 5-8 lines (many methods stay affordable)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the generated module')
+    parser.add_argument('--min-lines', type=int, default=5, help='DuplicatedCode min_lines')
+    parser.add_argument('--threshold', type=float, default=0.85,
+                        help='DuplicatedCode similarity_threshold')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='Also time pruned comparison in this many processes')
+    parser.add_argument('--no-full', action='store_true',
+                        help='Skip the unpruned run (slow on large inputs)')
+    args = parser.parse_args()
+
+    trees = []
+    for filepath, source_code in load_sources(args.paths, args.seed, args.methods, args.short):
+        try:
+            trees.append((filepath, ast.parse(source_code), source_code))
+        except SyntaxError:
+            continue
+
+    config = {'min_lines': args.min_lines, 'similarity_threshold': args.threshold,
+              'parallel_min_methods': float('inf')}
+    pruned = DuplicatedCodeDetector(config)
+    pruned_stats = DuplicatedCodeDetector.new_comparison_stats()
+    pruned_time, pruned_findings = run(pruned, trees, pruned_stats)
+
+    pairs = pruned_stats['pairs']
+    rejected = pruned_stats['pruned_length'] + pruned_stats['pruned_counts']
+    print(f"Files: {len(trees)}, pairs considered: {pairs}, threshold: {args.threshold}")
+    if not args.no_full:
+        full = DuplicatedCodeDetector(config)
+        full.prune = False
+        full_stats = DuplicatedCodeDetector.new_comparison_stats()
+        full_time, full_findings = run(full, trees, full_stats)
+        print(f"Unpruned: {full_time:.3f}s ({full_stats['compared']} ratio() calls)")
+    print(f"Pruned:   {pruned_time:.3f}s ({pruned_stats['compared']} ratio() calls)")
+    print(f"  Rejected by length bound:          {pruned_stats['pruned_length']}")
+    print(f"  Rejected by character-count bound: {pruned_stats['pruned_counts']}")
+    print(f"  Pruned pairs: {rejected} ({rejected / pairs:.1%})" if pairs else "  Pruned pairs: 0")
+    if not args.no_full:
+        print(f"Speedup:  {full_time / pruned_time:.2f}x" if pruned_time else "Speedup:  n/a")
+        print(f"Identical findings: {full_findings == pruned_findings}")
+
+    if args.processes > 1:
+        parallel = DuplicatedCodeDetector(dict(config, parallel_min_methods=0,
+                                               processes=args.processes))
+        parallel_time, parallel_findings = run(parallel, trees, None)
+        print(f"Parallel: {parallel_time:.3f}s ({args.processes} processes, "
+              f"{pruned_time / parallel_time:.2f}x vs pruned)")
+        print(f"Identical findings (parallel): {pruned_findings == parallel_findings}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark for thread-parallel detection on one large file.
+
+Generates a synthetic module, then times analyze_source() with detectors
+run one after another and with --threads style parallel detection. The
+speedup only shows on free-threaded CPython builds; with the GIL enabled
+the threaded mode is expected to be about as fast as the serial one.
+
+Usage:
+    python benchmarks/bench_threads.py --lines 50000 --threads 4
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from main import CodeSmellDetector
+
+
+def generate_module(line_count):
+    """Build a generated-looking module with roughly line_count lines."""
+    lines = []
+    index = 0
+    while len(lines) < line_count:
+        lines.append(f"class Generated{index}:")
+        for method in range(12):
+            lines.append(f"    def handler_{method}(self, a, b, c, d, e, f):")
+            lines.append(f"        total = a * {index + 3} + b.value + c.value")
+            lines.append(f"        total += d.compute(e) + f.scale * {method + 7}")
+            lines.append(f"        if total > {index * 10 + 100}:")
+            lines.append(f"            return other.process(total, other.factor)")
+            lines.append(f"        return total")
+            lines.append("")
+        index += 1
+    return '\n'.join(lines) + '\n'
+
+
+def time_run(detector, source_code, repeat):
+    """Return the best wall time of analyze_source() over several runs."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = detector.analyze_source(source_code, 'generated.py')
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    """Run the benchmark and print serial vs threaded timings."""
+    parser = argparse.ArgumentParser(description='Benchmark thread-parallel detection')
+    parser.add_argument('--lines', type=int, default=50000, help='Size of the generated module')
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1,
+                        help='Detector threads for the parallel run')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per mode (best is kept)')
+    parser.add_argument('--exclude', default='DuplicatedCode',
+                        help='Detectors to leave out (default: DuplicatedCode, which is '
+                             'quadratic in the number of methods)')
+    args = parser.parse_args()
+    
+    source_code = generate_module(args.lines)
+    exclude = [d.strip() for d in args.exclude.split(',') if d.strip()]
+    config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config.yaml')
+    
+    serial = CodeSmellDetector(config_path)
+    serial.initialize_detectors(exclude=exclude)
+    threaded = CodeSmellDetector(config_path, detector_threads=args.threads)
+    threaded.initialize_detectors(exclude=exclude)
+    
+    serial_time, serial_result = time_run(serial, source_code, args.repeat)
+    threaded_time, threaded_result = time_run(threaded, source_code, args.repeat)
+    threaded.close()
+    
+    gil_check = getattr(sys, '_is_gil_enabled', None)
+    gil_enabled = gil_check() if gil_check else True
+    
+    print(f"Python {sys.version.split()[0]} (GIL {'enabled' if gil_enabled else 'disabled'})")
+    print(f"Module: {source_code.count(chr(10))} lines, "
+          f"detectors: {', '.join(serial.active_detectors)}")
+    print(f"Serial:   {serial_time:.3f}s")
+    print(f"Threaded: {threaded_time:.3f}s ({args.threads} threads)")
+    print(f"Speedup:  {serial_time / threaded_time:.2f}x")
+    print(f"Identical findings: {serial_result['smells'] == threaded_result['smells']}")
+
+
+if __name__ == '__main__':
+    main()
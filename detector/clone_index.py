@@ -0,0 +1,356 @@
+"""
+Persistent index of method fingerprints for cross-file duplicate detection.
+"""
+
+import ast
+import hashlib
+import os
+import sqlite3
+import zlib
+from difflib import SequenceMatcher
+
+from sources import read_source_file
+
+
+DEFAULT_INDEX_PATH = '.smell_clones.db'
+
+# Bump when extraction, normalization or fingerprinting changes
+INDEX_VERSION = '1'
+
+SHINGLE_TOKENS = 5
+WINNOW_WINDOW = 4
+
+# Fingerprints shared by more methods than this say nothing about clones
+MAX_POSTINGS = 500
+
+# Candidates verified with SequenceMatcher per method
+MAX_CANDIDATES = 20
+
+# Share of a method's fingerprints a candidate must also have
+MIN_SHARED = 0.2
+
+
+def normalize(code):
+    """Collapse whitespace, the same normalization DuplicatedCode compares."""
+    return ' '.join(code.split())
+
+
+def text_hash(text):
+    """Hash of normalized text."""
+    return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+
+
+def extract_methods(source_code, min_lines, filename='<unknown>'):
+    """
+    Find the functions and methods worth indexing.
+
+    Args:
+        source_code: Python source code as string
+        min_lines: Shortest function, in lines, to include
+        filename: Name used in syntax errors
+
+    Returns:
+        List of dictionaries with name, start, end and normalized text
+
+    Raises:
+        SyntaxError: If the source does not parse
+    """
+    tree = ast.parse(source_code, filename=filename)
+    lines = source_code.split('\n')
+    methods = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            if node.end_lineno - node.lineno + 1 < min_lines:
+                continue
+            methods.append({
+                'name': node.name,
+                'start': node.lineno,
+                'end': node.end_lineno,
+                'text': normalize('\n'.join(lines[node.lineno - 1:node.end_lineno]))
+            })
+    return methods
+
+
+def fingerprints(text):
+    """
+    Winnowed token-shingle hashes of normalized text.
+
+    Every run of SHINGLE_TOKENS tokens is hashed, and the smallest hash of
+    each WINNOW_WINDOW consecutive shingles is kept, so any shared span of
+    SHINGLE_TOKENS + WINNOW_WINDOW - 1 tokens yields a shared fingerprint.
+
+    Returns:
+        Set of signed 64-bit integers (SQLite's integer range)
+    """
+    tokens = text.split(' ')
+    count = max(len(tokens) - SHINGLE_TOKENS + 1, 1)
+    hashes = []
+    for i in range(count):
+        shingle = ' '.join(tokens[i:i + SHINGLE_TOKENS]).encode('utf-8', 'surrogatepass')
+        digest = hashlib.blake2b(shingle, digest_size=8).digest()
+        hashes.append(int.from_bytes(digest, 'big', signed=True))
+
+    if len(hashes) <= WINNOW_WINDOW:
+        return {min(hashes)}
+    selected = set()
+    for i in range(len(hashes) - WINNOW_WINDOW + 1):
+        selected.add(min(hashes[i:i + WINNOW_WINDOW]))
+    return selected
+
+
+class CloneIndex:
+    """
+    SQLite index of method fingerprints, updated one file at a time.
+
+    Adding, replacing or removing a file touches only that file's rows,
+    and a query reads only the posting lists of the queried file's own
+    fingerprints. The settings the index was built with are stored in it;
+    opening it with different settings raises ValueError.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH, min_lines=5, similarity_threshold=0.85):
+        """
+        Open or create an index.
+
+        Args:
+            path: SQLite database file
+            min_lines: Shortest function, in lines, to index
+            similarity_threshold: Similarity reported as duplication
+        """
+        self.path = path
+        self.min_lines = min_lines
+        self.similarity_threshold = similarity_threshold
+        self.connection = sqlite3.connect(path)
+        self._create_schema()
+
+    def _create_schema(self):
+        with self.connection:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS files (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT UNIQUE NOT NULL,
+                    content_hash TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS methods (
+                    id INTEGER PRIMARY KEY,
+                    file_id INTEGER NOT NULL,
+                    name TEXT NOT NULL,
+                    line_start INTEGER NOT NULL,
+                    line_end INTEGER NOT NULL,
+                    text_hash TEXT NOT NULL,
+                    fingerprint_count INTEGER NOT NULL,
+                    text BLOB NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS methods_file ON methods (file_id);
+                CREATE INDEX IF NOT EXISTS methods_text_hash ON methods (text_hash);
+                CREATE TABLE IF NOT EXISTS fingerprints (
+                    hash INTEGER NOT NULL,
+                    method_id INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS fingerprints_hash ON fingerprints (hash);
+                CREATE INDEX IF NOT EXISTS fingerprints_method ON fingerprints (method_id);
+                CREATE TABLE IF NOT EXISTS postings (
+                    hash INTEGER PRIMARY KEY,
+                    count INTEGER NOT NULL
+                );
+            """)
+
+        settings = {'version': INDEX_VERSION, 'min_lines': str(self.min_lines)}
+        stored = dict(self.connection.execute("SELECT key, value FROM meta"))
+        if not stored:
+            with self.connection:
+                self.connection.executemany("INSERT INTO meta (key, value) VALUES (?, ?)",
+                                            settings.items())
+        elif stored != settings:
+            raise ValueError(f"Clone index '{self.path}' was built with other settings "
+                             f"({stored}); delete it to rebuild")
+
+    def close(self):
+        """Close the database."""
+        self.connection.close()
+
+    def files(self):
+        """Paths of all indexed files."""
+        return [row[0] for row in self.connection.execute("SELECT path FROM files ORDER BY path")]
+
+    def _file_id(self, path):
+        row = self.connection.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()
+        return row[0] if row else None
+
+    def replace_file(self, path, source_code):
+        """
+        Index a file, replacing what was stored for it before.
+
+        Args:
+            path: Path the file is stored under
+            source_code: Python source code as string
+
+        Returns:
+            True if the index changed, False if the file was unchanged
+
+        Raises:
+            SyntaxError: If the source does not parse (the index is unchanged)
+        """
+        content_hash = text_hash(source_code)
+        row = self.connection.execute("SELECT content_hash FROM files WHERE path = ?",
+                                      (path,)).fetchone()
+        if row and row[0] == content_hash:
+            return False
+
+        methods = extract_methods(source_code, self.min_lines, path)
+        with self.connection:
+            self._delete_file(path)
+            cursor = self.connection.execute(
+                "INSERT INTO files (path, content_hash) VALUES (?, ?)", (path, content_hash))
+            file_id = cursor.lastrowid
+            for method in methods:
+                hashes = fingerprints(method['text'])
+                cursor = self.connection.execute(
+                    "INSERT INTO methods (file_id, name, line_start, line_end, text_hash, "
+                    "fingerprint_count, text) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (file_id, method['name'], method['start'], method['end'],
+                     text_hash(method['text']), len(hashes),
+                     zlib.compress(method['text'].encode('utf-8', 'surrogatepass'))))
+                method_id = cursor.lastrowid
+                self.connection.executemany(
+                    "INSERT INTO fingerprints (hash, method_id) VALUES (?, ?)",
+                    ((h, method_id) for h in hashes))
+                self.connection.executemany(
+                    "INSERT INTO postings (hash, count) VALUES (?, 1) "
+                    "ON CONFLICT (hash) DO UPDATE SET count = count + 1",
+                    ((h,) for h in hashes))
+        return True
+
+    def remove_file(self, path):
+        """
+        Drop a file from the index.
+
+        Returns:
+            True if the file was indexed
+        """
+        with self.connection:
+            return self._delete_file(path)
+
+    def _delete_file(self, path):
+        """Delete a file's rows; the caller holds the transaction."""
+        file_id = self._file_id(path)
+        if file_id is None:
+            return False
+        method_ids = [row[0] for row in self.connection.execute(
+            "SELECT id FROM methods WHERE file_id = ?", (file_id,))]
+        for method_id in method_ids:
+            self.connection.execute(
+                "UPDATE postings SET count = count - 1 WHERE hash IN "
+                "(SELECT hash FROM fingerprints WHERE method_id = ?)", (method_id,))
+            self.connection.execute("DELETE FROM fingerprints WHERE method_id = ?", (method_id,))
+        self.connection.execute("DELETE FROM postings WHERE count <= 0")
+        self.connection.execute("DELETE FROM methods WHERE file_id = ?", (file_id,))
+        self.connection.execute("DELETE FROM files WHERE id = ?", (file_id,))
+        return True
+
+    def query(self, path, source_code):
+        """
+        Find methods of other indexed files that duplicate methods of a file.
+
+        The file's own stored entries are ignored, so a changed file can be
+        checked before (or instead of) replacing it in the index.
+
+        Args:
+            path: Path of the file being checked
+            source_code: Its current source code
+
+        Returns:
+            List of smell dictionaries in the DuplicatedCode format, each
+            with a 'duplicate_of' location
+
+        Raises:
+            SyntaxError: If the source does not parse
+        """
+        own_id = self._file_id(path) or -1
+        smells = []
+        for method in extract_methods(source_code, self.min_lines, path):
+            for other, similarity in self._matches(method, own_id):
+                description = (f"Duplicated code between method '{method['name']}' "
+                               f"(lines {method['start']}-{method['end']}) and "
+                               f"'{other['name']}' in {other['file']} "
+                               f"(lines {other['line_start']}-{other['line_end']}). "
+                               f"Similarity: {similarity:.2%}")
+                smells.append({
+                    'smell_type': 'DuplicatedCode',
+                    'file': path,
+                    'line_start': method['start'],
+                    'line_end': method['end'],
+                    'description': description,
+                    'severity': 'medium',
+                    'duplicate_of': other
+                })
+        return smells
+
+    def _matches(self, method, own_id):
+        """Candidates sharing fingerprints with a method, verified by similarity."""
+        hashes = fingerprints(method['text'])
+        own_hash = text_hash(method['text'])
+        minimum = max(1, int(len(hashes) * MIN_SHARED))
+
+        self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS query_hashes (hash INTEGER PRIMARY KEY)")
+        self.connection.execute("DELETE FROM query_hashes")
+        self.connection.executemany("INSERT OR IGNORE INTO query_hashes (hash) VALUES (?)",
+                                    ((h,) for h in hashes))
+        # CROSS JOIN fixes the join order: start from the query's own
+        # hashes and follow the index, never scan the fingerprint table
+        rows = self.connection.execute("""
+            SELECT m.id, COUNT(*) AS shared
+            FROM query_hashes q
+            CROSS JOIN postings p ON p.hash = q.hash AND p.count <= ?
+            CROSS JOIN fingerprints f ON f.hash = q.hash
+            CROSS JOIN methods m ON m.id = f.method_id
+            WHERE m.file_id != ?
+            GROUP BY m.id
+            HAVING shared >= ?
+            ORDER BY shared DESC, m.id
+            LIMIT ?
+        """, (MAX_POSTINGS, own_id, minimum, MAX_CANDIDATES)).fetchall()
+        candidate_ids = [row[0] for row in rows]
+
+        # Identical text always matches, even through stop fingerprints
+        candidate_ids += [row[0] for row in self.connection.execute(
+            "SELECT id FROM methods WHERE text_hash = ? AND file_id != ? LIMIT ?",
+            (own_hash, own_id, MAX_CANDIDATES)) if row[0] not in candidate_ids]
+
+        matches = []
+        for method_id in candidate_ids:
+            name, line_start, line_end, other_hash, text, path = self.connection.execute("""
+                SELECT m.name, m.line_start, m.line_end, m.text_hash, m.text, f.path
+                FROM methods m JOIN files f ON f.id = m.file_id WHERE m.id = ?
+            """, (method_id,)).fetchone()
+            if other_hash == own_hash:
+                similarity = 1.0
+            else:
+                other_text = zlib.decompress(text).decode('utf-8', 'surrogatepass')
+                similarity = SequenceMatcher(None, method['text'], other_text).ratio()
+            if similarity >= self.similarity_threshold:
+                matches.append(({'file': path, 'name': name, 'line_start': line_start,
+                                 'line_end': line_end}, similarity))
+        matches.sort(key=lambda match: (match[0]['file'], match[0]['line_start']))
+        return matches
+
+
+def read_source(path):
+    """
+    Read a file for indexing, decoded like the detector reads it.
+
+    Errors are returned instead of raised.
+    """
+    try:
+        return read_source_file(path), None
+    except (OSError, SyntaxError, UnicodeDecodeError) as e:
+        return None, str(e)
+
+
+def index_key(path):
+    """Normalized path a file is stored under."""
+    return os.path.normpath(path)
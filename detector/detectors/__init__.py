@@ -1,11 +1,23 @@
-"""Code smell detectors package."""
+"""Code smell detectors package.
 
-from .long_method import LongMethodDetector
-from .god_class import GodClassDetector
-from .duplicated_code import DuplicatedCodeDetector
-from .large_parameter_list import LargeParameterListDetector
-from .magic_numbers import MagicNumbersDetector
-from .feature_envy import FeatureEnvyDetector
+Detector modules are imported on first attribute access (PEP 562), so
+importing the package costs nothing for detectors that are never used.
+"""
+
+import importlib
+
+from .registry import DetectorRegistry, DetectorSpec, ENTRY_POINT_GROUP
+
+_DETECTOR_MODULES = {
+    'BaseDetector': '.base_detector',
+    'LongMethodDetector': '.long_method',
+    'GodClassDetector': '.god_class',
+    'DuplicatedCodeDetector': '.duplicated_code',
+    'LargeParameterListDetector': '.large_parameter_list',
+    'MagicNumbersDetector': '.magic_numbers',
+    'FeatureEnvyDetector': '.feature_envy',
+    'RuleEngineDetector': '.rules'
+}
 
 __all__ = [
     'LongMethodDetector',
@@ -13,6 +25,22 @@ __all__ = [
     'DuplicatedCodeDetector',
     'LargeParameterListDetector',
     'MagicNumbersDetector',
-    'FeatureEnvyDetector'
+    'FeatureEnvyDetector',
+    'RuleEngineDetector',
+    'DetectorRegistry',
+    'DetectorSpec',
+    'ENTRY_POINT_GROUP'
 ]
 
+
+def __getattr__(name):
+    if name in _DETECTOR_MODULES:
+        module = importlib.import_module(_DETECTOR_MODULES[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
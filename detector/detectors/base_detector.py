@@ -6,6 +6,15 @@ from abc import ABC, abstractmethod
 class BaseDetector(ABC):
     """Abstract base class for code smell detectors."""
     
+    # 'definition' detectors only look inside one top-level statement at a
+    # time, so their findings can be cached per function or class.
+    # 'module' detectors compare definitions with each other.
+    scope = 'definition'
+    
+    # Node types detect() reports findings at. Findings assembled from
+    # cached chunks are put back in the ast.walk() order of these nodes.
+    reported_nodes = ()
+    
     def __init__(self, config):
         """Initialize detector with configuration."""
         self.config = config
@@ -15,6 +24,10 @@ class BaseDetector(ABC):
         """
         Detect code smells in the given AST and source code.
         
+        One detector instance may be called from several threads at once
+        on the same tree, so implementations must keep all per-call state
+        in locals and never mutate the tree or self.
+        
         Args:
             ast_tree: AST tree of the source code
             source_code: Raw source code as string
@@ -25,6 +38,112 @@ class BaseDetector(ABC):
         """
         pass
     
+    def detect_cached(self, ast_tree, source_code, filename, cache):
+        """
+        Detect code smells, reusing partial results stored in cache.
+        
+        Detectors whose work can be split per definition override this;
+        the default ignores the cache.
+        
+        Args:
+            ast_tree: AST tree of the source code
+            source_code: Raw source code as string
+            filename: Name of the file being analyzed
+            cache: DefinitionCache shared between runs, or None
+        
+        Returns:
+            List of detected smell instances, the same as detect()
+        """
+        return self.detect(ast_tree, source_code, filename)
+    
+    def collect_facts(self, ast_tree, source_code):
+        """
+        Compute the per-node facts detect() checks against its thresholds.
+        
+        Detectors that split detect() into collect_facts() and
+        report_facts() let instances with different settings (one per
+        profile) share one walk of the tree. Facts must not depend on
+        self.config. The default returns None: the detector isn't split.
+        
+        Args:
+            ast_tree: AST tree of the source code
+            source_code: Raw source code as string
+        
+        Returns:
+            Facts for report_facts(), or None
+        """
+        return None
+    
+    def report_facts(self, facts, filename):
+        """
+        Check facts from collect_facts() against this instance's settings.
+        
+        Args:
+            facts: Value returned by collect_facts()
+            filename: Name of the file being analyzed
+        
+        Returns:
+            List of detected smell instances, the same as detect()
+        """
+        raise NotImplementedError
+    
+    def detect_shared(self, ast_tree, source_code, filename, facts):
+        """
+        Detect code smells, reusing facts other instances of this class computed.
+        
+        Instances running in different threads may both compute the facts
+        of a file; both get the same value, so findings don't change.
+        
+        Args:
+            ast_tree: AST tree of the source code
+            source_code: Raw source code as string
+            filename: Name of the file being analyzed
+            facts: Dictionary shared by all detectors for this file,
+                keyed by detector class
+        
+        Returns:
+            List of detected smell instances, the same as detect()
+        """
+        key = type(self)
+        if key not in facts:
+            facts.setdefault(key, self.collect_facts(ast_tree, source_code))
+        if facts[key] is None:
+            return self.detect(ast_tree, source_code, filename)
+        return self.report_facts(facts[key], filename)
+    
+    def may_fire(self, source_code, line_count):
+        """
+        Cheap necessary-condition check run before the file is parsed.
+        
+        Detectors override this with a line-count, substring or regex
+        check. Returning False promises that detect() would report nothing
+        for this source, so the file can be skipped without ast.parse.
+        
+        Args:
+            source_code: Raw source code as string
+            line_count: Number of lines in the source
+        
+        Returns:
+            True if the detector might report a smell, False otherwise
+        """
+        return True
+    
+    def reports_at(self, node):
+        """
+        Whether detect() may report a finding at node's first line.
+        
+        Findings are ordered by the first such node of their line_start
+        in ast.walk() order, which is the order detect() finds them in.
+        Detectors that sort their own findings leave this False.
+        
+        Args:
+            node: AST node with a lineno
+        
+        Returns:
+            True if node can be where a finding is reported
+        """
+        return isinstance(node, self.reported_nodes)
+    
     @abstractmethod
     def get_name(self):
         """Get the name of this detector."""
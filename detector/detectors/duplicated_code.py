@@ -1,38 +1,137 @@
 """Detector for Duplicated Code smell."""
 
 import ast
+import hashlib
+import os
+from collections import Counter
 from difflib import SequenceMatcher
 from .base_detector import BaseDetector
 
 
+# Methods per side of one tile of the pair matrix
+TILE_SIZE = 128
+
+# Detectors can run in threads (--threads), and forking a process that
+# has other threads running can copy a lock some thread holds. Tile workers
+# are started fresh instead, through a fork server where there is one.
+_TILE_START_METHODS = ('forkserver', 'spawn')
+
+# Per-worker state set by _init_tile_worker: normalized method texts,
+# the threshold and a detector for the similarity bounds
+_tile_state = {}
+
+
+def _init_tile_worker(texts, threshold, prune):
+    """Receive the method texts once per worker process."""
+    detector = DuplicatedCodeDetector({})
+    detector.prune = prune
+    _tile_state['items'] = [{'normalized': text} for text in texts]
+    _tile_state['threshold'] = threshold
+    _tile_state['detector'] = detector
+
+
+def _compare_tile(rows, columns):
+    """
+    Compare the pairs (i, j), i < j, of one tile in a worker.
+    
+    Args:
+        rows: (start, stop) range of first-method indexes
+        columns: (start, stop) range of second-method indexes
+    
+    Returns:
+        (list of (i, j, similarity) reaching the threshold, comparison counts)
+    """
+    items = _tile_state['items']
+    threshold = _tile_state['threshold']
+    detector = _tile_state['detector']
+    stats = DuplicatedCodeDetector.new_comparison_stats()
+    found = []
+    matcher = SequenceMatcher(None)
+    for j in range(*columns):
+        prepared = False
+        for i in range(rows[0], min(rows[1], j)):
+            if not detector._may_reach(items[i], items[j], threshold, stats):
+                continue
+            if not prepared:
+                matcher.set_seq2(items[j]['normalized'])
+                prepared = True
+            matcher.set_seq1(items[i]['normalized'])
+            similarity = matcher.ratio()
+            stats['compared'] += 1
+            if similarity >= threshold:
+                found.append((i, j, similarity))
+    return found, stats
+
+
 class DuplicatedCodeDetector(BaseDetector):
     """Detects duplicated code blocks."""
     
+    scope = 'module'
+    
+    # Reject pairs by upper bounds on the similarity before computing it;
+    # findings are the same either way
+    prune = True
+    
     def get_name(self):
         return "DuplicatedCode"
     
+    def may_fire(self, source_code, line_count):
+        """Need two methods to compare, or one long enough to hold two blocks."""
+        def_count = source_code.count('def')
+        if def_count >= 2:
+            return True
+        min_lines = self.config.get('min_lines', 5)
+        return def_count == 1 and line_count >= min_lines * 2
+    
     def detect(self, ast_tree, source_code, filename):
         """Detect duplicated code in the source."""
+        return self.detect_cached(ast_tree, source_code, filename, None)
+    
+    def detect_cached(self, ast_tree, source_code, filename, cache, stats=None):
+        """
+        Detect duplicated code, reusing comparisons stored in cache.
+        
+        Similarities are stored per pair of method hashes (of the
+        whitespace-normalized text that is compared) and in-method
+        duplicates per method text, so after an edit only comparisons
+        involving changed methods are computed again.
+        
+        Args:
+            ast_tree: AST tree of the source code
+            source_code: Raw source code as string
+            filename: Name of the file being analyzed
+            cache: DefinitionCache, or None to compute everything
+            stats: Optional dictionary that receives comparison counts
+                (see new_comparison_stats())
+        
+        Returns:
+            List of detected smell instances
+        """
         smells = []
         min_lines = self.config.get('min_lines', 5)
         similarity_threshold = self.config.get('similarity_threshold', 0.85)
+        source_lines = source_code.split('\n')
         
         # Extract all methods/functions
         methods = []
         for node in ast.walk(ast_tree):
             if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
                 if hasattr(node, 'lineno') and hasattr(node, 'end_lineno'):
-                    lines = source_code.split('\n')[node.lineno - 1:node.end_lineno]
+                    lines = source_lines[node.lineno - 1:node.end_lineno]
                     method_code = '\n'.join(lines)
+                    normalized = ' '.join(method_code.split())
                     methods.append({
                         'name': node.name,
                         'start': node.lineno,
                         'end': node.end_lineno,
                         'code': method_code,
-                        'lines': lines
+                        'lines': lines,
+                        'normalized': normalized,
+                        'hash': self._hash(normalized) if cache is not None else None
                     })
         
         # Compare methods for similarity
+        similarities = self._method_similarities(methods, similarity_threshold, cache, stats)
         reported_pairs = set()
         for i, method1 in enumerate(methods):
             for j, method2 in enumerate(methods):
@@ -44,10 +143,10 @@ class DuplicatedCodeDetector(BaseDetector):
                 if pair_key in reported_pairs:
                     continue
                 
-                # Calculate similarity
-                similarity = self._calculate_similarity(method1['code'], method2['code'])
+                # Pairs below the threshold were left out
+                similarity = similarities.get((i, j))
                 
-                if similarity >= similarity_threshold:
+                if similarity is not None:
                     reported_pairs.add(pair_key)
                     description = (f"Duplicated code between methods '{method1['name']}' "
                                  f"(lines {method1['start']}-{method1['end']}) and "
@@ -64,8 +163,8 @@ class DuplicatedCodeDetector(BaseDetector):
         # Also check for duplicated blocks within the same method
         for method in methods:
             if len(method['lines']) >= min_lines * 2:
-                blocks = self._extract_blocks(method['lines'], min_lines)
-                duplicates = self._find_duplicate_blocks(blocks, similarity_threshold)
+                duplicates = self._method_duplicate_blocks(method, min_lines,
+                                                           similarity_threshold, cache, stats)
                 
                 for dup in duplicates:
                     description = (f"Duplicated code block within method '{method['name']}'. "
@@ -80,12 +179,177 @@ class DuplicatedCodeDetector(BaseDetector):
         
         return smells
     
-    def _calculate_similarity(self, text1, text2):
-        """Calculate similarity ratio between two text blocks."""
-        # Normalize whitespace for comparison
-        normalized1 = ' '.join(text1.split())
-        normalized2 = ' '.join(text2.split())
-        return SequenceMatcher(None, normalized1, normalized2).ratio()
+    @staticmethod
+    def _hash(text):
+        """Content hash of a method, used in cache keys."""
+        return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=8).hexdigest()
+    
+    def _method_similarities(self, methods, threshold, cache, stats):
+        """
+        Similarities of the method pairs (i < j) that reach threshold.
+        
+        Pairs are visited by second method, so one matcher's preprocessing
+        of that method (set_seq2) serves every comparison against it.
+        Callers replay their own pair order over the result.
+        
+        Returns:
+            Dictionary mapping (i, j) to similarity
+        """
+        processes = self._pair_processes(len(methods), cache)
+        if processes > 1:
+            return self._parallel_similarities(methods, threshold, processes, stats)
+        
+        found = {}
+        matcher = SequenceMatcher(None)
+        for j, method2 in enumerate(methods):
+            prepared = False
+            for i in range(j):
+                method1 = methods[i]
+                key = f"{method1['hash']}:{method2['hash']}" if cache is not None else None
+                similarity = cache.get('pair', key) if cache is not None else None
+                if similarity is not None:
+                    self._count(stats, 'cached')
+                else:
+                    if not self._may_reach(method1, method2, threshold, stats):
+                        continue
+                    if not prepared:
+                        matcher.set_seq2(method2['normalized'])
+                        prepared = True
+                    matcher.set_seq1(method1['normalized'])
+                    similarity = matcher.ratio()
+                    self._count(stats, 'compared')
+                    if cache is not None:
+                        cache.put('pair', key, similarity)
+                if similarity >= threshold:
+                    found[(i, j)] = similarity
+        return found
+    
+    def _pair_processes(self, method_count, cache):
+        """
+        Number of processes to compare a file's method pairs with.
+        
+        Pairs are compared in parallel only for files with at least
+        'parallel_min_methods' methods, without a definition cache (which
+        already avoids recomputing pairs), and only from the main process:
+        daemonic processes can't start children, and a --jobs worker would
+        multiply the process count.
+        """
+        if cache is not None or method_count < self.config.get('parallel_min_methods', 1000):
+            return 1
+        import multiprocessing
+        
+        if multiprocessing.current_process().daemon or multiprocessing.parent_process() is not None:
+            return 1
+        processes = self.config.get('processes') or os.cpu_count() or 1
+        return min(processes, (method_count + TILE_SIZE - 1) // TILE_SIZE)
+    
+    def _parallel_similarities(self, methods, threshold, processes, stats):
+        """
+        _method_similarities() over tiles of the pair matrix in a process pool.
+        
+        The upper triangle is cut into TILE_SIZE x TILE_SIZE tiles. The
+        method texts reach each worker once, through the pool initializer,
+        so a task only carries its tile's index ranges. Workers are never
+        forked from this process, which may be running detector threads.
+        Results are keyed by (i, j), and the caller replays them in serial
+        order.
+        """
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        
+        start_method = next(method for method in _TILE_START_METHODS
+                            if method in multiprocessing.get_all_start_methods())
+        texts = [method['normalized'] for method in methods]
+        bounds = [(start, min(start + TILE_SIZE, len(texts)))
+                  for start in range(0, len(texts), TILE_SIZE)]
+        tiles = [(rows, columns) for a, rows in enumerate(bounds) for columns in bounds[a:]]
+        
+        found = {}
+        with ProcessPoolExecutor(max_workers=processes,
+                                 mp_context=multiprocessing.get_context(start_method),
+                                 initializer=_init_tile_worker,
+                                 initargs=(texts, threshold, self.prune)) as pool:
+            futures = [pool.submit(_compare_tile, rows, columns) for rows, columns in tiles]
+            try:
+                for future in futures:
+                    tile_found, tile_stats = future.result()
+                    for i, j, similarity in tile_found:
+                        found[(i, j)] = similarity
+                    if stats is not None:
+                        for key, value in tile_stats.items():
+                            stats[key] += value
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+        return found
+    
+    def _may_reach(self, item1, item2, threshold, stats):
+        """
+        Check upper bounds on SequenceMatcher.ratio() against threshold.
+        
+        ratio() is 2 * matches / total length. Matches can't exceed the
+        shorter text (the real_quick_ratio() bound) or the characters the
+        two texts have in common (the quick_ratio() bound). Both are
+        computed from lengths and character counts kept on the items, and
+        use the same arithmetic as ratio(), so a pair rejected here would
+        have scored below threshold.
+        
+        Args:
+            item1, item2: Dictionaries with 'normalized' text; a 'counts'
+                Counter is added on first use
+            threshold: Similarity a pair must reach
+            stats: Optional comparison counts
+        
+        Returns:
+            False if the pair can't reach threshold
+        """
+        self._count(stats, 'pairs')
+        if not self.prune:
+            return True
+        text1 = item1['normalized']
+        text2 = item2['normalized']
+        length = len(text1) + len(text2)
+        if not length:
+            return True
+        if 2.0 * min(len(text1), len(text2)) / length < threshold:
+            self._count(stats, 'pruned_length')
+            return False
+        counts1 = item1.get('counts')
+        if counts1 is None:
+            counts1 = item1['counts'] = Counter(text1)
+        counts2 = item2.get('counts')
+        if counts2 is None:
+            counts2 = item2['counts'] = Counter(text2)
+        common = sum((counts1 & counts2).values())
+        if 2.0 * common / length < threshold:
+            self._count(stats, 'pruned_counts')
+            return False
+        return True
+    
+    @staticmethod
+    def new_comparison_stats():
+        """Empty counts for detect_cached(stats=...)."""
+        return {'pairs': 0, 'cached': 0, 'pruned_length': 0, 'pruned_counts': 0, 'compared': 0}
+    
+    @staticmethod
+    def _count(stats, key):
+        if stats is not None:
+            stats[key] += 1
+    
+    def _method_duplicate_blocks(self, method, min_lines, threshold, cache, stats=None):
+        """Duplicated blocks inside one method, looked up by its text when cached."""
+        if cache is None:
+            blocks = self._extract_blocks(method['lines'], min_lines)
+            return self._find_duplicate_blocks(blocks, threshold, stats)
+        
+        key = self._hash(method['code'])
+        duplicates = cache.get('blocks', key)
+        if duplicates is None:
+            blocks = self._extract_blocks(method['lines'], min_lines)
+            duplicates = self._find_duplicate_blocks(blocks, threshold, stats)
+            cache.put('blocks', key, duplicates)
+        return duplicates
     
     def _extract_blocks(self, lines, min_size):
         """Extract code blocks of minimum size from lines."""
@@ -99,23 +363,41 @@ class DuplicatedCodeDetector(BaseDetector):
             })
         return blocks
     
-    def _find_duplicate_blocks(self, blocks, threshold):
+    def _find_duplicate_blocks(self, blocks, threshold, stats=None):
         """Find duplicate blocks within a method."""
-        duplicates = []
-        for i, block1 in enumerate(blocks):
-            for j, block2 in enumerate(blocks):
-                if i >= j:
+        for block in blocks:
+            block['normalized'] = ' '.join(block['code'].split())
+        
+        # Compare by second block to reuse the matcher, then report in
+        # (i, j) order
+        found = []
+        matcher = SequenceMatcher(None)
+        for j, block2 in enumerate(blocks):
+            prepared = False
+            for i in range(j):
+                block1 = blocks[i]
+                if not self._may_reach(block1, block2, threshold, stats):
                     continue
-                
-                similarity = self._calculate_similarity(block1['code'], block2['code'])
+                if not prepared:
+                    matcher.set_seq2(block2['normalized'])
+                    prepared = True
+                matcher.set_seq1(block1['normalized'])
+                similarity = matcher.ratio()
+                self._count(stats, 'compared')
                 if similarity >= threshold:
-                    duplicates.append({
-                        'block1_start': block1['start'],
-                        'block1_end': block1['end'],
-                        'block2_start': block2['start'],
-                        'block2_end': block2['end'],
-                        'similarity': similarity
-                    })
+                    found.append((i, j, similarity))
+        found.sort()
+        
+        duplicates = []
+        for i, j, similarity in found:
+            block1 = blocks[i]
+            block2 = blocks[j]
+            duplicates.append({
+                'block1_start': block1['start'],
+                'block1_end': block1['end'],
+                'block2_start': block2['start'],
+                'block2_end': block2['end'],
+                'similarity': similarity
+            })
         
         return duplicates
-
@@ -8,14 +8,27 @@ from .base_detector import BaseDetector
 class FeatureEnvyDetector(BaseDetector):
     """Detects methods that access other classes' data more than their own."""
     
+    reported_nodes = (ast.FunctionDef, ast.AsyncFunctionDef)
+    
     def get_name(self):
         return "FeatureEnvy"
     
+    def may_fire(self, source_code, line_count):
+        """Need a method inside a class and enough dotted accesses."""
+        if 'class' not in source_code or 'def' not in source_code:
+            return False
+        min_external_calls = max(self.config.get('min_external_calls', 3), 1)
+        # A call like obj.method() is counted both as a call and as an
+        # attribute access, so each dot accounts for at most two accesses.
+        return source_code.count('.') * 2 >= min_external_calls
+    
     def detect(self, ast_tree, source_code, filename):
         """Detect feature envy in methods."""
-        smells = []
-        external_call_ratio = self.config.get('external_call_ratio', 0.6)
-        min_external_calls = self.config.get('min_external_calls', 3)
+        return self.report_facts(self.collect_facts(ast_tree, source_code), filename)
+    
+    def collect_facts(self, ast_tree, source_code):
+        """Class, name, lines and attribute accesses of every non-special method."""
+        facts = []
         
         # Build a map of classes and their methods
         class_map = {}
@@ -23,45 +36,53 @@ class FeatureEnvyDetector(BaseDetector):
             if isinstance(node, ast.ClassDef):
                 class_map[node.name] = node
         
-        # Analyze each method
         for class_name, class_node in class_map.items():
             for node in class_node.body:
                 if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
                     # Skip __init__ and other special methods
                     if node.name.startswith('__'):
                         continue
+                    line_end = node.end_lineno if hasattr(node, 'end_lineno') else node.lineno
+                    facts.append((class_name, node.name, node.lineno, line_end,
+                                  self._count_attribute_accesses(node)))
+        return facts
+    
+    def report_facts(self, facts, filename):
+        """Report the methods that mostly access other objects."""
+        smells = []
+        external_call_ratio = self.config.get('external_call_ratio', 0.6)
+        min_external_calls = self.config.get('min_external_calls', 3)
+        
+        # Analyze each method
+        for class_name, name, line_start, line_end, accesses in facts:
+            total_calls = sum(accesses.values())
+            if total_calls == 0:
+                continue
+            
+            # Count external accesses (not self)
+            external_calls = sum(count for var, count in accesses.items() if var != 'self')
+            
+            if external_calls >= min_external_calls:
+                ratio = external_calls / total_calls
+                
+                if ratio >= external_call_ratio:
+                    main_envied = max(
+                        ((var, count) for var, count in accesses.items() if var != 'self'),
+                        key=lambda x: x[1],
+                        default=(None, 0)
+                    )
                     
-                    # Count attribute accesses
-                    accesses = self._count_attribute_accesses(node)
-                    
-                    total_calls = sum(accesses.values())
-                    if total_calls == 0:
-                        continue
-                    
-                    # Count external accesses (not self)
-                    external_calls = sum(count for var, count in accesses.items() if var != 'self')
-                    
-                    if external_calls >= min_external_calls:
-                        ratio = external_calls / total_calls
-                        
-                        if ratio >= external_call_ratio:
-                            main_envied = max(
-                                ((var, count) for var, count in accesses.items() if var != 'self'),
-                                key=lambda x: x[1],
-                                default=(None, 0)
-                            )
-                            
-                            description = (f"Method '{node.name}' in class '{class_name}' "
-                                         f"shows feature envy. {external_calls}/{total_calls} "
-                                         f"({ratio:.1%}) attribute accesses are to external objects. "
-                                         f"Most accessed: '{main_envied[0]}' ({main_envied[1]} times)")
-                            smells.append(self.format_smell(
-                                filename,
-                                node.lineno,
-                                node.end_lineno if hasattr(node, 'end_lineno') else node.lineno,
-                                description,
-                                severity='medium'
-                            ))
+                    description = (f"Method '{name}' in class '{class_name}' "
+                                 f"shows feature envy. {external_calls}/{total_calls} "
+                                 f"({ratio:.1%}) attribute accesses are to external objects. "
+                                 f"Most accessed: '{main_envied[0]}' ({main_envied[1]} times)")
+                    smells.append(self.format_smell(
+                        filename,
+                        line_start,
+                        line_end,
+                        description,
+                        severity='medium'
+                    ))
         
         return smells
     
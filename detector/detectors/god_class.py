@@ -7,44 +7,64 @@ from .base_detector import BaseDetector
 class GodClassDetector(BaseDetector):
     """Detects classes that do too many things (God Class/Blob)."""
     
+    reported_nodes = (ast.ClassDef,)
+    
     def get_name(self):
         return "GodClass"
     
-    def detect(self, ast_tree, source_code, filename):
-        """Detect God Classes in the code."""
-        smells = []
+    def may_fire(self, source_code, line_count):
+        """Need a class and either enough lines or enough 'def' keywords."""
+        if 'class' not in source_code:
+            return False
         method_threshold = self.config.get('method_threshold', 10)
         line_threshold = self.config.get('line_threshold', 150)
-        
+        return (line_count >= line_threshold or
+                source_code.count('def') >= method_threshold)
+    
+    def detect(self, ast_tree, source_code, filename):
+        """Detect God Classes in the code."""
+        return self.report_facts(self.collect_facts(ast_tree, source_code), filename)
+    
+    def collect_facts(self, ast_tree, source_code):
+        """Name, first and last line and method count of every class."""
+        facts = []
         for node in ast.walk(ast_tree):
             if isinstance(node, ast.ClassDef):
                 # Count methods in the class
                 methods = [n for n in node.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
-                method_count = len(methods)
-                
-                # Calculate lines in the class
                 if hasattr(node, 'lineno') and hasattr(node, 'end_lineno'):
-                    class_lines = node.end_lineno - node.lineno + 1
-                    
-                    # Check if it's a God Class
-                    is_god_class = (method_count >= method_threshold or class_lines >= line_threshold)
-                    
-                    if is_god_class:
-                        reasons = []
-                        if method_count >= method_threshold:
-                            reasons.append(f"{method_count} methods (threshold: {method_threshold})")
-                        if class_lines >= line_threshold:
-                            reasons.append(f"{class_lines} lines (threshold: {line_threshold})")
-                        
-                        description = (f"Class '{node.name}' is a God Class with "
-                                     f"{', '.join(reasons)}")
-                        smells.append(self.format_smell(
-                            filename,
-                            node.lineno,
-                            node.end_lineno,
-                            description,
-                            severity='high'
-                        ))
+                    facts.append((node.name, node.lineno, node.end_lineno, len(methods)))
+        return facts
+    
+    def report_facts(self, facts, filename):
+        """Report the classes with too many methods or lines."""
+        smells = []
+        method_threshold = self.config.get('method_threshold', 10)
+        line_threshold = self.config.get('line_threshold', 150)
+        
+        for name, line_start, line_end, method_count in facts:
+            # Calculate lines in the class
+            class_lines = line_end - line_start + 1
+            
+            # Check if it's a God Class
+            is_god_class = (method_count >= method_threshold or class_lines >= line_threshold)
+            
+            if is_god_class:
+                reasons = []
+                if method_count >= method_threshold:
+                    reasons.append(f"{method_count} methods (threshold: {method_threshold})")
+                if class_lines >= line_threshold:
+                    reasons.append(f"{class_lines} lines (threshold: {line_threshold})")
+                
+                description = (f"Class '{name}' is a God Class with "
+                             f"{', '.join(reasons)}")
+                smells.append(self.format_smell(
+                    filename,
+                    line_start,
+                    line_end,
+                    description,
+                    severity='high'
+                ))
         
         return smells
 
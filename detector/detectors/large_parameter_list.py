@@ -7,35 +7,52 @@ from .base_detector import BaseDetector
 class LargeParameterListDetector(BaseDetector):
     """Detects methods with too many parameters."""
     
+    reported_nodes = (ast.FunctionDef, ast.AsyncFunctionDef)
+    
     def get_name(self):
         return "LargeParameterList"
     
+    def may_fire(self, source_code, line_count):
+        """N parameters need at least N - 1 commas somewhere in the file."""
+        threshold = self.config.get('threshold', 5)
+        return 'def' in source_code and source_code.count(',') >= threshold - 1
+    
     def detect(self, ast_tree, source_code, filename):
         """Detect methods with large parameter lists."""
+        return self.report_facts(self.collect_facts(ast_tree, source_code), filename)
+    
+    def collect_facts(self, ast_tree, source_code):
+        """Name, lines and positional parameter names of every method."""
+        facts = []
+        for node in ast.walk(ast_tree):
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                line_end = node.end_lineno if hasattr(node, 'end_lineno') else node.lineno
+                facts.append((node.name, node.lineno, line_end, [arg.arg for arg in node.args.args]))
+        return facts
+    
+    def report_facts(self, facts, filename):
+        """Report the methods with at least the threshold of parameters."""
         smells = []
         threshold = self.config.get('threshold', 5)
         
-        for node in ast.walk(ast_tree):
-            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
-                # Count parameters (excluding self/cls)
-                params = node.args.args
-                param_count = len(params)
-                
-                # Exclude 'self' or 'cls' for methods
-                if param_count > 0 and params[0].arg in ['self', 'cls']:
-                    param_count -= 1
-                
-                if param_count >= threshold:
-                    param_names = [arg.arg for arg in params]
-                    description = (f"Method '{node.name}' has {param_count} parameters "
-                                 f"(threshold: {threshold}). Parameters: {', '.join(param_names)}")
-                    smells.append(self.format_smell(
-                        filename,
-                        node.lineno,
-                        node.end_lineno if hasattr(node, 'end_lineno') else node.lineno,
-                        description,
-                        severity='high' if param_count >= threshold + 2 else 'medium'
-                    ))
+        for name, line_start, line_end, param_names in facts:
+            # Count parameters (excluding self/cls)
+            param_count = len(param_names)
+            
+            # Exclude 'self' or 'cls' for methods
+            if param_count > 0 and param_names[0] in ['self', 'cls']:
+                param_count -= 1
+            
+            if param_count >= threshold:
+                description = (f"Method '{name}' has {param_count} parameters "
+                             f"(threshold: {threshold}). Parameters: {', '.join(param_names)}")
+                smells.append(self.format_smell(
+                    filename,
+                    line_start,
+                    line_end,
+                    description,
+                    severity='high' if param_count >= threshold + 2 else 'medium'
+                ))
         
         return smells
 
@@ -7,30 +7,45 @@ from .base_detector import BaseDetector
 class LongMethodDetector(BaseDetector):
     """Detects methods that are too long."""
     
+    reported_nodes = (ast.FunctionDef, ast.AsyncFunctionDef)
+    
     def get_name(self):
         return "LongMethod"
     
+    def may_fire(self, source_code, line_count):
+        """A method can't be longer than the file that contains it."""
+        threshold = self.config.get('threshold', 30)
+        return line_count > threshold and 'def' in source_code
+    
     def detect(self, ast_tree, source_code, filename):
         """Detect long methods in the code."""
+        return self.report_facts(self.collect_facts(ast_tree, source_code), filename)
+    
+    def collect_facts(self, ast_tree, source_code):
+        """Name, first and last line of every method, in ast.walk() order."""
+        return [(node.name, node.lineno, node.end_lineno) for node in ast.walk(ast_tree)
+                if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+                and hasattr(node, 'lineno') and hasattr(node, 'end_lineno')]
+    
+    def report_facts(self, facts, filename):
+        """Report the methods longer than the threshold."""
         smells = []
         threshold = self.config.get('threshold', 30)
         
-        for node in ast.walk(ast_tree):
-            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
-                # Calculate the number of lines in the method
-                if hasattr(node, 'lineno') and hasattr(node, 'end_lineno'):
-                    method_lines = node.end_lineno - node.lineno + 1
-                    
-                    if method_lines > threshold:
-                        description = (f"Method '{node.name}' has {method_lines} lines, "
-                                     f"exceeding threshold of {threshold} lines")
-                        smells.append(self.format_smell(
-                            filename,
-                            node.lineno,
-                            node.end_lineno,
-                            description,
-                            severity='high' if method_lines > threshold * 1.5 else 'medium'
-                        ))
+        for name, line_start, line_end in facts:
+            # Calculate the number of lines in the method
+            method_lines = line_end - line_start + 1
+            
+            if method_lines > threshold:
+                description = (f"Method '{name}' has {method_lines} lines, "
+                             f"exceeding threshold of {threshold} lines")
+                smells.append(self.format_smell(
+                    filename,
+                    line_start,
+                    line_end,
+                    description,
+                    severity='high' if method_lines > threshold * 1.5 else 'medium'
+                ))
         
         return smells
 
@@ -1,47 +1,78 @@
 """Detector for Magic Numbers code smell."""
 
 import ast
+import re
 from .base_detector import BaseDetector
 
 
+# Anything that starts like a numeric literal outside an identifier, up to
+# the end of the word. Digits in strings and comments match too, and so do
+# words that aren't literals (e.g. '3.11.7'); both only make the prefilter
+# more cautious. Much cheaper than tokenize, which costs about as much as
+# the detector.
+NUMBER_PATTERN = re.compile(r'(?<![\w.])\.?\d[\w.]*(?:[eE][+-]\d\w*)?')
+
+
 class MagicNumbersDetector(BaseDetector):
     """Detects magic numbers (hard-coded numeric literals)."""
     
     def get_name(self):
         return "MagicNumbers"
     
+    def may_fire(self, source_code, line_count):
+        """Look for a numeric literal that isn't allowed, or a flagged True/False."""
+        allowed_numbers = set(self.config.get('allowed_numbers', [0, 1, -1, 2]))
+        # True/False are int constants in the AST, so they count as
+        # numbers whenever 1 or 0 is not in the allowed list.
+        flagged_names = {name for name, value in (('True', True), ('False', False))
+                         if value not in allowed_numbers}
+        if any(name in source_code for name in flagged_names):
+            return True
+        
+        for literal in set(NUMBER_PATTERN.findall(source_code)):
+            try:
+                value = ast.literal_eval(literal)
+            except (ValueError, SyntaxError):
+                return True
+            if value not in allowed_numbers:
+                return True
+        return False
+    
+    def reports_at(self, node):
+        """A line is reported at its first number that isn't allowed."""
+        return (isinstance(node, ast.Constant) and isinstance(node.value, (int, float, complex)) and
+                node.value not in self.config.get('allowed_numbers', [0, 1, -1, 2]))
+    
     def detect(self, ast_tree, source_code, filename):
         """Detect magic numbers in the code."""
+        return self.report_facts(self.collect_facts(ast_tree, source_code), filename)
+    
+    def collect_facts(self, ast_tree, source_code):
+        """Line and value of every numeric literal, in ast.walk() order."""
+        facts = []
+        for node in ast.walk(ast_tree):
+            # ast.Num covers complex literals; ast.Constant adds True/False
+            if isinstance(node, ast.Num) or (isinstance(node, ast.Constant) and
+                                             isinstance(node.value, (int, float))):
+                if hasattr(node, 'lineno'):
+                    facts.append((node.lineno, node.value))
+        return facts
+    
+    def report_facts(self, facts, filename):
+        """Report each line with numbers that aren't allowed."""
         smells = []
         allowed_numbers = set(self.config.get('allowed_numbers', [0, 1, -1, 2]))
         
         # Track magic numbers by line to avoid duplicates
         magic_by_line = {}
         
-        for node in ast.walk(ast_tree):
-            if isinstance(node, ast.Num):
-                # Check if it's a magic number
-                value = node.n
-                
-                # Skip allowed numbers and floats that are close to allowed integers
-                if value not in allowed_numbers:
-                    if hasattr(node, 'lineno'):
-                        line = node.lineno
-                        if line not in magic_by_line:
-                            magic_by_line[line] = []
-                        magic_by_line[line].append(value)
-            
-            # Also check ast.Constant for Python 3.8+
-            elif isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
-                value = node.value
-                
-                if value not in allowed_numbers:
-                    if hasattr(node, 'lineno'):
-                        line = node.lineno
-                        if line not in magic_by_line:
-                            magic_by_line[line] = []
-                        if value not in magic_by_line[line]:
-                            magic_by_line[line].append(value)
+        for line, value in facts:
+            # Skip allowed numbers and floats that are close to allowed integers
+            if value not in allowed_numbers:
+                if line not in magic_by_line:
+                    magic_by_line[line] = []
+                if value not in magic_by_line[line]:
+                    magic_by_line[line].append(value)
         
         # Create smell reports for each line with magic numbers
         for line, values in magic_by_line.items():
@@ -0,0 +1,225 @@
+"""Registry of detector plugins, imported only when a detector is used."""
+
+import importlib
+import threading
+from collections.abc import Mapping
+
+
+# Entry point group third-party packages register detectors under
+ENTRY_POINT_GROUP = 'code_smell_detector.detectors'
+
+
+class DetectorSpec:
+    """Metadata of one detector, known before its module is imported."""
+
+    def __init__(self, name, target, node_types=(), version=None, source='builtin',
+                 enabled_by_default=True):
+        """
+        Initialize the spec.
+
+        Args:
+            name: Detector name used in config, --only and reports
+            target: 'module:ClassName' of the detector class
+            node_types: Names of the AST node types the detector inspects
+            version: Version of the package providing the detector
+            source: 'builtin', 'config' or 'entry point'
+            enabled_by_default: Whether the detector runs when config says nothing
+        """
+        self.name = name
+        self.target = target
+        self.node_types = tuple(node_types)
+        self.version = version
+        self.source = source
+        self.enabled_by_default = enabled_by_default
+        self._class = None
+
+    @property
+    def loaded(self):
+        """True once the detector's module has been imported."""
+        return self._class is not None
+
+    def load(self):
+        """
+        Import the detector class.
+
+        Raises:
+            ImportError: If the module can't be imported
+            AttributeError: If the module has no such class
+        """
+        if self._class is None:
+            module_name, _, class_name = self.target.partition(':')
+            module = importlib.import_module(module_name)
+            self._class = getattr(module, class_name)
+        return self._class
+
+    def to_dict(self):
+        """Metadata as a dictionary, for listings."""
+        return {
+            'name': self.name,
+            'target': self.target,
+            'node_types': list(self.node_types),
+            'version': self.version,
+            'source': self.source,
+            'loaded': self.loaded
+        }
+
+
+BUILTIN_DETECTORS = [
+    DetectorSpec('LongMethod', f'{__package__}.long_method:LongMethodDetector',
+                 ('FunctionDef', 'AsyncFunctionDef')),
+    DetectorSpec('GodClass', f'{__package__}.god_class:GodClassDetector',
+                 ('ClassDef',)),
+    DetectorSpec('DuplicatedCode', f'{__package__}.duplicated_code:DuplicatedCodeDetector',
+                 ('FunctionDef', 'AsyncFunctionDef')),
+    DetectorSpec('LargeParameterList', f'{__package__}.large_parameter_list:LargeParameterListDetector',
+                 ('FunctionDef', 'AsyncFunctionDef')),
+    DetectorSpec('MagicNumbers', f'{__package__}.magic_numbers:MagicNumbersDetector',
+                 ('Constant',)),
+    DetectorSpec('FeatureEnvy', f'{__package__}.feature_envy:FeatureEnvyDetector',
+                 ('ClassDef', 'FunctionDef', 'AsyncFunctionDef', 'Attribute', 'Call')),
+    # Node types depend on the configured rules; off until config enables it
+    DetectorSpec('Rules', f'{__package__}.rules:RuleEngineDetector',
+                 enabled_by_default=False),
+]
+
+
+def _iter_entry_points():
+    """Entry points registered under ENTRY_POINT_GROUP."""
+    from importlib import metadata
+
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, 'select'):
+        return entry_points.select(group=ENTRY_POINT_GROUP)
+    return entry_points.get(ENTRY_POINT_GROUP, [])
+
+
+# Specs of installed detectors, read from the package metadata on first
+# use and shared by every registry of the process
+_installed = None
+_installed_lock = threading.Lock()
+
+
+def installed_detectors():
+    """
+    Detectors installed under ENTRY_POINT_GROUP, without importing them.
+
+    Reading the entry points scans every installed distribution, so it
+    happens at most once per process, and only when a registry is asked
+    about a detector it doesn't already know.
+
+    Returns:
+        Tuple of DetectorSpec, disabled by default
+    """
+    global _installed
+    with _installed_lock:
+        if _installed is None:
+            specs = []
+            for entry_point in _iter_entry_points():
+                dist = getattr(entry_point, 'dist', None)
+                specs.append(DetectorSpec(
+                    entry_point.name,
+                    entry_point.value,
+                    version=dist.version if dist is not None else None,
+                    source='entry point',
+                    enabled_by_default=False
+                ))
+            _installed = tuple(specs)
+        return _installed
+
+
+class DetectorRegistry(Mapping):
+    """
+    Detector classes by name, imported on first lookup.
+
+    Iterating, len() and spec() only read metadata; indexing imports the
+    detector's module. Built-in detectors and detectors declared in the
+    config's 'plugins' section come first, followed by detectors
+    installed under the entry point group (disabled unless the config
+    enables them). Installed detectors are only looked for when a name
+    isn't known otherwise, or when every detector is listed.
+    """
+
+    def __init__(self, specs=None, discover=True, plugins=None):
+        """
+        Initialize the registry.
+
+        Args:
+            specs: Detector specs to start from (default: the built-ins)
+            discover: Also list detectors installed as entry points
+            plugins: The config's 'plugins' mapping of detector names to
+                {'class': 'module:ClassName', 'node_types': [...], 'version': ...}.
+                An entry without 'class' only adds metadata to a built-in
+                or installed detector of that name.
+        """
+        self._specs = {}
+        for spec in BUILTIN_DETECTORS if specs is None else specs:
+            self._specs[spec.name] = spec
+        self._discover = discover
+        self._metadata = {}
+        for name, settings in (plugins or {}).items():
+            settings = settings or {}
+            if 'class' in settings:
+                self._specs[name] = DetectorSpec(
+                    name, settings['class'], settings.get('node_types', ()),
+                    settings.get('version'), source='config'
+                )
+            elif 'node_types' in settings:
+                self._metadata[name] = settings
+        for name in list(self._metadata):
+            if name in self._specs:
+                self._specs[name] = self._with_metadata(self._specs[name], self._metadata.pop(name))
+        self._installed = None
+
+    @staticmethod
+    def _with_metadata(spec, settings):
+        """Copy of spec with node types and version from a 'plugins' entry."""
+        return DetectorSpec(spec.name, spec.target, settings['node_types'],
+                            settings.get('version', spec.version), spec.source,
+                            spec.enabled_by_default)
+
+    def with_plugins(self, plugins):
+        """
+        Return a copy that also knows the detectors declared in config.
+
+        Nothing is discovered or imported; self is left unchanged.
+
+        Args:
+            plugins: The config's 'plugins' mapping (see __init__)
+        """
+        return DetectorRegistry(list(self._specs.values()), self._discover, plugins)
+
+    def _installed_specs(self):
+        """Installed detectors not shadowed by a known one, by name."""
+        if self._installed is None:
+            specs = {}
+            if self._discover:
+                for spec in installed_detectors():
+                    if spec.name in self._specs or spec.name in specs:
+                        continue
+                    if spec.name in self._metadata:
+                        spec = self._with_metadata(spec, self._metadata[spec.name])
+                    specs[spec.name] = spec
+            self._installed = specs
+        return self._installed
+
+    def known(self):
+        """Names of the built-in and config-declared detectors, without discovery."""
+        return list(self._specs)
+
+    def spec(self, name):
+        """Metadata of a detector, without importing it."""
+        if name in self._specs:
+            return self._specs[name]
+        return self._installed_specs()[name]
+
+    def __contains__(self, name):
+        return name in self._specs or name in self._installed_specs()
+
+    def __getitem__(self, name):
+        return self.spec(name).load()
+
+    def __iter__(self):
+        return iter(list(self._specs) + list(self._installed_specs()))
+
+    def __len__(self):
+        return len(self._specs) + len(self._installed_specs())
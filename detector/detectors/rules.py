@@ -0,0 +1,302 @@
+"""Detector running declarative AST rules from the configuration."""
+
+import ast
+import re
+import sys
+import yaml
+from .base_detector import BaseDetector
+
+
+# Nodes that start a new scope for 'count' predicates
+SCOPE_NODES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)
+
+# Keywords that must appear in the source for a node type to exist
+NODE_KEYWORDS = {
+    'FunctionDef': 'def', 'AsyncFunctionDef': 'def', 'ClassDef': 'class',
+    'For': 'for', 'AsyncFor': 'for', 'While': 'while', 'With': 'with',
+    'AsyncWith': 'with', 'Try': 'try', 'Lambda': 'lambda', 'Return': 'return',
+    'Yield': 'yield', 'YieldFrom': 'yield', 'Global': 'global',
+    'Nonlocal': 'nonlocal', 'Assert': 'assert', 'Raise': 'raise',
+    'Delete': 'del', 'Await': 'await', 'Import': 'import', 'ImportFrom': 'import'
+}
+
+
+def _node_types(value, rule_id):
+    """Resolve node type names like 'Call' or ['For', 'While'] to ast classes."""
+    names = [value] if isinstance(value, str) else list(value)
+    types = []
+    for name in names:
+        node_type = getattr(ast, name, None)
+        if not (isinstance(node_type, type) and issubclass(node_type, ast.AST)):
+            raise ValueError(f"rule '{rule_id}': unknown node type '{name}'")
+        types.append(node_type)
+    return tuple(types)
+
+
+def _dotted_name(node):
+    """'a.b.c' for a Name/Attribute chain, or None for anything else."""
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(node.id)
+    return '.'.join(reversed(parts))
+
+
+def _call_name(node):
+    """Dotted name of the function a Call node calls, if it has one."""
+    if isinstance(node, ast.Call):
+        return _dotted_name(node.func)
+    return None
+
+
+class _Rule:
+    """One rule compiled into predicates over a node and its ancestors."""
+
+    def __init__(self, spec):
+        """
+        Compile a rule dictionary.
+
+        Args:
+            spec: Rule with 'id', 'node', 'message' and optional 'where'
+                and 'severity'
+
+        Raises:
+            ValueError: If the rule is malformed
+        """
+        if not isinstance(spec, dict) or 'id' not in spec or 'node' not in spec:
+            raise ValueError(f"rule needs 'id' and 'node': {spec!r}")
+        self.id = str(spec['id'])
+        self.node_types = _node_types(spec['node'], self.id)
+        self.message = spec.get('message', self.id)
+        self.severity = spec.get('severity', 'medium')
+        self.predicates = []
+        self.count = None
+        self.call_names = None
+        self.keywords = {NODE_KEYWORDS.get(t.__name__) for t in self.node_types}
+
+        where = spec.get('where') or {}
+        for key, value in where.items():
+            if key == 'func_name':
+                self._compile_func_name(value)
+            elif key == 'name':
+                pattern = re.compile(value)
+                self.predicates.append(
+                    lambda node, ancestors, pattern=pattern:
+                        bool(pattern.search(getattr(node, 'name', None) or '')))
+            elif key == 'inside':
+                types = _node_types(value, self.id)
+                self.predicates.append(
+                    lambda node, ancestors, types=types: any(isinstance(a, types) for a in ancestors))
+            elif key == 'not_inside':
+                types = _node_types(value, self.id)
+                self.predicates.append(
+                    lambda node, ancestors, types=types:
+                        not any(isinstance(a, types) for a in ancestors))
+            elif key == 'min_lines':
+                self.predicates.append(
+                    lambda node, ancestors, minimum=value: self._lines(node) >= minimum)
+            elif key == 'count':
+                if 'node' not in value:
+                    raise ValueError(f"rule '{self.id}': 'count' needs 'node'")
+                self.count = (_node_types(value['node'], self.id),
+                              value.get('min', 1), value.get('max'))
+            else:
+                raise ValueError(f"rule '{self.id}': unknown predicate '{key}'")
+
+    def _compile_func_name(self, value):
+        """Match calls by dotted name ('os.system') or last component ('system')."""
+        names = {value} if isinstance(value, str) else set(value)
+        self.call_names = names
+
+        def matches(node, ancestors):
+            called = _call_name(node)
+            if called is None:
+                return False
+            return called in names or called.rsplit('.', 1)[-1] in names
+        self.predicates.append(matches)
+
+    @staticmethod
+    def _lines(node):
+        end = getattr(node, 'end_lineno', None) or getattr(node, 'lineno', 0)
+        return end - getattr(node, 'lineno', 0) + 1
+
+    def may_fire(self, source_code):
+        """Cheap check that the source could contain a match."""
+        if None not in self.keywords and not any(k in source_code for k in self.keywords):
+            return False
+        names = self.call_names
+        if names and not any(name.rsplit('.', 1)[-1] in source_code for name in names):
+            return False
+        return True
+
+    def matches(self, node, ancestors):
+        """Check every predicate except 'count'."""
+        return all(predicate(node, ancestors) for predicate in self.predicates)
+
+    def count_ok(self, count):
+        """Check a 'count' result against the rule's bounds."""
+        _, minimum, maximum = self.count
+        return count >= minimum and (maximum is None or count <= maximum)
+
+    def describe(self, node, count=None):
+        """Fill in the message template for a matched node."""
+        fields = {
+            'name': getattr(node, 'name', None) or '',
+            'func_name': _call_name(node) or '',
+            'node': type(node).__name__,
+            'lines': self._lines(node),
+            'count': count if count is not None else ''
+        }
+        try:
+            message = self.message.format(**fields)
+        except (KeyError, IndexError, ValueError):
+            message = self.message
+        return f"[{self.id}] {message}"
+
+
+def load_rule_files(paths):
+    """
+    Read rules from YAML files.
+
+    Each file holds either a list of rules or a mapping with a 'rules' list.
+
+    Returns:
+        List of rule dictionaries
+    """
+    rules = []
+    for path in paths:
+        with open(path, 'r') as f:
+            data = yaml.safe_load(f) or []
+        if isinstance(data, dict):
+            data = data.get('rules', [])
+        rules.extend(data)
+    return rules
+
+
+class RuleEngineDetector(BaseDetector):
+    """
+    Runs declarative rules from config in a single pass over the tree.
+
+    Rules are compiled into a dispatch table keyed by node type, so a file
+    costs one traversal however many rules are configured. A rule names
+    the node types it matches and filters them with predicates:
+
+        - id: open-in-loop
+          node: Call
+          where:
+            func_name: [open, requests.get]
+            inside: [For, While]
+          message: "{func_name}() called inside a loop"
+          severity: medium
+        - id: many-returns
+          node: [FunctionDef, AsyncFunctionDef]
+          where:
+            count: {node: Return, min: 5}
+          message: "Function '{name}' has {count} return statements"
+
+    Predicates: func_name, name (regex), inside / not_inside (ancestor
+    node types), min_lines and count (descendants of given types, not
+    counting nested functions, lambdas or classes).
+    """
+
+    def __init__(self, config):
+        """Compile the rules listed in config and in its rule files."""
+        super().__init__(config)
+        specs = list(config.get('rules', []))
+        try:
+            specs.extend(load_rule_files(config.get('rule_files', [])))
+        except (OSError, yaml.YAMLError) as e:
+            print(f"Warning: Could not read rule file: {e}", file=sys.stderr)
+
+        # Rules by node type; rules with func_name are also keyed by the
+        # last component of the called name, so a Call only checks the
+        # rules that name its function
+        self.rules = []
+        self.dispatch = {}
+        self.call_dispatch = {}
+        for spec in specs:
+            try:
+                rule = _Rule(spec)
+            except (ValueError, re.error) as e:
+                print(f"Warning: Skipping rule: {e}", file=sys.stderr)
+                continue
+            self.rules.append(rule)
+            for node_type in rule.node_types:
+                if rule.call_names and node_type is ast.Call:
+                    by_name = self.call_dispatch.setdefault(node_type, {})
+                    for name in {name.rsplit('.', 1)[-1] for name in rule.call_names}:
+                        by_name.setdefault(name, []).append(rule)
+                else:
+                    self.dispatch.setdefault(node_type, []).append(rule)
+
+    def get_name(self):
+        return "Rules"
+
+    def may_fire(self, source_code, line_count):
+        """Some rule must be able to match something in the source."""
+        return any(rule.may_fire(source_code) for rule in self.rules)
+
+    def detect(self, ast_tree, source_code, filename):
+        """Detect rule matches in one traversal of the tree."""
+        smells = []
+        if not self.rules:
+            return smells
+
+        ancestors = []
+        # Open 'count' frames: [node, rule, count, scope of the node's children]
+        frames = []
+        scope = ast_tree
+        stack = [(ast_tree, False, scope)]
+
+        while stack:
+            node, leaving, node_scope = stack.pop()
+
+            if leaving:
+                ancestors.pop()
+                while frames and frames[-1][0] is node:
+                    _, rule, count, _ = frames.pop()
+                    if rule.count_ok(count):
+                        smells.append(self._smell(rule, node, filename, count))
+                continue
+
+            # Count this node in every open frame of the scope it belongs to
+            for frame in reversed(frames):
+                if frame[3] is not node_scope:
+                    break
+                if isinstance(node, frame[1].count[0]):
+                    frame[2] += 1
+
+            child_scope = node if isinstance(node, SCOPE_NODES) else node_scope
+            candidates = self.dispatch.get(type(node), ())
+            by_name = self.call_dispatch.get(type(node))
+            if by_name:
+                called = _call_name(node)
+                if called is not None:
+                    candidates = list(candidates) + by_name.get(called.rsplit('.', 1)[-1], [])
+            for rule in candidates:
+                if not rule.matches(node, ancestors):
+                    continue
+                if rule.count is None:
+                    smells.append(self._smell(rule, node, filename))
+                else:
+                    frames.append([node, rule, 0, child_scope])
+
+            ancestors.append(node)
+            stack.append((node, True, node_scope))
+            children = list(ast.iter_child_nodes(node))
+            for child in reversed(children):
+                stack.append((child, False, child_scope))
+
+        smells.sort(key=lambda smell: (smell['line_start'], smell['rule']))
+        return smells
+
+    def _smell(self, rule, node, filename, count=None):
+        line_start = getattr(node, 'lineno', 1)
+        line_end = getattr(node, 'end_lineno', None) or line_start
+        smell = self.format_smell(filename, line_start, line_end,
+                                  rule.describe(node, count), severity=rule.severity)
+        smell['rule'] = rule.id
+        return smell
@@ -0,0 +1,223 @@
+"""
+Repository-wide duplicate detection in bounded memory.
+
+Methods are reduced to fixed-size fingerprint records that are written to
+disk in sorted runs and merged, so memory use depends on the configured
+limit rather than on the size of the corpus.
+"""
+
+import ast
+import hashlib
+import heapq
+import os
+import re
+import struct
+import tempfile
+
+
+# hash, file id, first line, last line
+RECORD = struct.Struct('<qIII')
+
+# Memory per record while a run is sorted: the packed record, the
+# unpacked tuple and its four ints, and the list slot pointing at it.
+# Measured with tracemalloc at about 240 bytes for large file ids and
+# line numbers (test_external_clones.py checks the limit holds).
+RECORD_MEMORY = 256
+
+# Runs merged at once; more runs are merged in several passes
+MAX_FAN_IN = 64
+
+# Members of one group kept for the report; the rest are only counted
+MAX_GROUP_MEMBERS = 100
+
+_SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_size(text):
+    """
+    Parse a size like '512M', '2G' or '1048576'.
+
+    Raises:
+        ValueError: If the size is malformed
+    """
+    match = re.fullmatch(r'\s*(\d+)\s*([KMG]?)B?\s*', str(text), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"invalid size '{text}' (expected e.g. 512M or 2G)")
+    return int(match.group(1)) * _SIZE_UNITS[match.group(2).upper()]
+
+
+def method_fingerprints(source_code, min_lines, filename='<unknown>'):
+    """
+    Fingerprint the bodies of the functions and methods in a file.
+
+    Bodies are compared without the def line, so a copy that was only
+    renamed or given other parameters still matches. Whitespace is
+    normalized the same way DuplicatedCode normalizes it.
+
+    Args:
+        source_code: Python source code as string
+        min_lines: Shortest function, in lines, to include
+        filename: Name used in syntax errors
+
+    Returns:
+        List of (hash, first line, last line) tuples
+
+    Raises:
+        SyntaxError: If the source does not parse
+    """
+    tree = ast.parse(source_code, filename=filename)
+    lines = source_code.split('\n')
+    records = []
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        if node.end_lineno - node.lineno + 1 < min_lines:
+            continue
+        body = lines[node.body[0].lineno - 1:node.end_lineno]
+        normalized = ' '.join(' '.join(body).split())
+        digest = hashlib.blake2b(normalized.encode('utf-8', 'surrogatepass'), digest_size=8).digest()
+        records.append((int.from_bytes(digest, 'big', signed=True), node.lineno, node.end_lineno))
+    return records
+
+
+def _read_run(path, buffer_size):
+    """Records of a sorted run, read sequentially."""
+    with open(path, 'rb', buffering=buffer_size) as f:
+        while True:
+            data = f.read(RECORD.size * 1024)
+            if not data:
+                return
+            yield from RECORD.iter_unpack(data)
+
+
+class ExternalCloneFinder:
+    """
+    Finds methods with identical bodies across any number of files.
+
+    Records are buffered until the memory limit is reached, sorted and
+    written as a run. finish() merges the runs (at most MAX_FAN_IN at a
+    time) and reads the merged stream once, collecting runs of equal hashes
+    into clone groups. Besides the current buffer, only the list of file
+    paths is kept in memory.
+    """
+
+    def __init__(self, min_lines=5, memory_limit=256 * 1024 ** 2, tmp_dir=None):
+        """
+        Initialize the finder.
+
+        Args:
+            min_lines: Shortest function, in lines, to include
+            memory_limit: Bytes the record buffer and merge buffers may use
+            tmp_dir: Directory for the sorted runs (default: system temp)
+        """
+        self.min_lines = min_lines
+        self.memory_limit = memory_limit
+        self.chunk_records = max(memory_limit // RECORD_MEMORY, 1024)
+        self.paths = []
+        self.buffer = bytearray()
+        self.buffered = 0
+        self.runs = []
+        self._next_run = 0
+        self.stats = {'files': 0, 'methods': 0, 'runs': 0, 'merge_passes': 0,
+                      'bytes_written': 0, 'groups': 0, 'duplicated_methods': 0}
+        self._tmp = tempfile.TemporaryDirectory(prefix='smell_clones_', dir=tmp_dir)
+
+    def add_file(self, path, source_code):
+        """
+        Fingerprint a file's methods and buffer their records.
+
+        Raises:
+            SyntaxError: If the source does not parse (nothing is added)
+        """
+        records = method_fingerprints(source_code, self.min_lines, path)
+        file_id = len(self.paths)
+        self.paths.append(path)
+        self.stats['files'] += 1
+        for fingerprint, line_start, line_end in records:
+            self.buffer += RECORD.pack(fingerprint, file_id, line_start, line_end)
+        self.buffered += len(records)
+        self.stats['methods'] += len(records)
+        if self.buffered >= self.chunk_records:
+            self._flush()
+
+    def _write_run(self, records):
+        """Write sorted records as a new run file."""
+        path = os.path.join(self._tmp.name, f'run{self._next_run}.bin')
+        self._next_run += 1
+        with open(path, 'wb') as f:
+            chunk = bytearray()
+            for record in records:
+                chunk += RECORD.pack(*record)
+                if len(chunk) >= 1 << 20:
+                    f.write(chunk)
+                    self.stats['bytes_written'] += len(chunk)
+                    chunk = bytearray()
+            f.write(chunk)
+            self.stats['bytes_written'] += len(chunk)
+        return path
+
+    def _flush(self):
+        """Sort the buffered records into a run on disk."""
+        if not self.buffered:
+            return
+        records = sorted(RECORD.iter_unpack(self.buffer))
+        self.buffer = bytearray()
+        self.buffered = 0
+        self.runs.append(self._write_run(records))
+        self.stats['runs'] += 1
+
+    def _merge(self, runs):
+        """Merged stream of sorted runs."""
+        buffer_size = max(self.memory_limit // (2 * len(runs)), 64 * 1024)
+        return heapq.merge(*(_read_run(path, buffer_size) for path in runs))
+
+    def finish(self):
+        """
+        Merge the runs and yield clone groups.
+
+        Yields:
+            Lists of (path, first line, last line) for methods with the
+            same body, in the order the files were added. Groups with more
+            than MAX_GROUP_MEMBERS members are truncated; 'duplicated_methods'
+            in stats still counts every member.
+        """
+        self._flush()
+        runs = self.runs
+        # Merge in passes until one pass can read every run at once
+        while len(runs) > MAX_FAN_IN:
+            self.stats['merge_passes'] += 1
+            merged = []
+            for i in range(0, len(runs), MAX_FAN_IN):
+                batch = runs[i:i + MAX_FAN_IN]
+                merged.append(self._write_run(self._merge(batch)))
+                for path in batch:
+                    os.remove(path)
+            runs = merged
+        self.stats['merge_passes'] += 1
+        self.runs = []
+
+        current = None
+        members = []
+        count = 0
+        for fingerprint, file_id, line_start, line_end in self._merge(runs) if runs else ():
+            if fingerprint != current:
+                if count >= 2:
+                    yield self._group(members, count)
+                current = fingerprint
+                members = []
+                count = 0
+            count += 1
+            if len(members) < MAX_GROUP_MEMBERS:
+                members.append((file_id, line_start, line_end))
+        if count >= 2:
+            yield self._group(members, count)
+
+    def _group(self, members, count):
+        self.stats['groups'] += 1
+        self.stats['duplicated_methods'] += count
+        return [(self.paths[file_id], line_start, line_end)
+                for file_id, line_start, line_end in sorted(members)]
+
+    def close(self):
+        """Delete the run files."""
+        self._tmp.cleanup()
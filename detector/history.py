@@ -0,0 +1,240 @@
+"""
+Smell trends over git history, analyzing each unique blob only once.
+"""
+
+import json
+import os
+from datetime import datetime
+
+from sources import run_git, list_tree_blobs, iter_blob_contents, decode_source
+
+
+def list_commits(repo, ref, max_commits, first_parent=False):
+    """
+    List commits reachable from ref, newest first.
+
+    Args:
+        repo: Repository directory
+        ref: Commit or branch to start from
+        max_commits: Maximum number of commits to list
+        first_parent: Follow only the first parent of merge commits
+
+    Returns:
+        List of (commit SHA, commit timestamp) tuples
+    """
+    args = ['rev-list', '--timestamp', f'--max-count={max_commits}']
+    if first_parent:
+        args.append('--first-parent')
+    output = run_git(repo, *args, ref, '--').decode('ascii')
+
+    commits = []
+    for line in output.splitlines():
+        timestamp, sha = line.split()
+        commits.append((sha, int(timestamp)))
+    return commits
+
+
+class BlobResultCache:
+    """
+    Per-blob smell counts keyed by blob SHA and detector configuration.
+
+    A blob's content never changes, so its counts stay valid for as long
+    as the detector configuration does.
+    """
+
+    def __init__(self, path=None):
+        """
+        Initialize the cache, loading it from path when one is given.
+
+        Args:
+            path: Optional JSON file keeping results between runs
+        """
+        self.path = path
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    @staticmethod
+    def _key(blob_sha, config_hash):
+        return f"{config_hash}:{blob_sha}"
+
+    def get(self, blob_sha, config_hash):
+        """Return cached counts for a blob, or None."""
+        entry = self.entries.get(self._key(blob_sha, config_hash))
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, blob_sha, config_hash, entry):
+        """Store the counts of one blob."""
+        self.entries[self._key(blob_sha, config_hash)] = entry
+
+    def save(self):
+        """Write the cache back to its file, if it has one."""
+        if not self.path:
+            return
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f)
+        os.replace(temp_path, self.path)
+
+
+def _count_blob(detector, name, data):
+    """Analyze one blob and reduce it to smell counts by type."""
+    try:
+        source_code = decode_source(data)
+    except (SyntaxError, UnicodeDecodeError):
+        return {'counts': {}, 'error': True}
+
+    result = detector.analyze_source(source_code, name)
+    counts = {}
+    for smell in result['smells']:
+        counts[smell['smell_type']] = counts.get(smell['smell_type'], 0) + 1
+    return {'counts': counts, 'error': 'error' in result}
+
+
+def classify_changes(before, after):
+    """
+    Split the smells of a commit into new, resolved and unchanged ones.
+
+    Counts are compared per file path and smell type, so a smell that
+    moves to another file is both resolved and new.
+
+    Args:
+        before: {path: {smell type: count}} of the previous commit
+        after: {path: {smell type: count}} of this commit
+
+    Returns:
+        Dictionary with 'new', 'resolved' and 'unchanged' counts
+    """
+    changes = {'new': 0, 'resolved': 0, 'unchanged': 0}
+    for path in before.keys() | after.keys():
+        old_counts = before.get(path, {})
+        new_counts = after.get(path, {})
+        if old_counts is new_counts:
+            changes['unchanged'] += sum(new_counts.values())
+            continue
+        for smell_type in old_counts.keys() | new_counts.keys():
+            old = old_counts.get(smell_type, 0)
+            new = new_counts.get(smell_type, 0)
+            kept = min(old, new)
+            changes['unchanged'] += kept
+            changes['new'] += new - kept
+            changes['resolved'] += old - kept
+    return changes
+
+
+def scan_history(detector, repo, ref='HEAD', max_commits=500, first_parent=False, cache=None):
+    """
+    Compute per-commit smell totals over the history of ref.
+
+    Every commit's tree is listed, but a blob is only analyzed the first
+    time it is seen, so the cost follows the number of unique blobs and
+    not commits times files. Each commit's smells are also classified as
+    new, resolved or unchanged against the commit listed before it (see
+    classify_changes); the oldest commit's smells are all new.
+
+    Args:
+        detector: Initialized CodeSmellDetector
+        repo: Repository directory (or a subdirectory of it)
+        ref: Commit or branch to start from
+        max_commits: Number of commits to walk back
+        first_parent: Follow only the first parent of merge commits
+        cache: Optional BlobResultCache shared between runs
+
+    Returns:
+        Dictionary with per-commit totals, oldest commit first
+    """
+    cache = cache or BlobResultCache()
+    config_hash = detector.config_fingerprint()
+    commits = list_commits(repo, ref, max_commits, first_parent)
+
+    trees = []
+    blob_names = {}
+    for sha, timestamp in commits:
+        blobs = list_tree_blobs(repo, sha)
+        trees.append((sha, timestamp, blobs))
+        for path, blob_sha in blobs:
+            blob_names.setdefault(blob_sha, f"{sha}:{path}")
+
+    blob_results = {}
+    missing = []
+    for blob_sha in blob_names:
+        entry = cache.get(blob_sha, config_hash)
+        if entry is None:
+            missing.append(blob_sha)
+        else:
+            blob_results[blob_sha] = entry
+
+    for blob_sha, data in iter_blob_contents(repo, missing):
+        if data is None:
+            entry = {'counts': {}, 'error': True}
+        else:
+            entry = _count_blob(detector, blob_names[blob_sha], data)
+        blob_results[blob_sha] = entry
+        cache.put(blob_sha, config_hash, entry)
+
+    history = []
+    previous = {}
+    for sha, timestamp, blobs in reversed(trees):
+        totals = {name: 0 for name in detector.active_detectors}
+        errors = 0
+        counts = {}
+        for path, blob_sha in blobs:
+            entry = blob_results[blob_sha]
+            errors += entry['error']
+            counts[path] = entry['counts']
+            for smell_type, count in entry['counts'].items():
+                totals[smell_type] = totals.get(smell_type, 0) + count
+        changes = classify_changes(previous, counts)
+        previous = counts
+        history.append({
+            'commit': sha,
+            'timestamp': timestamp,
+            'files': len(blobs),
+            'errors': errors,
+            'total_smells': sum(totals.values()),
+            'by_type': totals,
+            'new': changes['new'],
+            'resolved': changes['resolved'],
+            'unchanged': changes['unchanged']
+        })
+
+    return {
+        'ref': ref,
+        'config_hash': config_hash,
+        'active_detectors': detector.active_detectors,
+        'commits_scanned': len(commits),
+        'unique_blobs': len(blob_names),
+        'blobs_analyzed': len(missing),
+        'commits': history
+    }
+
+
+def format_history(history):
+    """Render scan_history() output as a text table."""
+    detectors = history['active_detectors']
+    header = ['Commit', 'Date', 'Files'] + detectors + ['Total', 'New', 'Resolved']
+    rows = []
+    for entry in history['commits']:
+        date = datetime.fromtimestamp(entry['timestamp']).strftime('%Y-%m-%d')
+        rows.append([entry['commit'][:10], date, str(entry['files'])] +
+                    [str(entry['by_type'].get(name, 0)) for name in detectors] +
+                    [str(entry['total_smells']), str(entry['new']), str(entry['resolved'])])
+
+    widths = [max(len(row[i]) for row in [header] + rows) for i in range(len(header))]
+    lines = ["=" * 80, f"SMELL HISTORY: {history['ref']} ({history['commits_scanned']} commits)", "=" * 80]
+    lines.append('  '.join(cell.ljust(width) for cell, width in zip(header, widths)))
+    for row in rows:
+        lines.append('  '.join(cell.ljust(width) for cell, width in zip(row, widths)))
+    lines.append("=" * 80)
+    lines.append(f"Unique blobs: {history['unique_blobs']}, analyzed this run: {history['blobs_analyzed']}")
+    return '\n'.join(lines)
@@ -0,0 +1,394 @@
+"""
+Incremental re-analysis of one document, scoped to top-level definitions.
+"""
+
+import ast
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+class DefinitionCache:
+    """
+    Least-recently-used store of per-definition results.
+
+    Entries are grouped by kind: 'chunk' maps the hash of a top-level
+    statement's text to its definition-scoped findings, and detectors
+    with detect_cached() add their own kinds (DuplicatedCode stores
+    'pair' similarities and in-method 'blocks'). Everything depends on
+    the detector configuration, so a file saved under another
+    configuration hash is ignored.
+    """
+
+    MAX_ENTRIES = 200000
+
+    def __init__(self, path=None, namespace='', max_entries=MAX_ENTRIES):
+        """
+        Initialize the cache, loading it from path when one is given.
+
+        Args:
+            path: Optional JSON file keeping results between runs
+            namespace: Configuration hash the entries are valid for
+            max_entries: Entries kept before the least recently used go
+        """
+        self.path = path
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.added = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('namespace') == namespace:
+                    self.entries.update(data.get('entries', {}))
+            except (OSError, ValueError, AttributeError):
+                self.entries = OrderedDict()
+
+    def get(self, kind, key):
+        """Return a stored value, or None."""
+        full_key = f"{kind}:{key}"
+        with self._lock:
+            value = self.entries.get(full_key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(full_key)
+            return value
+
+    def put(self, kind, key, value):
+        """Store a value, evicting the least recently used entries if full."""
+        full_key = f"{kind}:{key}"
+        with self._lock:
+            self.entries[full_key] = value
+            self.entries.move_to_end(full_key)
+            self.added[full_key] = value
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def take_added(self):
+        """Remove and return entries put since the last call (for worker processes)."""
+        with self._lock:
+            added, self.added = self.added, {}
+        return added
+
+    def merge(self, entries):
+        """Add entries stored by another cache, e.g. in a worker process."""
+        for full_key, value in entries.items():
+            kind, _, key = full_key.partition(':')
+            self.put(kind, key, value)
+
+    def save(self):
+        """Write the cache back to its file, if it has one."""
+        if not self.path:
+            return
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with self._lock:
+            data = {'namespace': self.namespace, 'entries': dict(self.entries)}
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, default=str)
+        os.replace(temp_path, self.path)
+
+
+def _common_ends(old_lines, new_lines):
+    """
+    Count the lines two versions of a text share at the start and end.
+
+    Returns:
+        Tuple (prefix, suffix); they never overlap
+    """
+    limit = min(len(old_lines), len(new_lines))
+    prefix = 0
+    while prefix < limit and old_lines[prefix] == new_lines[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old_lines[-1 - suffix] == new_lines[-1 - suffix]:
+        suffix += 1
+    return prefix, suffix
+
+
+class IncrementalAnalyzer:
+    """
+    Keeps per-definition results for one document between edits.
+
+    The document is split into chunks, one per top-level statement
+    (statements sharing a line are kept together). Findings of
+    'definition'-scoped detectors are cached by the hash of each chunk's
+    text, relative to the chunk's first line. After an edit only the
+    region around the changed lines is re-parsed and re-analyzed; chunks
+    above it are reused as they are and chunks below it are shifted.
+    'module'-scoped detectors re-run on the whole document, but through
+    detect_cached(), so DuplicatedCode only compares changed definitions
+    again.
+    """
+
+    def __init__(self, detector, filename, cache=None):
+        """
+        Initialize the analyzer.
+
+        Args:
+            detector: Initialized CodeSmellDetector providing the detectors
+            filename: Name reported for the document in findings
+            cache: DefinitionCache shared with other documents or runs
+                (default: one private to this document)
+        """
+        self.detector = detector
+        self.filename = filename
+        self.cache = cache if cache is not None else DefinitionCache(max_entries=20000)
+        self.lines = None
+        self.chunks = []
+        self.chunk_smells = {}
+        self.module_smells = []
+        self._module_hash = None
+        self._module_lines = None
+        self.error = None
+        self.chunks_analyzed = 0
+        self.chunks_reused = 0
+
+    def _detectors(self, scope):
+        """Active detectors with the given scope."""
+        return [self.detector.detectors[name] for name in self.detector.active_detectors
+                if self.detector.detectors[name].scope == scope]
+
+    def update(self, source_code):
+        """
+        Bring definition-scoped findings up to date with new source.
+
+        Args:
+            source_code: Full text of the document
+
+        Returns:
+            True if the findings match source_code, False if the document
+            does not parse (the previous findings are kept)
+        """
+        new_lines = source_code.split('\n')
+
+        if self.lines is not None and self._update_region(new_lines):
+            updated = True
+        else:
+            updated = self._reparse_all(new_lines)
+
+        if updated:
+            self.error = None
+            self.lines = new_lines
+            self._shift_module_smells(new_lines)
+            live = {chunk['hash'] for chunk in self.chunks}
+            self.chunk_smells = {h: s for h, s in self.chunk_smells.items() if h in live}
+        return updated
+
+    def update_module_scope(self, source_code):
+        """
+        Re-run 'module'-scoped detectors on the whole document.
+
+        These compare definitions with each other, so they need a full
+        parse; the result is cached by the hash of the whole text.
+
+        Returns:
+            True if the findings match source_code, False on a syntax error
+        """
+        detectors = self._detectors('module')
+        if not detectors:
+            return True
+
+        text_hash = self._hash(source_code)
+        if text_hash == self._module_hash:
+            return True
+
+        try:
+            ast_tree = ast.parse(source_code, filename=self.filename)
+        except SyntaxError as e:
+            self.error = f"Syntax error: {e}"
+            return False
+
+        self._run_module_scope(ast_tree, source_code, detectors)
+        self._module_hash = text_hash
+        self._module_lines = source_code.split('\n')
+        return True
+
+    def analyze_parsed(self, ast_tree, source_code):
+        """
+        Analyze a whole document that has already been parsed.
+
+        Used for files analyzed once with a cache shared between files:
+        each top-level chunk is looked up by its hash, and module-scoped
+        detectors reuse the cached comparisons of unchanged definitions.
+
+        Args:
+            ast_tree: Module parsed from source_code
+            source_code: Full text of the document
+        """
+        self.lines = source_code.split('\n')
+        self.chunks = self._build_chunks(ast_tree, source_code, self.lines, 0)
+        self._run_module_scope(ast_tree, source_code, self._detectors('module'))
+        self._module_hash = self._hash(source_code)
+        self._module_lines = self.lines
+
+    def _run_module_scope(self, ast_tree, source_code, detectors):
+        """Run 'module'-scoped detectors with the shared cache."""
+        smells = []
+        for detector in detectors:
+            smells.extend(detector.detect_cached(ast_tree, source_code, self.filename, self.cache))
+        self.module_smells = smells
+
+    def _shift_module_smells(self, new_lines):
+        """
+        Move module-scoped findings to the lines of new text until they rerun.
+
+        Findings above the edited lines stay, findings below move with the
+        edit, and findings overlapping it are dropped: update_module_scope()
+        will recompute them.
+        """
+        old_lines = self._module_lines
+        if old_lines is None or old_lines is new_lines:
+            return
+        prefix, suffix = _common_ends(old_lines, new_lines)
+        if prefix == len(old_lines) == len(new_lines):
+            self._module_lines = new_lines
+            return
+        changed_end = len(old_lines) - suffix
+        delta = len(new_lines) - len(old_lines)
+        shifted = []
+        for smell in self.module_smells:
+            if smell['line_end'] <= prefix:
+                shifted.append(smell)
+            elif smell['line_start'] > changed_end:
+                shifted.append(dict(smell, line_start=smell['line_start'] + delta,
+                                    line_end=smell['line_end'] + delta))
+        self.module_smells = shifted
+        self._module_lines = new_lines
+
+    def smells(self):
+        """
+        Current findings with line numbers for the latest parsed text.
+
+        Returns:
+            List of smell dictionaries
+        """
+        smells = []
+        for chunk in self.chunks:
+            for smell in self.chunk_smells[chunk['hash']]:
+                smell = dict(smell, file=self.filename)
+                smell['line_start'] += chunk['start']
+                smell['line_end'] += chunk['start']
+                smells.append(smell)
+        return smells + self.module_smells
+
+    def _reparse_all(self, new_lines):
+        """Parse the whole document and rebuild every chunk."""
+        try:
+            ast_tree = ast.parse('\n'.join(new_lines), filename=self.filename)
+        except SyntaxError as e:
+            self.error = f"Syntax error: {e}"
+            return False
+
+        self.chunks = self._build_chunks(ast_tree, '\n'.join(new_lines), new_lines, 0)
+        return True
+
+    def _update_region(self, new_lines):
+        """
+        Re-parse only the lines around an edit.
+
+        Returns:
+            False if the region does not parse on its own, in which case
+            the caller falls back to a full parse
+        """
+        old_lines = self.lines
+        prefix, suffix = _common_ends(old_lines, new_lines)
+        if prefix == len(old_lines) == len(new_lines):
+            return True
+
+        delta = len(new_lines) - len(old_lines)
+        changed_start = prefix + 1
+        changed_end = len(old_lines) - suffix
+
+        # A chunk ending right above or starting right below the edit may
+        # have been extended by it (an indented line, a new decorator)
+        affected = [chunk for chunk in self.chunks
+                    if chunk['end'] >= changed_start - 1 and chunk['start'] <= changed_end + 1]
+        region_start = min([changed_start] + [chunk['start'] for chunk in affected])
+        region_end_old = max([changed_end] + [chunk['end'] for chunk in affected])
+        region_end = region_end_old + delta
+
+        region_source = '\n'.join(new_lines[region_start - 1:region_end])
+        try:
+            region_tree = ast.parse(region_source, filename=self.filename)
+        except SyntaxError:
+            return False
+
+        before = [chunk for chunk in self.chunks if chunk['end'] < region_start]
+        after = []
+        for chunk in self.chunks:
+            if chunk['start'] > region_end_old:
+                chunk = dict(chunk)
+                chunk['start'] += delta
+                chunk['end'] += delta
+                after.append(chunk)
+
+        self.chunks = before + self._build_chunks(region_tree, region_source, new_lines,
+                                                      region_start - 1) + after
+        return True
+
+    def _build_chunks(self, ast_tree, source_code, lines, offset):
+        """
+        Group top-level statements into chunks and analyze new ones.
+
+        Args:
+            ast_tree: Module parsed from source_code
+            source_code: Document text starting after line `offset`
+            lines: All lines of the document
+            offset: Number of document lines above the parsed text
+
+        Returns:
+            List of chunk dictionaries (start, end, hash) in document lines
+        """
+        groups = []
+        for node in ast_tree.body:
+            decorators = getattr(node, 'decorator_list', [])
+            start = min([node.lineno] + [d.lineno for d in decorators]) + offset
+            end = node.end_lineno + offset
+            if groups and start <= groups[-1]['end']:
+                groups[-1]['end'] = max(groups[-1]['end'], end)
+                groups[-1]['nodes'].append(node)
+            else:
+                groups.append({'start': start, 'end': end, 'nodes': [node]})
+
+        detectors = self._detectors('definition')
+        chunks = []
+        for group in groups:
+            chunk_hash = self._hash('\n'.join(lines[group['start'] - 1:group['end']]))
+            if chunk_hash in self.chunk_smells:
+                self.chunks_reused += 1
+            else:
+                smells = self.cache.get('chunk', chunk_hash)
+                if smells is None:
+                    smells = self._analyze_chunk(group['nodes'], source_code,
+                                                 group['start'] - offset, detectors)
+                    self.cache.put('chunk', chunk_hash, smells)
+                    self.chunks_analyzed += 1
+                else:
+                    self.chunks_reused += 1
+                self.chunk_smells[chunk_hash] = smells
+            chunks.append({'start': group['start'], 'end': group['end'], 'hash': chunk_hash})
+        return chunks
+
+    def _analyze_chunk(self, nodes, source_code, first_line, detectors):
+        """Run detectors on one chunk, returning findings relative to first_line."""
+        module = ast.Module(body=nodes, type_ignores=[])
+        smells = []
+        for detector in detectors:
+            for smell in detector.detect(module, source_code, self.filename):
+                smell['line_start'] -= first_line
+                smell['line_end'] -= first_line
+                smells.append(smell)
+        return smells
+
+    @staticmethod
+    def _hash(text):
+        """Content hash used as a cache key."""
+        return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
@@ -0,0 +1,303 @@
+"""
+Language Server Protocol mode: publishes code smells as editor diagnostics.
+
+Speaks JSON-RPC over stdin/stdout only; nothing is opened on the network.
+Each open document keeps an IncrementalAnalyzer, so an edit re-runs
+detectors only for the top-level functions and classes it touched.
+"""
+
+import json
+import sys
+import threading
+from urllib.parse import unquote, urlparse
+
+from incremental import IncrementalAnalyzer
+
+
+# LSP DiagnosticSeverity values
+SEVERITY = {'high': 2, 'medium': 3, 'low': 4}
+
+# JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+
+class _Document:
+    """State kept for one open text document."""
+
+    def __init__(self, uri, text, version, analyzer):
+        self.uri = uri
+        self.lines = text.split('\n')
+        self.version = version
+        self.analyzer = analyzer
+        self.lock = threading.Lock()
+        self.timer = None
+        self.module_timer = None
+
+    def apply_change(self, change):
+        """Apply one contentChanges entry from textDocument/didChange."""
+        if 'range' not in change:
+            self.lines = change['text'].split('\n')
+            return
+
+        start, end = change['range']['start'], change['range']['end']
+        start_line = min(start['line'], len(self.lines) - 1)
+        end_line = min(end['line'], len(self.lines) - 1)
+        head = self.lines[start_line][:_utf16_index(self.lines[start_line], start['character'])]
+        tail = self.lines[end_line][_utf16_index(self.lines[end_line], end['character']):]
+        self.lines[start_line:end_line + 1] = (head + change['text'] + tail).split('\n')
+
+
+def _utf16_index(line, character):
+    """Convert an LSP character offset (UTF-16 code units) to a str index."""
+    if line.isascii():
+        return min(character, len(line))
+    units = 0
+    for index, char in enumerate(line):
+        if units >= character:
+            return index
+        units += 2 if ord(char) > 0xFFFF else 1
+    return len(line)
+
+
+def _log(message):
+    """Log to stderr; stdout carries the protocol."""
+    print(f"code-smell-detector lsp: {message}", file=sys.stderr)
+
+
+def _uri_to_path(uri):
+    """Turn a file:// URI into a path for reports; other URIs are kept."""
+    parsed = urlparse(uri)
+    if parsed.scheme == 'file':
+        return unquote(parsed.path)
+    return uri
+
+
+class LanguageServer:
+    """Minimal LSP server that publishes diagnostics from the detectors."""
+
+    def __init__(self, detector, reader=None, writer=None, debounce=0.03, module_debounce=0.5):
+        """
+        Initialize the server.
+
+        Args:
+            detector: Initialized CodeSmellDetector
+            reader: Binary stream to read requests from (default: stdin)
+            writer: Binary stream to write responses to (default: stdout)
+            debounce: Seconds to wait after an edit before re-analyzing
+                definition-scoped detectors
+            module_debounce: Seconds to wait before re-running detectors
+                that compare the whole file (DuplicatedCode)
+        """
+        self.detector = detector
+        self.reader = reader or sys.stdin.buffer
+        self.writer = writer or sys.stdout.buffer
+        self.debounce = debounce
+        self.module_debounce = module_debounce
+        self.documents = {}
+        self._write_lock = threading.Lock()
+        self._shutdown_requested = False
+
+    def serve(self):
+        """
+        Handle messages until the client sends 'exit' or closes the stream.
+
+        Returns:
+            Process exit code (0 if 'shutdown' was requested first)
+        """
+        while True:
+            try:
+                message = self._read_message()
+            except (ValueError, UnicodeDecodeError) as e:
+                # A bad header or body only loses that one message
+                _log(f"Dropping malformed message: {e}")
+                self._send_error(None, PARSE_ERROR, f"Parse error: {e}")
+                continue
+            if message is None:
+                return 1
+            if not isinstance(message, dict):
+                self._send_error(None, INVALID_REQUEST, "Invalid request: expected an object")
+                continue
+            if message.get('method') == 'exit':
+                return 0 if self._shutdown_requested else 1
+            self._dispatch(message)
+
+    def _read_message(self):
+        """
+        Read one Content-Length framed JSON-RPC message.
+
+        Raises:
+            ValueError: If the header or the JSON body is malformed
+        """
+        content_length = None
+        while True:
+            header = self.reader.readline()
+            if not header:
+                return None
+            header = header.strip()
+            if not header:
+                break
+            name, _, value = header.decode('ascii').partition(':')
+            if name.lower() == 'content-length':
+                content_length = int(value.strip())
+
+        if content_length is None:
+            return {}
+        return json.loads(self.reader.read(content_length).decode('utf-8'))
+
+    def _send(self, payload):
+        """Write one JSON-RPC message."""
+        body = json.dumps(payload).encode('utf-8')
+        with self._write_lock:
+            self.writer.write(f"Content-Length: {len(body)}\r\n\r\n".encode('ascii') + body)
+            self.writer.flush()
+
+    def _send_error(self, request_id, code, message):
+        """Write a JSON-RPC error response."""
+        self._send({'jsonrpc': '2.0', 'id': request_id,
+                    'error': {'code': code, 'message': message}})
+
+    def _dispatch(self, message):
+        """Route a request or notification to its handler."""
+        method = message.get('method')
+        params = message.get('params') or {}
+        handlers = {
+            'initialize': self._initialize,
+            'shutdown': self._shutdown,
+            'textDocument/didOpen': self._did_open,
+            'textDocument/didChange': self._did_change,
+            'textDocument/didClose': self._did_close,
+        }
+
+        handler = handlers.get(method)
+        if 'id' not in message:
+            if handler:
+                try:
+                    handler(params)
+                except Exception as e:
+                    # Notifications get no response; drop this one and go on
+                    _log(f"Ignoring '{method}' notification: {type(e).__name__}: {e}")
+            return
+
+        if handler is None:
+            self._send_error(message['id'], METHOD_NOT_FOUND, f"Unknown method '{method}'")
+            return
+        try:
+            result = handler(params)
+        except (KeyError, TypeError, AttributeError) as e:
+            self._send_error(message['id'], INVALID_PARAMS,
+                             f"Invalid params for '{method}': {type(e).__name__}: {e}")
+            return
+        except Exception as e:
+            self._send_error(message['id'], INTERNAL_ERROR,
+                             f"'{method}' failed: {type(e).__name__}: {e}")
+            return
+        self._send({'jsonrpc': '2.0', 'id': message['id'], 'result': result})
+
+    def _initialize(self, params):
+        """Advertise incremental text sync; diagnostics are pushed."""
+        return {
+            'capabilities': {
+                'textDocumentSync': {'openClose': True, 'change': 2}
+            },
+            'serverInfo': {'name': 'code-smell-detector'}
+        }
+
+    def _shutdown(self, params):
+        """Stop pending analyses before the client sends 'exit'."""
+        self._shutdown_requested = True
+        for document in self.documents.values():
+            self._cancel_timers(document)
+        return None
+
+    def _did_open(self, params):
+        """Start tracking a document and analyze it right away."""
+        item = params['textDocument']
+        analyzer = IncrementalAnalyzer(self.detector, _uri_to_path(item['uri']))
+        document = _Document(item['uri'], item['text'], item.get('version'), analyzer)
+        self.documents[item['uri']] = document
+        self._schedule(document, 0, 0)
+
+    def _did_change(self, params):
+        """Apply edits and schedule a debounced re-analysis."""
+        document = self.documents.get(params['textDocument']['uri'])
+        if document is None:
+            return
+        with document.lock:
+            for change in params['contentChanges']:
+                document.apply_change(change)
+            document.version = params['textDocument'].get('version')
+        self._schedule(document, self.debounce, self.module_debounce)
+
+    def _did_close(self, params):
+        """Forget a document and clear its diagnostics."""
+        document = self.documents.pop(params['textDocument']['uri'], None)
+        if document is not None:
+            self._cancel_timers(document)
+            self._send({'jsonrpc': '2.0', 'method': 'textDocument/publishDiagnostics',
+                        'params': {'uri': document.uri, 'diagnostics': []}})
+
+    def _cancel_timers(self, document):
+        """Drop analyses that have not started yet."""
+        for timer in (document.timer, document.module_timer):
+            if timer is not None:
+                timer.cancel()
+
+    def _schedule(self, document, delay, module_delay):
+        """(Re)start the debounce timers of a document."""
+        self._cancel_timers(document)
+        document.timer = threading.Timer(delay, self._analyze, (document, False))
+        document.module_timer = threading.Timer(module_delay, self._analyze, (document, True))
+        document.timer.start()
+        document.module_timer.start()
+
+    def _analyze(self, document, module_scope):
+        """Re-analyze a document and publish its diagnostics."""
+        with document.lock:
+            if self.documents.get(document.uri) is not document:
+                return
+            text = '\n'.join(document.lines)
+            if module_scope:
+                updated = document.analyzer.update_module_scope(text)
+            else:
+                updated = document.analyzer.update(text)
+            if not updated:
+                # Keep the last diagnostics while the user is mid-edit
+                return
+            version = document.version
+            diagnostics = [self._to_diagnostic(smell, document.lines)
+                           for smell in document.analyzer.smells()]
+
+        self._send({
+            'jsonrpc': '2.0',
+            'method': 'textDocument/publishDiagnostics',
+            'params': {
+                'uri': document.uri,
+                'version': version,
+                'diagnostics': diagnostics
+            }
+        })
+
+    @staticmethod
+    def _to_diagnostic(smell, lines):
+        """Convert a smell dictionary into an LSP Diagnostic."""
+        end_line = max(min(smell['line_end'], len(lines)) - 1, 0)
+        return {
+            'range': {
+                'start': {'line': max(smell['line_start'] - 1, 0), 'character': 0},
+                'end': {'line': end_line,
+                        'character': len(lines[end_line].encode('utf-16-le')) // 2 if lines else 0}
+            },
+            'severity': SEVERITY.get(smell['severity'], 3),
+            'code': smell['smell_type'],
+            'source': 'code-smell-detector',
+            'message': smell['description']
+        }
+
+
+def serve(detector):
+    """Run the language server on stdin/stdout and return its exit code."""
+    return LanguageServer(detector).serve()
@@ -6,39 +6,81 @@ Detects common code smells in Python source code.
 
 import ast
 import argparse
+import contextlib
+import hashlib
+import json
 import sys
 import os
+import threading
+import time
 import yaml
-from pathlib import Path
 from datetime import datetime
 
-from detectors import (
-    LongMethodDetector,
-    GodClassDetector,
-    DuplicatedCodeDetector,
-    LargeParameterListDetector,
-    MagicNumbersDetector,
-    FeatureEnvyDetector
-)
+# Only what every run needs is imported here, so that a commit hook with
+# nothing staged starts quickly; the rest is imported where it is used.
+from metrics import ScanStats, new_file_timings, write_metrics_file
+from tracing import Tracer
+from memprofile import MemoryProfiler, format_memory_report
+from sources import (decode_source, iter_git_sources, list_staged_changes,
+                     iter_staged_sources, GitError, is_archive, iter_archive_sources,
+                     ArchiveError, read_source_file, check_source_size, SourceTooLarge)
+from detectors import DetectorRegistry
 
 
 class CodeSmellDetector:
     """Main detector class that coordinates all smell detectors."""
     
-    DETECTOR_CLASSES = {
-        'LongMethod': LongMethodDetector,
-        'GodClass': GodClassDetector,
-        'DuplicatedCode': DuplicatedCodeDetector,
-        'LargeParameterList': LargeParameterListDetector,
-        'MagicNumbers': MagicNumbersDetector,
-        'FeatureEnvy': FeatureEnvyDetector
-    }
+    # Built-in and installed detectors; modules are imported on lookup
+    DETECTOR_CLASSES = DetectorRegistry()
+    
+    # Smaller files finish faster than detector threads can be scheduled
+    PARALLEL_MIN_LINES = 1000
     
-    def __init__(self, config_path='config.yaml'):
-        """Initialize the detector with configuration."""
-        self.config = self._load_config(config_path)
+    def __init__(self, config_path='config.yaml', max_workers=None, detector_threads=1,
+                 jobs=1, history_path=None, config=None):
+        """
+        Initialize the detector with configuration.
+        
+        Args:
+            config_path: Path to the YAML configuration file
+            max_workers: Worker threads used by the async API (default: CPU count)
+            detector_threads: Threads running detectors in parallel on one
+                parsed file (1 runs them one after another)
+            jobs: Worker processes for multi-file analysis (1 runs serially)
+            history_path: Timing history used to schedule parallel runs
+            config: Already-loaded configuration, used instead of config_path
+        """
+        self.config = config if config is not None else self._load_config(config_path)
+        self.registry = self.DETECTOR_CLASSES.with_plugins(self.config.get('plugins'))
         self.detectors = {}
         self.active_detectors = []
+        self.selection = {}
+        self.profiles = []
+        self.detector_profiles = {}
+        self.prefilter = self.config.get('prefilter', True)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self.detector_threads = detector_threads
+        self._detector_executor = None
+        self.shard = None
+        self.sample = None
+        self.sample_plan = None
+        self.sample_lines = {}
+        self.sample_stats = None
+        self.jobs = jobs
+        self.history_path = history_path
+        self.schedule_stats = None
+        self.stats = ScanStats()
+        self.tracer = Tracer(enabled=False)
+        self.memory = MemoryProfiler(enabled=False)
+        self.memory_stats = None
+        self.definition_cache = None
+        self.stop_when = None
+        self.stopped_at = None
+        self.max_file_size = None
+        self.io_threads = 0
+        self.pipeline_stats = None
     
     def _load_config(self, config_path):
         """Load configuration from YAML file."""
@@ -64,43 +106,184 @@ class CodeSmellDetector:
                 'LargeParameterList': {'enabled': True, 'threshold': 5},
                 'MagicNumbers': {'enabled': True, 'allowed_numbers': [0, 1, -1, 2]},
                 'FeatureEnvy': {'enabled': True, 'external_call_ratio': 0.6, 'min_external_calls': 3}
-            }
+            },
+            'prefilter': True
         }
     
-    def initialize_detectors(self, only=None, exclude=None):
+    def initialize_detectors(self, only=None, exclude=None, profiles=None):
         """
         Initialize detectors based on config and CLI arguments.
         
+        Only active detectors are imported and instantiated.
+        
         Args:
             only: List of detector names to run exclusively
             exclude: List of detector names to exclude
+            profiles: Names of profiles from the config's 'profiles'
+                section to evaluate together (see _initialize_profiles)
+        
+        Raises:
+            ValueError: If a profile is not defined in the config, or
+                --only names an unknown detector
         """
+        self.selection = {'only': only, 'exclude': exclude, 'profiles': profiles}
+        if profiles:
+            self._initialize_profiles(only, exclude, profiles)
+            return
+        
         detector_configs = self.config.get('detectors', {})
         
-        for detector_name, detector_class in self.DETECTOR_CLASSES.items():
+        for detector_name in self._candidate_detectors(only, detector_configs):
             # Get detector config
             detector_config = detector_configs.get(detector_name, {})
             
-            # Determine if this detector should be active
-            should_activate = False
-            
-            if only:
-                # CLI --only flag overrides everything
-                should_activate = detector_name in only
-            elif exclude:
-                # CLI --exclude flag overrides config
-                enabled_in_config = detector_config.get('enabled', True)
-                should_activate = enabled_in_config and detector_name not in exclude
-            else:
-                # Use config file setting
-                should_activate = detector_config.get('enabled', True)
-            
-            # Create detector instance
-            self.detectors[detector_name] = detector_class(detector_config)
+            if not self._should_activate(detector_name, detector_config, only, exclude):
+                continue
             
-            if should_activate:
+            detector = self._create_detector(detector_name, detector_config)
+            if detector is not None:
+                self.detectors[detector_name] = detector
                 self.active_detectors.append(detector_name)
     
+    def _candidate_detectors(self, only, *configs):
+        """
+        Names of the detectors that could be activated, in registry order.
+        
+        Installed plugins are disabled unless --only or a config names
+        them, so the entry points are only looked at for names the
+        built-in and config-declared detectors don't cover.
+        
+        Args:
+            only: Names from --only, or None
+            configs: Mappings whose keys are detector names
+        
+        Raises:
+            ValueError: If --only names a detector that doesn't exist
+        """
+        names = self.registry.known()
+        for name in list(only or []) + [name for config in configs for name in config]:
+            if name in names:
+                continue
+            if name in self.registry:
+                names.append(name)
+            elif only and name in only:
+                raise ValueError(f"Unknown detector '{name}'")
+        return names
+    
+    def _should_activate(self, detector_name, detector_config, only, exclude):
+        """Decide whether a detector runs, from CLI arguments and its config."""
+        default_enabled = self.registry.spec(detector_name).enabled_by_default
+        
+        if only:
+            # CLI --only flag overrides everything
+            return detector_name in only
+        if exclude:
+            # CLI --exclude flag overrides config
+            enabled_in_config = detector_config.get('enabled', default_enabled)
+            return enabled_in_config and detector_name not in exclude
+        # Use config file setting
+        return detector_config.get('enabled', default_enabled)
+    
+    def _create_detector(self, detector_name, detector_config):
+        """Import and create a detector, or warn and return None."""
+        try:
+            detector_class = self.registry[detector_name]
+        except (ImportError, AttributeError) as e:
+            print(f"Warning: Could not load detector '{detector_name}': {e}", file=sys.stderr)
+            return None
+        return detector_class(detector_config)
+    
+    def _initialize_profiles(self, only, exclude, profiles):
+        """
+        Set up detectors for several profiles evaluated in one scan.
+        
+        A profile in the config's 'profiles' section overrides settings of
+        the 'detectors' section, per detector:
+        
+            profiles:
+              strict:
+                LongMethod: {threshold: 20}
+              legacy:
+                LongMethod: {threshold: 80}
+                MagicNumbers: {enabled: false}
+        
+        Detectors whose effective settings are the same in several
+        profiles are created once and run once per file. Instances are
+        named like 'LongMethod[strict]' or 'MagicNumbers[strict+legacy]';
+        self.detector_profiles maps each name to its profiles. Instances
+        with different settings share the parsed tree and, for detectors
+        that implement collect_facts(), the per-node facts computed from
+        it, so each such detector walks the tree once per file.
+        """
+        defined = self.config.get('profiles') or {}
+        for profile in profiles:
+            if profile not in defined:
+                known = ', '.join(defined) or 'none'
+                raise ValueError(f"Unknown profile '{profile}' (defined: {known})")
+        
+        detector_configs = self.config.get('detectors', {})
+        instances = {}
+        profile_configs = [defined[profile] or {} for profile in profiles]
+        for detector_name in self._candidate_detectors(only, detector_configs, *profile_configs):
+            for profile in profiles:
+                overrides = (defined[profile] or {}).get(detector_name) or {}
+                detector_config = dict(detector_configs.get(detector_name, {}), **overrides)
+                if not self._should_activate(detector_name, detector_config, only, exclude):
+                    continue
+                key = (detector_name, json.dumps(detector_config, sort_keys=True, default=str))
+                if key not in instances:
+                    instances[key] = (detector_config, [])
+                instances[key][1].append(profile)
+        
+        self.profiles = list(profiles)
+        for (detector_name, _), (detector_config, instance_profiles) in instances.items():
+            detector = self._create_detector(detector_name, detector_config)
+            if detector is None:
+                continue
+            instance_name = f"{detector_name}[{'+'.join(instance_profiles)}]"
+            self.detectors[instance_name] = detector
+            self.active_detectors.append(instance_name)
+            self.detector_profiles[instance_name] = instance_profiles
+    
+    def _tag_profiles(self, detector_runs):
+        """
+        Merge the findings of profile instances, tagging each with profiles.
+        
+        Findings that are identical in every field are reported once, with
+        all profiles whose instances produced them. Findings that differ,
+        for example in a threshold quoted in the description, stay
+        separate, so keeping the findings tagged with one profile gives
+        exactly what a run with that profile alone would report.
+        
+        Args:
+            detector_runs: (instance name, smells) pairs in active order
+        
+        Returns:
+            List of findings, each with a 'profiles' list
+        """
+        merged = {}
+        for detector_name, smells in detector_runs:
+            for smell in smells:
+                key = json.dumps(smell, sort_keys=True, default=str)
+                if key not in merged:
+                    merged[key] = dict(smell, profiles=[])
+                merged[key]['profiles'].extend(self.detector_profiles[detector_name])
+        order = {profile: index for index, profile in enumerate(self.profiles)}
+        for smell in merged.values():
+            smell['profiles'] = sorted(set(smell['profiles']), key=order.get)
+        return list(merged.values())
+    
+    def config_fingerprint(self):
+        """
+        Hash of everything that affects findings: the active detectors and
+        their settings. Cached results are only valid for the same hash.
+        """
+        settings = {
+            name: self.detectors[name].config for name in self.active_detectors
+        }
+        payload = json.dumps(settings, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+    
     def analyze_file(self, filepath):
         """
         Analyze a single Python file for code smells.
@@ -108,29 +291,161 @@ class CodeSmellDetector:
         Args:
             filepath: Path to the Python file
         
+        Returns:
+            Dictionary containing analysis results
+        """
+        result, timings = self._analyze_file_timed(filepath)
+        self._record_file(filepath, timings)
+        return result
+    
+    def _record_file(self, filepath, timings, worker=False):
+        """
+        Add a file's timings to self.stats, keeping its line count for
+        the sample estimates when the files are a sample.
+        """
+        self.stats.record_file(timings, worker=worker)
+        if self.sample_plan is not None and not timings['error']:
+            self.sample_lines[filepath] = timings['lines']
+    
+    def _analyze_file_timed(self, filepath, loaded=None):
+        """
+        Analyze a single file and measure each step.
+        
+        Args:
+            filepath: Path to the Python file
+            loaded: Result of _load_file() when the file was already read
+                by the prefetch pipeline, None to read it here
+        
+        Returns:
+            Tuple (analysis result, timings from new_file_timings())
+        """
+        timings = new_file_timings()
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        
+        with self.tracer.span('file', 'file', file=filepath), self.memory.measure('file', filepath):
+            if loaded is None:
+                loaded = self._load_file(filepath)
+            source_code, error, timings['read'] = loaded
+            if source_code is not None:
+                timings['lines'] = source_code.count('\n')
+            if error is not None:
+                timings['error'] = True
+                result = {
+                    'file': filepath,
+                    'error': error,
+                    'smells': []
+                }
+            else:
+                result = self._analyze_source_timed(source_code, filepath, timings)
+        
+        timings['seconds'] = time.perf_counter() - start
+        timings['cpu_seconds'] = time.thread_time() - cpu_start
+        return result, timings
+    
+    def _load_file(self, filepath):
+        """
+        Read and decode a file, enforcing self.max_file_size.
+        
+        The file is read once as bytes and decoded using its PEP 263
+        coding comment. Safe to call from the prefetch threads.
+        
+        Returns:
+            Tuple (source code or None, error message or None, seconds spent)
+        """
+        start = time.perf_counter()
+        with self.tracer.span('read', 'io', file=filepath):
+            try:
+                source_code = read_source_file(filepath, self.max_file_size)
+            except (SyntaxError, UnicodeDecodeError) as e:
+                return None, f"Decode error: {e}", time.perf_counter() - start
+            except Exception as e:
+                return None, str(e), time.perf_counter() - start
+        return source_code, None, time.perf_counter() - start
+    
+    def analyze_source(self, source_code, filepath='<string>'):
+        """
+        Analyze Python source code that is already in memory.
+        
+        Args:
+            source_code: Python source code as string
+            filepath: Name reported for the source in results
+        
+        Returns:
+            Dictionary containing analysis results
+        """
+        timings = new_file_timings()
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        with self.tracer.span('file', 'file', file=filepath), self.memory.measure('file', filepath):
+            result = self._analyze_source_timed(source_code, filepath, timings)
+        timings['seconds'] = time.perf_counter() - start
+        timings['cpu_seconds'] = time.thread_time() - cpu_start
+        self.stats.record_file(timings)
+        return result
+    
+    def _analyze_source_timed(self, source_code, filepath, timings):
+        """
+        Analyze in-memory source, filling in parse and detector timings.
+        
+        Args:
+            source_code: Python source code as string
+            filepath: Name reported for the source in results
+            timings: Dictionary from new_file_timings() to update
+        
         Returns:
             Dictionary containing analysis results
         """
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                source_code = f.read()
+            # Skip parsing when no active detector could possibly fire
+            if self.prefilter and not self._may_fire(source_code):
+                timings['skipped'] = True
+                return {
+                    'file': filepath,
+                    'smells': [],
+                    'smell_count': 0,
+                    'skipped': True
+                }
             
             # Parse the source code into AST
+            parse_start = time.perf_counter()
             try:
-                ast_tree = ast.parse(source_code, filename=filepath)
+                with self.tracer.span('ast.parse', 'parse'), \
+                        self.memory.measure('parse', 'ast.parse', filepath):
+                    ast_tree = ast.parse(source_code, filename=filepath)
             except SyntaxError as e:
+                timings['parse_failed'] = timings['error'] = True
                 return {
                     'file': filepath,
                     'error': f"Syntax error: {e}",
                     'smells': []
                 }
+            finally:
+                timings['parse'] = time.perf_counter() - parse_start
+            timings['bytes'] = len(source_code.encode('utf-8', 'surrogatepass'))
+            
+            if self.definition_cache is not None:
+                return self._analyze_with_cache(ast_tree, source_code, filepath, timings)
             
             # Run active detectors
             all_smells = []
-            for detector_name in self.active_detectors:
-                detector = self.detectors[detector_name]
-                smells = detector.detect(ast_tree, source_code, filepath)
+            profile_runs = []
+            # Profile instances of one detector check the same per-node facts
+            facts = {} if self.profiles else None
+            if self._should_run_threaded(ast_tree):
+                detector_runs = self._detect_threaded(ast_tree, source_code, filepath, facts)
+            else:
+                detector_runs = (
+                    self._timed_detect(name, ast_tree, source_code, filepath, facts)
+                    for name in self.active_detectors
+                )
+            for detector_name, (smells, seconds) in zip(self.active_detectors, detector_runs):
+                timings['detectors'][detector_name] = seconds
+                timings['findings'][detector_name] = len(smells)
                 all_smells.extend(smells)
+                profile_runs.append((detector_name, smells))
+            if self.profiles:
+                all_smells = self._tag_profiles(profile_runs)
             
             return {
                 'file': filepath,
@@ -139,31 +454,482 @@ class CodeSmellDetector:
             }
         
         except Exception as e:
+            timings['error'] = True
             return {
                 'file': filepath,
                 'error': str(e),
                 'smells': []
             }
     
-    def analyze_directory(self, directory):
+    def _analyze_with_cache(self, ast_tree, source_code, filepath, timings):
         """
-        Analyze all Python files in a directory.
+        Analyze a parsed file, reusing per-definition results from
+        self.definition_cache.
+        
+        Top-level functions and classes whose text is in the cache are not
+        analyzed again, and DuplicatedCode only compares definitions whose
+        pair is new. Findings come back in the same order as without the
+        cache: grouped by detector in active-detector order, and in each
+        detector's own ast.walk() order (see BaseDetector.reports_at).
+        
+        Returns:
+            Dictionary containing analysis results
+        """
+        from incremental import IncrementalAnalyzer
+        
+        cache = self.definition_cache
+        hits, misses = cache.hits, cache.misses
+        analyzer = IncrementalAnalyzer(self, filepath, cache=cache)
+        with self.tracer.span('cached detect', 'detect'):
+            analyzer.analyze_parsed(ast_tree, source_code)
+        timings['cache_hits'] = cache.hits - hits
+        timings['cache_misses'] = cache.misses - misses
+        
+        detector_names = {self.detectors[name].get_name(): name for name in self.active_detectors}
+        order = {name: index for index, name in enumerate(self.active_detectors)}
+        positions = self._walk_positions(ast_tree) if len(analyzer.chunks) > 1 else {}
+        all_smells = analyzer.smells()
+        all_smells.sort(key=lambda smell: (
+            order.get(detector_names.get(smell['smell_type']), len(order)),
+            positions.get(smell['smell_type'], {}).get(smell['line_start'], 0)))
+        for smell in all_smells:
+            name = detector_names.get(smell['smell_type'], smell['smell_type'])
+            timings['findings'][name] = timings['findings'].get(name, 0) + 1
+        
+        return {
+            'file': filepath,
+            'smells': all_smells,
+            'smell_count': len(all_smells)
+        }
+    
+    def _walk_positions(self, ast_tree):
+        """
+        Where each detector would report a finding for each line.
+        
+        Chunks are analyzed one at a time, so their findings come out
+        chunk by chunk; sorting them by these ast.walk() indices restores
+        the order detect() reports them in on the whole module.
+        
+        Returns:
+            Dictionary mapping smell type to {line: first walk index}
+        """
+        detectors = [self.detectors[name] for name in self.active_detectors
+                     if self.detectors[name].scope == 'definition']
+        positions = {detector.get_name(): {} for detector in detectors}
+        for index, node in enumerate(ast.walk(ast_tree)):
+            line = getattr(node, 'lineno', None)
+            if line is None:
+                continue
+            for detector in detectors:
+                if detector.reports_at(node):
+                    positions[detector.get_name()].setdefault(line, index)
+        return positions
+    
+    def _timed_detect(self, detector_name, ast_tree, source_code, filepath, facts=None):
+        """
+        Run one detector, returning its smells and how long it took.
+        
+        With a facts dictionary, the detector reuses per-node facts another
+        instance of its class computed for this file (see
+        BaseDetector.detect_shared); the first instance is charged for them.
+        """
+        detector = self.detectors[detector_name]
+        start = time.perf_counter()
+        with self.tracer.span(detector_name, 'detect'), \
+                self.memory.measure('detector', detector_name, filepath):
+            if facts is None:
+                smells = detector.detect(ast_tree, source_code, filepath)
+            else:
+                smells = detector.detect_shared(ast_tree, source_code, filepath, facts)
+        return smells, time.perf_counter() - start
+    
+    def _should_run_threaded(self, ast_tree):
+        """Decide whether a parsed file is worth splitting across detector threads."""
+        if self.detector_threads <= 1 or len(self.active_detectors) <= 1:
+            return False
+        last_line = getattr(ast_tree.body[-1], 'end_lineno', 0) if ast_tree.body else 0
+        return last_line >= self.PARALLEL_MIN_LINES
+    
+    def _detect_threaded(self, ast_tree, source_code, filepath, facts=None):
+        """
+        Run every active detector concurrently on the same parsed tree.
+        
+        Detectors only read the tree and keep no per-call state on the
+        instance, so they can share it. Results come back in active-detector
+        order, matching the serial loop exactly.
+        
+        Returns:
+            List of (smells, seconds) tuples, one per active detector
+        """
+        executor = self._get_detector_executor()
+        futures = [
+            executor.submit(self._timed_detect, name, ast_tree, source_code, filepath, facts)
+            for name in self.active_detectors
+        ]
+        return [future.result() for future in futures]
+    
+    def _get_detector_executor(self):
+        """Return the detector thread pool, creating it on first use from any thread."""
+        from concurrent.futures import ThreadPoolExecutor
+        
+        with self._executor_lock:
+            if self._detector_executor is None:
+                self._detector_executor = ThreadPoolExecutor(max_workers=self.detector_threads,
+                                                             thread_name_prefix='smell-detect')
+            return self._detector_executor
+    
+    def analyze_sources(self, items):
+        """
+        Analyze a batch of in-memory sources.
+        
+        Detectors are set up once and reused for every item, so a batch
+        costs only the parsing and detection of its sources.
         
         Args:
-            directory: Path to directory
+            items: Iterable of (name, source) pairs, where source is a
+                string or bytes (decoded using its PEP 263 coding comment)
+        
+        Returns:
+            List of analysis results, one per item
+        """
+        self.stopped_at = None
+        results = []
+        for name, source in items:
+            try:
+                if isinstance(source, (bytes, bytearray)):
+                    check_source_size(len(source), self.max_file_size)
+                    source = decode_source(bytes(source))
+                elif self.max_file_size is not None:
+                    check_source_size(len(source.encode('utf-8', 'surrogatepass')),
+                                      self.max_file_size)
+            except SourceTooLarge as e:
+                results.append({'file': name, 'error': str(e), 'smells': []})
+                continue
+            except (SyntaxError, UnicodeDecodeError) as e:
+                results.append({'file': name, 'error': f"Decode error: {e}", 'smells': []})
+                continue
+            results.append(self.analyze_source(source, name))
+            # Stop pulling items, so remaining sources are never read
+            if self._should_stop(results[-1]):
+                break
+        return results
+    
+    def _should_stop(self, result):
+        """
+        Check a finished file against self.stop_when.
+        
+        stop_when is an optional callable taking an analysis result; once
+        it returns True, the remaining files are not analyzed, and the
+        file that stopped the run is kept in self.stopped_at.
+        """
+        if self.stop_when is None or not self.stop_when(result):
+            return False
+        if self.stopped_at is None:
+            self.stopped_at = result['file']
+        return True
+    
+    def _may_fire(self, source_code):
+        """Check whether any active detector passes its cheap prefilter."""
+        line_count = source_code.count('\n') + 1
+        for detector_name in self.active_detectors:
+            if self.detectors[detector_name].may_fire(source_code, line_count):
+                return True
+        return False
+    
+    def _get_executor(self):
+        """Return the executor used by the async API, creating it on first use."""
+        from concurrent.futures import ThreadPoolExecutor
+        
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='smell-detector')
+            return self._executor
+    
+    def close(self):
+        """Shut down the detector's thread pools, cancelling queued work."""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            if self._detector_executor is not None:
+                self._detector_executor.shutdown(wait=False, cancel_futures=True)
+                self._detector_executor = None
+    
+    async def analyze_source_async(self, source_code, filepath='<string>'):
+        """
+        Analyze in-memory source without blocking the event loop.
+        
+        Args:
+            source_code: Python source code as string
+            filepath: Name reported for the source in results
+        
+        Returns:
+            Dictionary containing analysis results
+        """
+        import asyncio
+        
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), self.analyze_source,
+                                          source_code, filepath)
+    
+    async def analyze_paths_async(self, paths, max_in_flight=None):
+        """
+        Analyze files and directories, yielding results as files complete.
+        
+        Parsing and detection run on the detector's executor. At most
+        max_in_flight files are submitted at once; cancelling the consuming
+        task or leaving the loop early cancels everything still queued.
+        
+        Args:
+            paths: Iterable of file or directory paths
+            max_in_flight: Maximum files submitted at once (default: 2 per worker)
+        
+        Yields:
+            Dictionary containing analysis results for each file
+        """
+        import asyncio
+        
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        limit = max_in_flight or self.max_workers * 2
+        
+        # Directory walks hit the disk, so keep them off the event loop too
+        files = await loop.run_in_executor(executor, self._collect_python_files, list(paths))
+        
+        pending = set()
+        try:
+            for filepath in files:
+                if len(pending) >= limit:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for future in done:
+                        result = future.result()
+                        yield result
+                        if self._should_stop(result):
+                            return
+                pending.add(loop.run_in_executor(executor, self.analyze_file, filepath))
+            
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    yield result
+                    if self._should_stop(result):
+                        return
+        finally:
+            for future in pending:
+                future.cancel()
+    
+    def _collect_python_files(self, paths):
+        """
+        Expand a list of files and directories into Python file paths.
+        
+        Files found in a directory are sorted by path so that every run,
+        and every shard merged back together, reports them in one order.
+        """
+        return list(self._iter_python_files(paths))
+    
+    def _iter_python_files(self, paths):
+        """
+        Yield the files of _collect_python_files() lazily, in the same order.
+        
+        Directory entries are visited sorted by name, with '/' appended to
+        directory names, which is exactly the order of sorting the full
+        paths. Symlinked directories are not followed.
+        """
+        from pathlib import Path
+        
+        for path in paths:
+            if os.path.isdir(path):
+                yield from self._walk_python_files(Path(path))
+            else:
+                yield str(path)
+    
+    def _walk_python_files(self, directory):
+        """
+        Yield the .py paths below a directory, depth first, in sorted order.
+        
+        Directory names sort as if they ended in '/', which gives the same
+        order as sorting full paths. Symlinked directories are not followed
+        and unreadable directories are skipped.
+        
+        Args:
+            directory: pathlib.Path to walk
+        
+        Yields:
+            File paths as strings
+        """
+        try:
+            with os.scandir(directory) as scan:
+                entries = []
+                for entry in scan:
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                    except OSError:
+                        is_dir = False
+                    entries.append((entry.name + '/' if is_dir else entry.name, entry.name, is_dir))
+        except OSError:
+            return
+        for _, name, is_dir in sorted(entries):
+            if name.endswith('.py'):
+                yield str(directory / name)
+            if is_dir:
+                yield from self._walk_python_files(directory / name)
+    
+    def analyze_paths(self, paths, shard=None):
+        """
+        Analyze a list of files and directories.
+        
+        Args:
+            paths: List of file or directory paths
+            shard: Optional (index, count) tuple; only files assigned to
+                that 1-based shard are analyzed
         
         Returns:
             List of analysis results for each file
         """
+        from sampling import draw_sample
+        from sharding import select_shard
+        
+        self.stopped_at = None
+        lazy = self.stop_when is not None or self.io_threads > 0
+        if lazy and self.jobs <= 1 and not shard and not self.sample:
+            # Discover files while analyzing, so stopping also stops the walk
+            files = self._iter_python_files(paths)
+        else:
+            with self.tracer.span('discovery', 'io'):
+                files = self._collect_python_files(paths)
+                if shard:
+                    files = select_shard(files, *shard)
+                if self.sample:
+                    files, self.sample_plan = draw_sample(files, *self.sample)
+            
+            if self.jobs > 1 and len(files) > 1:
+                return self._analyze_scheduled(files)
+        
+        if self.io_threads > 0:
+            return self._analyze_pipelined(files)
+        
         results = []
-        path = Path(directory)
+        for filepath in files:
+            results.append(self.analyze_file(filepath))
+            if self._should_stop(results[-1]):
+                break
+        return results
+    
+    def _analyze_pipelined(self, files):
+        """
+        Analyze files while self.io_threads threads read the next ones.
         
-        for py_file in path.rglob('*.py'):
-            result = self.analyze_file(str(py_file))
-            results.append(result)
+        Results are in the order of files. Queue depths and stall times
+        end up in self.pipeline_stats.
+        
+        Returns:
+            List of analysis results
+        """
+        from pipeline import PrefetchPipeline
         
+        results = []
+        pipeline = PrefetchPipeline(files, self._load_file, self.io_threads)
+        try:
+            for filepath, loaded in pipeline:
+                result, timings = self._analyze_file_timed(filepath, loaded)
+                self._record_file(filepath, timings)
+                results.append(result)
+                if self._should_stop(result):
+                    break
+        finally:
+            pipeline.close()
+            self.pipeline_stats = pipeline.report()
         return results
     
+    def _analyze_scheduled(self, files):
+        """
+        Analyze files in worker processes, most expensive first.
+        
+        Each file's cost is predicted from its size and the timing history,
+        files are dispatched longest first, and measured times are written
+        back to the history. Predicted and actual times end up in
+        self.schedule_stats.
+        
+        Returns:
+            List of analysis results in the same order as files
+        """
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        from scheduler import CostModel, lpt_order
+        
+        cost_model = CostModel(self.history_path)
+        ordered, predictions = lpt_order(files, cost_model)
+        
+        results = {}
+        timings = []
+        start = time.perf_counter()
+        cache_path = self.definition_cache.path if self.definition_cache is not None else None
+        worker_args = (self.config, self.selection, self.prefilter, self.detector_threads,
+                       self.tracer.enabled, cache_path, self.max_file_size)
+        
+        with ProcessPoolExecutor(max_workers=self.jobs, initializer=_init_worker,
+                                 initargs=worker_args) as pool:
+            futures = {pool.submit(_analyze_in_worker, filepath): filepath for filepath in ordered}
+            for future in as_completed(futures):
+                if self.stopped_at is not None:
+                    break
+                filepath = futures[future]
+                result, file_timings, events, cache_entries = future.result()
+                results[filepath] = result
+                self.tracer.extend(events)
+                if self.definition_cache is not None:
+                    self.definition_cache.merge(cache_entries)
+                self._record_file(filepath, file_timings, worker=True)
+                size, predicted = predictions[filepath]
+                cost_model.record(filepath, size, file_timings['seconds'])
+                timings.append({'file': filepath, 'predicted': predicted,
+                                'actual': file_timings['seconds']})
+                if self._should_stop(result):
+                    # Files already running finish; queued ones never start
+                    for pending in futures:
+                        pending.cancel()
+        
+        wall_seconds = time.perf_counter() - start
+        work_seconds = sum(t['actual'] for t in timings)
+        timings.sort(key=lambda t: -t['actual'])
+        self.schedule_stats = {
+            'workers': self.jobs,
+            'wall_seconds': wall_seconds,
+            'work_seconds': work_seconds,
+            'ideal_seconds': work_seconds / self.jobs,
+            'predicted_seconds': sum(t['predicted'] for t in timings),
+            'files': timings
+        }
+        
+        try:
+            cost_model.save()
+        except OSError as e:
+            print(f"Warning: Could not save timing history: {e}", file=sys.stderr)
+        
+        return [results[filepath] for filepath in files if filepath in results]
+    
+    def analyze_directory(self, directory):
+        """
+        Analyze all Python files in a directory.
+        
+        Args:
+            directory: Path to directory
+        
+        Returns:
+            List of analysis results for each file
+        """
+        return self.analyze_paths([directory])
+    
+    def _profile_totals(self, results):
+        """Number of findings tagged with each evaluated profile."""
+        totals = {profile: 0 for profile in self.profiles}
+        for result in results:
+            for smell in result['smells']:
+                for profile in smell.get('profiles', []):
+                    totals[profile] += 1
+        return totals
+    
     def generate_report(self, results, output_format='text'):
         """
         Generate a report from analysis results.
@@ -176,12 +942,29 @@ class CodeSmellDetector:
             Formatted report string
         """
         if output_format == 'json':
-            import json
-            return json.dumps({
+            report = {
                 'timestamp': datetime.now().isoformat(),
                 'active_detectors': self.active_detectors,
+                'files_analyzed': len(results),
+                'files_skipped': sum(1 for r in results if r.get('skipped')),
+                'total_smells': sum(len(r['smells']) for r in results),
                 'results': results
-            }, indent=2)
+            }
+            if self.shard:
+                report['shard'] = f"{self.shard[0]}/{self.shard[1]}"
+            if self.schedule_stats:
+                report['schedule'] = self.schedule_stats
+            if self.pipeline_stats:
+                report['pipeline'] = self.pipeline_stats
+            if self.memory_stats:
+                report['memory'] = self.memory_stats
+            if self.sample_stats:
+                report['sample'] = self.sample_stats
+            if self.stopped_at is not None:
+                report['stopped_at'] = self.stopped_at
+            if self.profiles:
+                report['profiles'] = self._profile_totals(results)
+            return json.dumps(report, indent=2)
         
         # Text format
         report_lines = []
@@ -194,10 +977,15 @@ class CodeSmellDetector:
         report_lines.append("")
         
         total_smells = 0
+        skipped_files = 0
         
         for result in results:
             filepath = result['file']
             
+            if result.get('skipped'):
+                skipped_files += 1
+                continue
+            
             if 'error' in result:
                 report_lines.append(f"File: {filepath}")
                 report_lines.append(f"  ERROR: {result['error']}")
@@ -226,7 +1014,8 @@ class CodeSmellDetector:
                         line_info = f"lines {smell['line_start']}-{smell['line_end']}"
                         if smell['line_start'] == smell['line_end']:
                             line_info = f"line {smell['line_start']}"
-                        report_lines.append(f"    - {line_info} [{smell['severity']}]")
+                        profiles = f" ({', '.join(smell['profiles'])})" if 'profiles' in smell else ""
+                        report_lines.append(f"    - {line_info} [{smell['severity']}]{profiles}")
                         report_lines.append(f"      {smell['description']}")
                     report_lines.append("")
             
@@ -235,13 +1024,100 @@ class CodeSmellDetector:
         
         report_lines.append("=" * 80)
         report_lines.append(f"SUMMARY: {total_smells} total code smell(s) detected")
+        if self.profiles:
+            for profile, count in self._profile_totals(results).items():
+                report_lines.append(f"  Profile {profile}: {count} smell(s)")
+        if skipped_files:
+            report_lines.append(f"Not parsed: {skipped_files} file(s) could not trigger any "
+                                f"active detector (syntax errors in them are not reported)")
+        if self.stopped_at is not None:
+            report_lines.append(f"Stopped early: {self.stopped_at} has a qualifying smell; "
+                                f"remaining files were not analyzed")
+        if self.schedule_stats:
+            stats = self.schedule_stats
+            report_lines.append(f"Scheduler: {stats['workers']} workers, "
+                                f"wall {stats['wall_seconds']:.2f}s, "
+                                f"work {stats['work_seconds']:.2f}s "
+                                f"(ideal {stats['ideal_seconds']:.2f}s), "
+                                f"predicted {stats['predicted_seconds']:.2f}s")
+        if self.pipeline_stats:
+            stats = self.pipeline_stats
+            report_lines.append(f"Pipeline: {stats['io_threads']} I/O threads, "
+                                f"queue depth {stats['mean_depth']:.1f} mean / "
+                                f"{stats['max_depth']} max of {stats['queue_size']}")
+            report_lines.append(f"  Analysis waited on reads {stats['analysis_stalls']} time(s), "
+                                f"{stats['analysis_stall_seconds']:.2f}s; "
+                                f"discovery waited on a full queue {stats['discovery_stalls']} "
+                                f"time(s), {stats['discovery_stall_seconds']:.2f}s")
+        if self.memory_stats:
+            report_lines.append("-" * 80)
+            report_lines.extend(format_memory_report(self.memory_stats))
+        if self.sample_stats:
+            from sampling import format_sample_report
+            
+            report_lines.append("-" * 80)
+            report_lines.extend(format_sample_report(self.sample_stats))
         report_lines.append("=" * 80)
         
         return '\n'.join(report_lines)
 
 
-def parse_arguments():
+# Severities in increasing order, for --fail-on
+SEVERITY_LEVELS = {'low': 1, 'medium': 2, 'high': 3}
+
+# Exit status when --fail-on finds a qualifying smell (1 is for errors,
+# 2 for usage errors)
+EXIT_SMELLS_FOUND = 3
+
+
+def has_severity(results, minimum):
+    """
+    Check whether any smell in results is at least as severe as minimum.
+    
+    Smells with a severity outside SEVERITY_LEVELS never qualify.
+    """
+    threshold = SEVERITY_LEVELS[minimum]
+    return any(SEVERITY_LEVELS.get(smell.get('severity'), 0) >= threshold
+               for result in results for smell in result['smells'])
+
+
+_worker_detector = None
+
+
+def _init_worker(config, selection, prefilter, detector_threads, trace, cache_path,
+                 max_file_size):
+    """Build the detector used by one worker process."""
+    global _worker_detector
+    _worker_detector = CodeSmellDetector(config=config, detector_threads=detector_threads)
+    _worker_detector.prefilter = prefilter
+    _worker_detector.max_file_size = max_file_size
+    _worker_detector.tracer = Tracer(enabled=trace, process_name=f"worker {os.getpid()}")
+    _worker_detector.initialize_detectors(**selection)
+    if cache_path:
+        from incremental import DefinitionCache
+        
+        _worker_detector.definition_cache = DefinitionCache(
+            cache_path, _worker_detector.config_fingerprint())
+
+
+def _analyze_in_worker(filepath):
+    """
+    Analyze one file in a worker process.
+    
+    Returns:
+        Tuple (analysis result, timings, trace events recorded for the file,
+        definition cache entries added for the file)
+    """
+    result, timings = _worker_detector._analyze_file_timed(filepath)
+    cache = _worker_detector.definition_cache
+    cache_entries = cache.take_added() if cache is not None else {}
+    return result, timings, _worker_detector.tracer.drain(), cache_entries
+
+
+def parse_arguments(argv=None):
     """Parse command-line arguments."""
+    from scheduler import CostModel
+    
     parser = argparse.ArgumentParser(
         description='Detect code smells in Python source code',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -264,12 +1140,63 @@ Examples:
   
   # Output as JSON
   python main.py --format json mycode.py
-        """
-    )
-    
-    parser.add_argument(
-        'path',
-        help='Path to Python file or directory to analyze'
+  
+  # Analyze the second of four CI shards, then merge the shard reports
+  python main.py --shard 2/4 --format json --output shard2.json src/
+  python main.py merge shard1.json shard2.json shard3.json shard4.json
+  
+  # Analyze another branch straight from git objects, without a checkout
+  python main.py --git-ref origin/main path/to/repo
+  
+  # Analyze a wheel or sdist as published, without unpacking it
+  python main.py dist/mypackage-1.0-py3-none-any.whl
+  
+  # Pre-commit hook: only staged content, only smells touching staged lines
+  python main.py --staged .
+  
+  # Keep every nightly run, then see which files got worse this month
+  python main.py --store results.db src/
+  python main.py query results.db diff --since 2026-10-01
+  
+  # Smell totals per commit over the last 500 commits
+  python main.py history --max-commits 500 path/to/repo
+  
+  # CI gate: exit with status 3 at the first high-severity smell
+  python main.py --fail-on high --fail-fast src/
+  
+  # Check a strict and a lenient policy in one scan
+  python main.py --profiles strict,legacy src/
+  
+  # Estimate smell densities from a 5% stratified sample of the files
+  python main.py --sample 0.05 --seed 7 big_repo/
+  
+  # Find which detectors and files use the most memory
+  python main.py --memprofile src/
+  
+  # Re-analyze only functions and classes changed since the last run
+  python main.py --cache .smell_cache.json src/
+  
+  # Record a timeline of the run for chrome://tracing or Perfetto
+  python main.py --jobs 4 --trace trace.json src/
+  
+  # Index methods once, then check changed files against the whole index
+  python main.py clones update src/
+  python main.py clones query --update src/changed.py
+  
+  # Group copied methods across a very large tree in 512 MB
+  python main.py clones scan --memory-limit 512M monorepo/
+  
+  # List built-in and plugin detectors
+  python main.py detectors
+  
+  # Serve diagnostics to an editor over stdio (Language Server Protocol)
+  python main.py lsp
+        """
+    )
+    
+    parser.add_argument(
+        'path',
+        help='Path to Python file, directory or archive (.whl, .zip, .tar.gz, ...) to analyze'
     )
     
     parser.add_argument(
@@ -278,6 +1205,12 @@ Examples:
         help='Path to configuration file (default: config.yaml)'
     )
     
+    parser.add_argument(
+        '--profiles',
+        help='Comma-separated profiles from the config\'s profiles section (or "all") '
+             'to evaluate together in one scan; findings are tagged with their profiles'
+    )
+    
     parser.add_argument(
         '--only',
         help='Run only specified detectors (comma-separated, e.g., LongMethod,GodClass)'
@@ -300,11 +1233,818 @@ Examples:
         help='Output file path (default: stdout)'
     )
     
-    return parser.parse_args()
+    parser.add_argument(
+        '--threads',
+        type=int,
+        default=1,
+        help='Run detectors in parallel threads on large files (default: 1)'
+    )
+    
+    parser.add_argument(
+        '--git-ref',
+        help='Read sources of this commit, branch or tree from git (path is the repository)'
+    )
+    
+    parser.add_argument(
+        '--staged',
+        action='store_true',
+        help='Analyze the staged contents of staged files (path is the repository)'
+    )
+    
+    parser.add_argument(
+        '--all-lines',
+        action='store_true',
+        help='With --staged, report every smell in the staged files, not just '
+             'those overlapping staged hunks'
+    )
+    
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=1,
+        help='Worker processes for directory analysis, most expensive files first (default: 1)'
+    )
+    
+    parser.add_argument(
+        '--history',
+        help=f'Timing history used to order work for --jobs (default: {CostModel.DEFAULT_HISTORY_PATH})'
+    )
+    
+    parser.add_argument(
+        '--io-threads',
+        type=int,
+        default=0,
+        help='Threads reading files ahead of the analysis, for slow or network '
+             'file systems (default: 0, read each file when it is analyzed)'
+    )
+    
+    parser.add_argument(
+        '--max-file-size',
+        help='Skip files larger than this (e.g. 512K, 2M), reporting them as errors'
+    )
+    
+    parser.add_argument(
+        '--shard',
+        help='Analyze only shard i of N (e.g. 2/4), balanced by file size'
+    )
+    
+    sample = parser.add_mutually_exclusive_group()
+    sample.add_argument(
+        '--sample',
+        metavar='FRACTION',
+        help='Analyze a random share of the files (e.g. 0.05), stratified by directory '
+             'and size, and estimate full-scan totals and per-KLOC rates'
+    )
+    
+    sample.add_argument(
+        '--sample-files',
+        type=int,
+        metavar='N',
+        help='Like --sample, with a fixed number of files'
+    )
+    
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='Seed for --sample and --sample-files (default: 0)'
+    )
+    
+    parser.add_argument(
+        '--metrics-file',
+        help='Write OpenMetrics text with throughput and latency metrics after the run'
+    )
+    
+    parser.add_argument(
+        '--store',
+        help='Add the findings of this run to a SQLite results store (see "query")'
+    )
+    
+    parser.add_argument(
+        '--trace',
+        help='Write Chrome/Perfetto trace events of the run to this JSON file'
+    )
+    
+    parser.add_argument(
+        '--cache',
+        help='JSON file keeping per-definition results between runs, so only '
+             'changed functions and classes are analyzed again'
+    )
+    
+    parser.add_argument(
+        '--memprofile',
+        action='store_true',
+        help='Trace allocations and report peak and retained memory per detector '
+             'and per file (runs serially)'
+    )
+    
+    parser.add_argument(
+        '--fail-on',
+        choices=list(SEVERITY_LEVELS),
+        help=f'Exit with status {EXIT_SMELLS_FOUND} if any smell has this severity or higher'
+    )
+    
+    parser.add_argument(
+        '--fail-fast',
+        action='store_true',
+        help='With --fail-on, stop discovery and cancel pending files at the first '
+             'qualifying smell'
+    )
+    
+    parser.add_argument(
+        '--no-prefilter',
+        action='store_true',
+        help='Parse every file, even ones no active detector could flag'
+    )
+    
+    return parser.parse_args(argv)
+
+
+def parse_merge_arguments(argv):
+    """Parse command-line arguments for the merge subcommand."""
+    parser = argparse.ArgumentParser(
+        prog='main.py merge',
+        description='Merge per-shard JSON reports into one report'
+    )
+    
+    parser.add_argument(
+        'reports',
+        nargs='+',
+        help='JSON reports written with --shard and --format json'
+    )
+    
+    parser.add_argument(
+        '--config',
+        default='config.yaml',
+        help='Path to configuration file (default: config.yaml)'
+    )
+    
+    parser.add_argument(
+        '--format',
+        choices=['text', 'json'],
+        default='json',
+        help='Output format (default: json)'
+    )
+    
+    parser.add_argument(
+        '--output',
+        help='Output file path (default: stdout)'
+    )
+    
+    return parser.parse_args(argv)
+
+
+def filter_to_ranges(results, ranges_by_file):
+    """
+    Keep only smells whose line span overlaps one of the given ranges.
+    
+    Args:
+        results: Analysis results
+        ranges_by_file: Dictionary mapping file names to lists of
+            (first line, last line) tuples
+    
+    Returns:
+        List of filtered analysis results
+    """
+    filtered = []
+    for result in results:
+        ranges = ranges_by_file.get(result['file'], [])
+        smells = [smell for smell in result['smells']
+                  if any(smell['line_start'] <= end and smell['line_end'] >= start
+                         for start, end in ranges)]
+        result = dict(result, smells=smells)
+        if 'smell_count' in result:
+            result['smell_count'] = len(smells)
+        filtered.append(result)
+    return filtered
+
+
+def write_report(report, output):
+    """Write a report to a file, or to stdout when no file is given."""
+    if output:
+        with open(output, 'w') as f:
+            f.write(report)
+        print(f"Report saved to: {output}")
+    else:
+        print(report)
+
+
+def merge_main(argv):
+    """Entry point for the merge subcommand."""
+    from sharding import merge_reports
+    
+    args = parse_merge_arguments(argv)
+    
+    try:
+        active_detectors, results = merge_reports(args.reports)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    
+    detector = CodeSmellDetector(args.config)
+    detector.active_detectors = active_detectors
+    write_report(detector.generate_report(results, args.format), args.output)
+
+
+def parse_lsp_arguments(argv):
+    """Parse command-line arguments for the lsp subcommand."""
+    parser = argparse.ArgumentParser(
+        prog='main.py lsp',
+        description='Run a Language Server Protocol server on stdin/stdout'
+    )
+    
+    parser.add_argument(
+        '--config',
+        default='config.yaml',
+        help='Path to configuration file (default: config.yaml)'
+    )
+    
+    parser.add_argument(
+        '--only',
+        help='Run only specified detectors (comma-separated)'
+    )
+    
+    parser.add_argument(
+        '--exclude',
+        help='Exclude specified detectors (comma-separated)'
+    )
+    
+    return parser.parse_args(argv)
+
+
+def lsp_main(argv):
+    """Entry point for the lsp subcommand."""
+    from lsp_server import serve
+    
+    args = parse_lsp_arguments(argv)
+    only_detectors = [d.strip() for d in args.only.split(',')] if args.only else None
+    exclude_detectors = [d.strip() for d in args.exclude.split(',')] if args.exclude else None
+    
+    # stdout carries the JSON-RPC stream, so warnings must go elsewhere
+    with contextlib.redirect_stdout(sys.stderr):
+        detector = CodeSmellDetector(args.config)
+        try:
+            detector.initialize_detectors(only=only_detectors, exclude=exclude_detectors)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+    
+    sys.exit(serve(detector))
+
+
+def parse_detectors_arguments(argv):
+    """Parse command-line arguments for the detectors subcommand."""
+    parser = argparse.ArgumentParser(
+        prog='main.py detectors',
+        description='List available detectors without importing them'
+    )
+    
+    parser.add_argument(
+        '--config',
+        default='config.yaml',
+        help='Path to configuration file (default: config.yaml)'
+    )
+    
+    parser.add_argument(
+        '--format',
+        choices=['text', 'json'],
+        default='text',
+        help='Output format (default: text)'
+    )
+    
+    return parser.parse_args(argv)
+
+
+def detectors_main(argv):
+    """Entry point for the detectors subcommand."""
+    args = parse_detectors_arguments(argv)
+    detector = CodeSmellDetector(args.config)
+    detector_configs = detector.config.get('detectors', {})
+    
+    listing = []
+    for name in detector.registry:
+        entry = detector.registry.spec(name).to_dict()
+        entry['enabled'] = detector_configs.get(name, {}).get(
+            'enabled', detector.registry.spec(name).enabled_by_default)
+        listing.append(entry)
+    
+    if args.format == 'json':
+        print(json.dumps(listing, indent=2))
+        return
+    for entry in listing:
+        status = 'enabled' if entry['enabled'] else 'disabled'
+        version = f" {entry['version']}" if entry['version'] else ''
+        node_types = ', '.join(entry['node_types']) or 'unknown'
+        print(f"{entry['name']} ({entry['source']}{version}, {status})")
+        print(f"  {entry['target']}")
+        print(f"  Node types: {node_types}")
+
+
+def parse_clones_arguments(argv):
+    """Parse command-line arguments for the clones subcommand."""
+    from clone_index import DEFAULT_INDEX_PATH
+    
+    parser = argparse.ArgumentParser(
+        prog='main.py clones',
+        description='Maintain a persistent index of method fingerprints and '
+                    'find duplicates across files'
+    )
+    
+    parser.add_argument(
+        'action',
+        choices=['update', 'query', 'remove', 'scan'],
+        help='update: add or replace files in the index; query: report methods '
+             'duplicated in other indexed files; remove: drop files from the index; '
+             'scan: group identical method bodies across all files in bounded '
+             'memory, without an index'
+    )
+    
+    parser.add_argument(
+        'paths',
+        nargs='+',
+        help='Python files or directories'
+    )
+    
+    parser.add_argument(
+        '--index',
+        default=DEFAULT_INDEX_PATH,
+        help=f'SQLite index file (default: {DEFAULT_INDEX_PATH})'
+    )
+    
+    parser.add_argument(
+        '--update',
+        action='store_true',
+        help='With query, also replace the queried files in the index'
+    )
+    
+    parser.add_argument(
+        '--config',
+        default='config.yaml',
+        help='Path to configuration file (default: config.yaml)'
+    )
+    
+    parser.add_argument(
+        '--format',
+        choices=['text', 'json'],
+        default='text',
+        help='Output format for query (default: text)'
+    )
+    
+    parser.add_argument(
+        '--output',
+        help='Output file path (default: stdout)'
+    )
+    
+    parser.add_argument(
+        '--memory-limit',
+        default='256M',
+        help='With scan, memory for buffering and sorting fingerprint records, '
+             'e.g. 512M or 2G (default: 256M)'
+    )
+    
+    parser.add_argument(
+        '--tmp-dir',
+        help='With scan, directory for the sorted runs (default: system temp directory)'
+    )
+    
+    if any(arg == '--shard' or arg.startswith('--shard=') for arg in argv):
+        # A shard would only see its own files, missing clones across shards
+        print("Error: --shard can't be combined with clones; clone detection compares "
+              "methods across all files")
+        sys.exit(1)
+    return parser.parse_args(argv)
+
+
+def scan_clones(files, min_lines, memory_limit, tmp_dir, output_format, out):
+    """
+    Group identical method bodies across files in bounded memory.
+    
+    Groups are written to out as they come off the merge, so the report
+    is never held in memory either.
+    
+    Returns:
+        Statistics of the scan
+    """
+    from clone_index import read_source
+    from external_clones import ExternalCloneFinder
+    
+    finder = ExternalCloneFinder(min_lines, memory_limit, tmp_dir)
+    try:
+        for filepath in files:
+            source_code, error = read_source(filepath)
+            if error is None:
+                try:
+                    finder.add_file(filepath, source_code)
+                    continue
+                except SyntaxError as e:
+                    error = f"Syntax error: {e}"
+            print(f"Warning: Skipping {filepath}: {error}", file=sys.stderr)
+        
+        if output_format == 'json':
+            out.write('{"groups": [')
+        else:
+            out.write("=" * 80 + "\nCLONE GROUPS\n" + "=" * 80 + "\n")
+        for number, group in enumerate(finder.finish(), 1):
+            if output_format == 'json':
+                members = [{'file': path, 'line_start': start, 'line_end': end}
+                           for path, start, end in group]
+                out.write((',' if number > 1 else '') + '\n  ' + json.dumps(members))
+            else:
+                out.write(f"\nGroup {number}: {len(group)} methods with the same body\n")
+                for path, start, end in group:
+                    out.write(f"  {path}:{start}-{end}\n")
+        stats = finder.stats
+        if output_format == 'json':
+            out.write('\n], "stats": ' + json.dumps(stats) + '}\n')
+        else:
+            out.write("\n" + "=" * 80 + "\n")
+            out.write(f"SUMMARY: {stats['groups']} clone group(s), "
+                      f"{stats['duplicated_methods']} of {stats['methods']} method(s) "
+                      f"in {stats['files']} file(s)\n")
+            out.write(f"Sorted runs: {stats['runs']}, merge passes: {stats['merge_passes']}, "
+                      f"bytes written: {stats['bytes_written']}\n")
+            out.write("=" * 80 + "\n")
+        return stats
+    finally:
+        finder.close()
+
+
+def clones_main(argv):
+    """Entry point for the clones subcommand."""
+    import sqlite3
+    from clone_index import CloneIndex, read_source, index_key
+    from external_clones import parse_size
+    
+    args = parse_clones_arguments(argv)
+    detector = CodeSmellDetector(args.config)
+    duplicated_config = detector.config.get('detectors', {}).get('DuplicatedCode', {})
+    
+    if args.action == 'scan':
+        try:
+            memory_limit = parse_size(args.memory_limit)
+        except ValueError as e:
+            print(f"Error: --memory-limit: {e}")
+            sys.exit(1)
+        files = detector._collect_python_files(args.paths)
+        min_lines = duplicated_config.get('min_lines', 5)
+        if args.output:
+            with open(args.output, 'w') as out:
+                scan_clones(files, min_lines, memory_limit, args.tmp_dir, args.format, out)
+            print(f"Report saved to: {args.output}")
+        else:
+            scan_clones(files, min_lines, memory_limit, args.tmp_dir, args.format, sys.stdout)
+        return
+    
+    try:
+        index = CloneIndex(args.index, duplicated_config.get('min_lines', 5),
+                           duplicated_config.get('similarity_threshold', 0.85))
+    except (ValueError, sqlite3.Error) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    
+    files = detector._collect_python_files(args.paths)
+    
+    if args.action == 'remove':
+        removed = sum(index.remove_file(index_key(path)) for path in files)
+        # Deleted files can only be named by path
+        removed += sum(index.remove_file(index_key(path)) for path in args.paths
+                       if not os.path.exists(path))
+        index.close()
+        print(f"Removed {removed} file(s) from {args.index}")
+        return
+    
+    if args.action == 'update':
+        updated = 0
+        for filepath in files:
+            source_code, error = read_source(filepath)
+            if error is None:
+                try:
+                    updated += index.replace_file(index_key(filepath), source_code)
+                    continue
+                except SyntaxError as e:
+                    error = f"Syntax error: {e}"
+            print(f"Warning: Skipping {filepath}: {error}", file=sys.stderr)
+        
+        # Drop indexed files that no longer exist below the given directories
+        removed = 0
+        for path in args.paths:
+            if os.path.isdir(path):
+                prefix = '' if index_key(path) == '.' else index_key(path) + os.sep
+                for indexed in index.files():
+                    if indexed.startswith(prefix) and not os.path.exists(indexed):
+                        removed += index.remove_file(indexed)
+        index.close()
+        print(f"Indexed {len(files)} file(s) in {args.index}: "
+              f"{updated} added or changed, {removed} removed")
+        return
+    
+    results = []
+    for filepath in files:
+        source_code, error = read_source(filepath)
+        if error is None:
+            try:
+                smells = index.query(index_key(filepath), source_code)
+                if args.update:
+                    index.replace_file(index_key(filepath), source_code)
+                results.append({'file': filepath, 'smells': smells, 'smell_count': len(smells)})
+                continue
+            except SyntaxError as e:
+                error = f"Syntax error: {e}"
+        results.append({'file': filepath, 'error': error, 'smells': []})
+    index.close()
+    
+    detector.active_detectors = ['DuplicatedCode']
+    write_report(detector.generate_report(results, args.format), args.output)
+
+
+def parse_history_arguments(argv):
+    """Parse command-line arguments for the history subcommand."""
+    parser = argparse.ArgumentParser(
+        prog='main.py history',
+        description='Report smell totals per commit over git history'
+    )
+    
+    parser.add_argument(
+        'repo',
+        nargs='?',
+        default='.',
+        help='Repository directory, or a directory inside it (default: .)'
+    )
+    
+    parser.add_argument(
+        '--ref',
+        default='HEAD',
+        help='Commit or branch to walk back from (default: HEAD)'
+    )
+    
+    parser.add_argument(
+        '--max-commits',
+        type=int,
+        default=500,
+        help='Number of commits to scan (default: 500)'
+    )
+    
+    parser.add_argument(
+        '--first-parent',
+        action='store_true',
+        help='Follow only the first parent of merge commits'
+    )
+    
+    parser.add_argument(
+        '--cache',
+        help='JSON file keeping per-blob results between runs'
+    )
+    
+    parser.add_argument(
+        '--metrics-file',
+        help='Write OpenMetrics text with throughput and latency metrics after the run'
+    )
+    
+    parser.add_argument(
+        '--config',
+        default='config.yaml',
+        help='Path to configuration file (default: config.yaml)'
+    )
+    
+    parser.add_argument(
+        '--only',
+        help='Run only specified detectors (comma-separated)'
+    )
+    
+    parser.add_argument(
+        '--exclude',
+        help='Exclude specified detectors (comma-separated)'
+    )
+    
+    parser.add_argument(
+        '--format',
+        choices=['text', 'json'],
+        default='text',
+        help='Output format (default: text)'
+    )
+    
+    parser.add_argument(
+        '--output',
+        help='Output file path (default: stdout)'
+    )
+    
+    return parser.parse_args(argv)
+
+
+def history_main(argv):
+    """Entry point for the history subcommand."""
+    from history import scan_history, format_history, BlobResultCache
+    
+    args = parse_history_arguments(argv)
+    only_detectors = [d.strip() for d in args.only.split(',')] if args.only else None
+    exclude_detectors = [d.strip() for d in args.exclude.split(',')] if args.exclude else None
+    
+    detector = CodeSmellDetector(args.config)
+    try:
+        detector.initialize_detectors(only=only_detectors, exclude=exclude_detectors)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    cache = BlobResultCache(args.cache)
+    
+    detector.stats.begin_run()
+    try:
+        history = scan_history(detector, args.repo, args.ref, args.max_commits,
+                               args.first_parent, cache)
+    except GitError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    detector.stats.end_run()
+    cache.save()
+    
+    if args.metrics_file:
+        detector.stats.record_cache(cache.hits, cache.misses)
+        write_metrics_file(detector.stats, detector.registry.known(), args.metrics_file)
+    
+    if args.format == 'json':
+        report = json.dumps(history, indent=2)
+    else:
+        report = format_history(history)
+    write_report(report, args.output)
+
+
+def store_results(path, results, target, detector, started_at):
+    """Add a run's results to the results store at path, exiting on failure."""
+    import sqlite3
+    from results_store import ResultsStore
+    
+    try:
+        store = ResultsStore(path)
+        try:
+            store.add_run(results, target, detector.active_detectors,
+                          detector.config_fingerprint(), detector.stats.wall_seconds,
+                          started_at)
+        finally:
+            store.close()
+    except (sqlite3.Error, ValueError) as e:
+        print(f"Error: Could not store results in '{path}': {e}")
+        sys.exit(1)
+
+
+def parse_query_arguments(argv):
+    """Parse command-line arguments for the query subcommand."""
+    parser = argparse.ArgumentParser(
+        prog='main.py query',
+        description='Query the runs kept in a results store written with --store'
+    )
+    
+    parser.add_argument(
+        'store',
+        help='SQLite results store'
+    )
+    
+    parser.add_argument(
+        'action',
+        choices=['trend', 'top', 'diff'],
+        help='trend: findings per run; top: files with the most findings in a run; '
+             'diff: new and resolved findings, and files that got worse or better, '
+             'between two runs'
+    )
+    
+    parser.add_argument(
+        '--since',
+        help='trend: only runs since this date; diff: compare the first run since '
+             'this date with the latest (e.g. 2026-10-01)'
+    )
+    
+    parser.add_argument(
+        '--last',
+        type=int,
+        help='trend: only the most recent N runs'
+    )
+    
+    parser.add_argument(
+        '--run',
+        type=int,
+        help='top: run id, or -N for the Nth most recent run (default: latest)'
+    )
+    
+    parser.add_argument(
+        '--from',
+        dest='from_run',
+        type=int,
+        help='diff: earlier run id, or -N for the Nth most recent run (default: -2)'
+    )
+    
+    parser.add_argument(
+        '--to',
+        dest='to_run',
+        type=int,
+        help='diff: later run id, or -N for the Nth most recent run (default: latest)'
+    )
+    
+    parser.add_argument(
+        '--file',
+        help='trend: count only findings in this file (as reported)'
+    )
+    
+    parser.add_argument(
+        '--smell-type',
+        help='trend, top: count only this smell type'
+    )
+    
+    parser.add_argument(
+        '--severity',
+        choices=list(SEVERITY_LEVELS),
+        help='trend, top: count only this severity'
+    )
+    
+    parser.add_argument(
+        '--limit',
+        type=int,
+        help='top: files listed (default: 10); diff: entries listed per section'
+    )
+    
+    parser.add_argument(
+        '--format',
+        choices=['text', 'json'],
+        default='text',
+        help='Output format (default: text)'
+    )
+    
+    parser.add_argument(
+        '--output',
+        help='Output file path (default: stdout)'
+    )
+    
+    return parser.parse_args(argv)
+
+
+def query_main(argv):
+    """Entry point for the query subcommand."""
+    import sqlite3
+    from results_store import ResultsStore, parse_since, format_trend, format_top, format_diff
+    
+    args = parse_query_arguments(argv)
+    if not os.path.exists(args.store):
+        print(f"Error: Results store '{args.store}' does not exist.")
+        sys.exit(1)
+    try:
+        since = parse_since(args.since) if args.since else None
+    except ValueError as e:
+        print(f"Error: --since: {e}")
+        sys.exit(1)
+    
+    try:
+        store = ResultsStore(args.store)
+    except (sqlite3.Error, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    
+    try:
+        if args.action == 'trend':
+            data = store.trend(since, args.last, args.smell_type, args.severity, args.file)
+            lines = format_trend(data)
+        elif args.action == 'top':
+            run_id = store.resolve_run(args.run)
+            if run_id is None:
+                print("Error: No such run in the results store")
+                sys.exit(1)
+            offenders = store.top_offenders(run_id, args.limit or 10, args.smell_type,
+                                            args.severity)
+            data = {'run': run_id,
+                    'files': [{'file': path, 'count': count} for path, count in offenders]}
+            lines = format_top(run_id, offenders)
+        else:
+            new_run = store.resolve_run(args.to_run)
+            old_run = store.resolve_run(args.from_run if args.from_run is not None else -2, since)
+            if new_run is None or old_run is None:
+                print("Error: diff needs two runs in the results store")
+                sys.exit(1)
+            data = store.diff(old_run, new_run, args.limit)
+            lines = format_diff(data)
+    except sqlite3.Error as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        store.close()
+    
+    if args.format == 'json':
+        report = json.dumps(data, indent=2)
+    else:
+        report = '\n'.join(lines)
+    write_report(report, args.output)
 
 
 def main():
     """Main entry point."""
+    subcommands = {
+        'merge': merge_main,
+        'lsp': lsp_main,
+        'history': history_main,
+        'detectors': detectors_main,
+        'clones': clones_main,
+        'query': query_main
+    }
+    if len(sys.argv) > 1 and sys.argv[1] in subcommands:
+        subcommands[sys.argv[1]](sys.argv[2:])
+        return
+    
     args = parse_arguments()
     
     # Parse only/exclude arguments
@@ -316,33 +2056,199 @@ def main():
     if args.exclude:
         exclude_detectors = [d.strip() for d in args.exclude.split(',')]
     
+    if args.memprofile and (args.jobs > 1 or args.threads > 1 or args.io_threads > 0):
+        # tracemalloc sees one process, and cannot tell threads apart
+        print("Warning: --memprofile runs serially; ignoring --jobs, --threads and --io-threads",
+              file=sys.stderr)
+        args.jobs = args.threads = 1
+        args.io_threads = 0
+    
+    # Sources read from git or an archive are analyzed serially, in one batch
+    source_input = None
+    if args.staged:
+        source_input = '--staged'
+    elif args.git_ref:
+        source_input = '--git-ref'
+    elif os.path.isfile(args.path) and is_archive(args.path):
+        source_input = 'an archive'
+    if source_input:
+        unsupported = [flag for flag, used in (('--shard', args.shard), ('--jobs', args.jobs > 1),
+                                               ('--io-threads', args.io_threads > 0)) if used]
+        if unsupported:
+            print(f"Error: {', '.join(unsupported)} can't be combined with {source_input}")
+            sys.exit(1)
+    
     # Initialize detector
-    detector = CodeSmellDetector(args.config)
-    detector.initialize_detectors(only=only_detectors, exclude=exclude_detectors)
+    detector = CodeSmellDetector(args.config, detector_threads=args.threads,
+                                 jobs=args.jobs, history_path=args.history)
+    if args.no_prefilter:
+        detector.prefilter = False
+    if args.io_threads < 0:
+        print("Error: --io-threads can't be negative")
+        sys.exit(1)
+    detector.io_threads = args.io_threads
+    if args.max_file_size:
+        from external_clones import parse_size
+        
+        try:
+            detector.max_file_size = parse_size(args.max_file_size)
+        except ValueError as e:
+            print(f"Error: --max-file-size: {e}")
+            sys.exit(1)
+    if args.trace:
+        detector.tracer = Tracer(process_name='main')
+    if args.memprofile:
+        detector.memory = MemoryProfiler()
+    profiles = None
+    if args.profiles:
+        if args.cache or args.sample or args.sample_files is not None:
+            print("Error: --profiles can't be combined with --cache, --sample or --sample-files")
+            sys.exit(1)
+        if args.profiles == 'all':
+            profiles = list(detector.config.get('profiles') or {})
+        else:
+            profiles = [p.strip() for p in args.profiles.split(',') if p.strip()]
+        if not profiles:
+            print("Error: No profiles to evaluate. Define them under 'profiles' in the config.")
+            sys.exit(1)
+    
+    try:
+        detector.initialize_detectors(only=only_detectors, exclude=exclude_detectors,
+                                      profiles=profiles)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
     
     if not detector.active_detectors:
         print("Error: No detectors are active. Check your configuration.")
         sys.exit(1)
     
+    if args.cache:
+        from incremental import DefinitionCache
+        
+        detector.definition_cache = DefinitionCache(args.cache, detector.config_fingerprint())
+    
+    if args.shard:
+        from sharding import parse_shard_spec
+        
+        try:
+            detector.shard = parse_shard_spec(args.shard)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+    
+    if args.sample or args.sample_files is not None:
+        if source_input:
+            print(f"Error: --sample and --sample-files can't be combined with {source_input}")
+            sys.exit(1)
+        from sampling import parse_sample_fraction
+        
+        try:
+            fraction = parse_sample_fraction(args.sample) if args.sample else None
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        if args.sample_files is not None and args.sample_files < 1:
+            print("Error: --sample-files must be at least 1")
+            sys.exit(1)
+        detector.sample = (fraction, args.sample_files, args.seed)
+    
+    if args.store and (args.sample or args.sample_files is not None):
+        print("Error: --store can't be combined with --sample or --sample-files")
+        sys.exit(1)
+    
+    if args.fail_fast:
+        if not args.fail_on:
+            print("Error: --fail-fast requires --fail-on")
+            sys.exit(1)
+        if args.sample or args.sample_files is not None:
+            print("Error: --fail-fast can't be combined with --sample or --sample-files")
+            sys.exit(1)
+    
     # Analyze path
-    if os.path.isfile(args.path):
-        results = [detector.analyze_file(args.path)]
-    elif os.path.isdir(args.path):
-        results = detector.analyze_directory(args.path)
-    else:
+    if not os.path.exists(args.path):
         print(f"Error: Path '{args.path}' does not exist.")
         sys.exit(1)
+    if args.fail_fast:
+        detector.stop_when = lambda result: has_severity([result], args.fail_on)
+    
+    started_at = datetime.now()
+    detector.stats.begin_run()
+    detector.memory.start()
+    if args.staged:
+        try:
+            with detector.tracer.span('discovery', 'io'):
+                staged = list_staged_changes(args.path)
+            if args.fail_fast and not args.all_lines:
+                # Only smells on staged lines count
+                detector.stop_when = lambda result: has_severity(
+                    filter_to_ranges([result], staged), args.fail_on)
+            results = detector.analyze_sources(iter_staged_sources(args.path, sorted(staged)))
+        except GitError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        if not args.all_lines:
+            results = filter_to_ranges(results, staged)
+    elif args.git_ref:
+        try:
+            results = detector.analyze_sources(iter_git_sources(args.path, args.git_ref))
+        except GitError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        results.sort(key=lambda result: result['file'])
+    elif os.path.isfile(args.path) and is_archive(args.path):
+        try:
+            results = detector.analyze_sources(iter_archive_sources(args.path))
+        except ArchiveError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+    else:
+        results = detector.analyze_paths([args.path], shard=detector.shard)
+    detector.close()
+    detector.memory.stop()
+    detector.stats.end_run()
+    if detector.definition_cache is not None:
+        try:
+            detector.definition_cache.save()
+        except OSError as e:
+            print(f"Warning: Could not save cache: {e}", file=sys.stderr)
+    if args.memprofile:
+        detector.memory_stats = detector.memory.report()
+    if detector.sample_plan is not None:
+        from sampling import estimate
+        
+        detector.sample_stats = estimate(detector.sample_plan, results, detector.active_detectors,
+                                         detector.sample_lines)
+        detector.sample_stats['seed'] = args.seed
+    
+    if args.metrics_file:
+        detector_names = detector.registry.known()
+        detector_names += [name for name in detector.active_detectors if name not in detector_names]
+        write_metrics_file(detector.stats, detector_names, args.metrics_file)
     
     # Generate report
-    report = detector.generate_report(results, args.format)
+    with detector.tracer.span('report', 'report'):
+        report = detector.generate_report(results, args.format)
+    
+    if args.trace:
+        try:
+            detector.tracer.write(args.trace)
+        except OSError as e:
+            print(f"Warning: Could not write trace: {e}", file=sys.stderr)
     
     # Output report
-    if args.output:
-        with open(args.output, 'w') as f:
-            f.write(report)
-        print(f"Report saved to: {args.output}")
-    else:
-        print(report)
+    write_report(report, args.output)
+    
+    if args.store:
+        target = args.path
+        if args.git_ref:
+            target = f"{args.git_ref}:{args.path}"
+        elif args.staged:
+            target = f"staged:{args.path}"
+        store_results(args.store, results, target, detector, started_at)
+    
+    if args.fail_on and has_severity(results, args.fail_on):
+        sys.exit(EXIT_SMELLS_FOUND)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,185 @@
+"""
+Memory profiling with tracemalloc, attributed to files, parsing and detectors.
+"""
+
+import contextlib
+import heapq
+import tracemalloc
+
+
+class _Frame:
+    """One open measurement; peak is tracked across nested measurements."""
+
+    def __init__(self, start):
+        self.start = start
+        self.peak = start
+
+
+class MemoryProfiler:
+    """
+    Measures peak and retained allocations of nested code blocks.
+
+    tracemalloc has a single process-wide peak, which measure() resets on
+    entry so that each block gets its own peak. The peak seen by enclosing
+    blocks is carried over before every reset, so a file's peak still
+    includes the peaks of its parse and detector steps.
+
+    Allocations from other threads are counted too, so measurements are
+    only meaningful when files and detectors run one at a time.
+
+    Measurements read tracemalloc's counters rather than comparing
+    snapshots, which would cost time in proportion to the whole traced
+    heap for every file. Only the top_files files with the highest peaks
+    are kept, so memory use doesn't grow with the number of files.
+    """
+
+    def __init__(self, enabled=True, frames=1, top_files=20):
+        """
+        Initialize the profiler.
+
+        Args:
+            enabled: When False, measure() records nothing and costs next to nothing
+            frames: Stack frames stored per allocation (deeper costs more)
+            top_files: Number of files kept in the report, by peak
+        """
+        self.enabled = enabled
+        self.frames = frames
+        self.top_files = top_files
+        self.detectors = {}
+        # Min-heap of (peak, -order, entry) holding the top_files largest peaks
+        self.files = []
+        self._file_count = 0
+        # Parse measurements of files still being measured
+        self._parses = {}
+        self._stack = []
+        self._snapshot = None
+
+    def start(self):
+        """Start tracing allocations."""
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+
+    def stop(self):
+        """Take the final snapshot used for allocation sites and stop tracing."""
+        if self.enabled and tracemalloc.is_tracing():
+            self._snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+
+    def measure(self, kind, name, filepath=None):
+        """
+        Context manager measuring the allocations of its body.
+
+        Args:
+            kind: 'file', 'parse' or 'detector'
+            name: File path or detector name
+            filepath: File being analyzed, for 'parse' and 'detector'
+        """
+        if not self.enabled or not tracemalloc.is_tracing():
+            return contextlib.nullcontext()
+        return self._measure(kind, name, filepath)
+
+    @contextlib.contextmanager
+    def _measure(self, kind, name, filepath):
+        current, peak = tracemalloc.get_traced_memory()
+        for frame in self._stack:
+            frame.peak = max(frame.peak, peak)
+        tracemalloc.reset_peak()
+        frame = _Frame(current)
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            self._stack.pop()
+            frame.peak = max(frame.peak, peak)
+            for outer in self._stack:
+                outer.peak = max(outer.peak, frame.peak)
+            self._record(kind, name, filepath, frame.peak - frame.start, current - frame.start)
+
+    def _record(self, kind, name, filepath, peak, retained):
+        if kind == 'detector':
+            entry = self.detectors.setdefault(name, {'calls': 0, 'peak_bytes': 0,
+                                                     'peak_file': None, 'total_peak_bytes': 0,
+                                                     'retained_bytes': 0})
+            entry['calls'] += 1
+            entry['total_peak_bytes'] += peak
+            entry['retained_bytes'] += retained
+            if peak > entry['peak_bytes']:
+                entry['peak_bytes'] = peak
+                entry['peak_file'] = filepath
+        elif kind == 'parse':
+            self._parses[filepath] = {'parse_peak_bytes': peak, 'ast_bytes': retained}
+        else:
+            entry = self._parses.pop(name, {})
+            entry['peak_bytes'] = peak
+            entry['retained_bytes'] = retained
+            entry['file'] = name
+            # Among equal peaks the file measured first is kept
+            self._file_count += 1
+            item = (peak, -self._file_count, entry)
+            if len(self.files) < self.top_files:
+                heapq.heappush(self.files, item)
+            else:
+                heapq.heappushpop(self.files, item)
+
+    def top_sites(self, limit=10):
+        """
+        Source lines holding the most memory when the run ended.
+
+        Returns:
+            List of dictionaries with site ('file:line'), bytes and count
+        """
+        if self._snapshot is None:
+            return []
+        snapshot = self._snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+        ])
+        sites = []
+        for stat in snapshot.statistics('lineno')[:limit]:
+            frame = stat.traceback[0]
+            sites.append({'site': f"{frame.filename}:{frame.lineno}",
+                          'bytes': stat.size, 'count': stat.count})
+        return sites
+
+    def report(self):
+        """
+        Summarize the run.
+
+        Returns:
+            Dictionary with per-detector totals, the files with the highest
+            peaks and the top allocation sites
+        """
+        detectors = {}
+        for name, entry in self.detectors.items():
+            entry = dict(entry)
+            entry['mean_peak_bytes'] = entry.pop('total_peak_bytes') // max(entry['calls'], 1)
+            detectors[name] = entry
+
+        return {
+            'detectors': detectors,
+            'files': [dict(entry) for _, _, entry in sorted(self.files, reverse=True)],
+            'top_sites': self.top_sites()
+        }
+
+
+def format_memory_report(memory):
+    """Render MemoryProfiler.report() output as text lines."""
+
+    def kib(size):
+        return f"{size / 1024:.1f} KiB"
+
+    lines = ["MEMORY PROFILE", "  Per detector (peak / mean peak / retained over all files):"]
+    for name, entry in memory['detectors'].items():
+        lines.append(f"    {name}: {kib(entry['peak_bytes'])} / {kib(entry['mean_peak_bytes'])} / "
+                     f"{kib(entry['retained_bytes'])} ({entry['calls']} calls, "
+                     f"peak in {entry['peak_file']})")
+    lines.append("  Files with the highest peaks (peak / AST / retained):")
+    for entry in memory['files']:
+        lines.append(f"    {entry['file']}: {kib(entry.get('peak_bytes', 0))} / "
+                     f"{kib(entry.get('ast_bytes', 0))} / {kib(entry.get('retained_bytes', 0))}")
+    lines.append("  Top allocation sites at end of run:")
+    for site in memory['top_sites']:
+        lines.append(f"    {site['site']}: {kib(site['bytes'])} in {site['count']} block(s)")
+    return lines
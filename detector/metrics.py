@@ -0,0 +1,213 @@
+"""
+Scan statistics and OpenMetrics text export.
+"""
+
+import os
+import threading
+import time
+
+
+# Upper bounds (seconds) of latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def new_file_timings():
+    """Empty per-file timings record, filled in while a file is analyzed."""
+    return {
+        'seconds': 0.0,
+        'cpu_seconds': 0.0,
+        'read': 0.0,
+        'parse': 0.0,
+        'bytes': 0,
+        'lines': 0,
+        'skipped': False,
+        'parse_failed': False,
+        'error': False,
+        'detectors': {},
+        'findings': {},
+        'cache_hits': 0,
+        'cache_misses': 0
+    }
+
+
+class Histogram:
+    """Cumulative latency histogram with fixed buckets."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """Record one observation."""
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+    def samples(self):
+        """Yield (le label, cumulative count) pairs, ending with +Inf."""
+        for bound, count in zip(self.buckets, self.counts):
+            yield repr(bound), count
+        yield '+Inf', self.count
+
+
+class ScanStats:
+    """Throughput and latency counters for one run, safe to update from threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.files_scanned = 0
+        self.files_skipped = 0
+        self.bytes_parsed = 0
+        self.parse_failures = 0
+        self.errors = 0
+        self.findings = {}
+        self.file_latency = Histogram()
+        self.parse_latency = Histogram()
+        self.detector_latency = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.worker_cpu_seconds = 0.0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self._run_start = None
+
+    def record_file(self, timings, worker=False):
+        """
+        Add the timings of one analyzed file.
+
+        Args:
+            timings: Dictionary created by new_file_timings()
+            worker: True if the file was analyzed in a worker process, whose
+                CPU time the parent's process_time() does not include
+        """
+        with self._lock:
+            self.files_scanned += 1
+            self.file_latency.observe(timings['seconds'])
+            if worker:
+                self.worker_cpu_seconds += timings['cpu_seconds']
+            self.cache_hits += timings['cache_hits']
+            self.cache_misses += timings['cache_misses']
+            if timings['skipped']:
+                self.files_skipped += 1
+                return
+            if timings['error']:
+                self.errors += 1
+            if timings['parse_failed']:
+                self.parse_failures += 1
+            if timings['parse']:
+                self.parse_latency.observe(timings['parse'])
+                self.bytes_parsed += timings['bytes']
+            for name, seconds in timings['detectors'].items():
+                self.detector_latency.setdefault(name, Histogram()).observe(seconds)
+            for name, count in timings['findings'].items():
+                self.findings[name] = self.findings.get(name, 0) + count
+
+    def record_cache(self, hits, misses):
+        """Add cache lookups made by a cache layer."""
+        with self._lock:
+            self.cache_hits += hits
+            self.cache_misses += misses
+
+    def begin_run(self):
+        """Mark the start of a run for wall and CPU time."""
+        self._run_start = (time.perf_counter(), time.process_time())
+
+    def end_run(self):
+        """Mark the end of a run started with begin_run()."""
+        if self._run_start is None:
+            return
+        wall_start, cpu_start = self._run_start
+        self.wall_seconds = time.perf_counter() - wall_start
+        self.cpu_seconds = time.process_time() - cpu_start + self.worker_cpu_seconds
+
+
+def _escape(value):
+    """Escape a label value for the text exposition format."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_openmetrics(stats, detector_names):
+    """
+    Render scan statistics in the OpenMetrics text format.
+
+    Args:
+        stats: ScanStats of a finished run
+        detector_names: Detector names used as label values (every
+            detector gets a findings sample, even when it found nothing)
+
+    Returns:
+        OpenMetrics text ending with '# EOF'
+    """
+    lines = []
+
+    def family(name, metric_type, help_text):
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines.append(f"# HELP {name} {help_text}")
+
+    def histogram(name, hist, labels=''):
+        prefix = f"{labels}," if labels else ''
+        for le, count in hist.samples():
+            lines.append(f'{name}_bucket{{{prefix}le="{le}"}} {count}')
+        suffix = f"{{{labels}}}" if labels else ''
+        lines.append(f"{name}_count{suffix} {hist.count}")
+        lines.append(f"{name}_sum{suffix} {hist.sum!r}")
+
+    family('smell_files_scanned', 'counter', 'Files handed to the detector.')
+    lines.append(f"smell_files_scanned_total {stats.files_scanned}")
+    family('smell_files_skipped', 'counter', 'Files skipped by the prefilter without parsing.')
+    lines.append(f"smell_files_skipped_total {stats.files_skipped}")
+    family('smell_parsed_bytes', 'counter', 'Bytes of source code parsed.')
+    lines.append(f"smell_parsed_bytes_total {stats.bytes_parsed}")
+    family('smell_parse_failures', 'counter', 'Files that failed to parse.')
+    lines.append(f"smell_parse_failures_total {stats.parse_failures}")
+    family('smell_errors', 'counter', 'Files that could not be analyzed, including parse failures.')
+    lines.append(f"smell_errors_total {stats.errors}")
+
+    family('smell_findings', 'counter', 'Smells reported, by detector.')
+    for name in detector_names:
+        lines.append(f'smell_findings_total{{detector="{_escape(name)}"}} {stats.findings.get(name, 0)}')
+
+    family('smell_file_duration_seconds', 'histogram', 'Time to analyze one file.')
+    histogram('smell_file_duration_seconds', stats.file_latency)
+    family('smell_parse_duration_seconds', 'histogram', 'Time spent in ast.parse per file.')
+    histogram('smell_parse_duration_seconds', stats.parse_latency)
+    family('smell_detector_duration_seconds', 'histogram', 'Time spent in detect() per file, by detector.')
+    for name in detector_names:
+        if name in stats.detector_latency:
+            histogram('smell_detector_duration_seconds', stats.detector_latency[name],
+                      f'detector="{_escape(name)}"')
+
+    family('smell_cache_hits', 'counter', 'Cache lookups that found a stored result.')
+    lines.append(f"smell_cache_hits_total {stats.cache_hits}")
+    family('smell_cache_misses', 'counter', 'Cache lookups that had to analyze.')
+    lines.append(f"smell_cache_misses_total {stats.cache_misses}")
+    lookups = stats.cache_hits + stats.cache_misses
+    if lookups:
+        family('smell_cache_hit_ratio', 'gauge', 'Share of cache lookups that hit.')
+        lines.append(f"smell_cache_hit_ratio {stats.cache_hits / lookups!r}")
+
+    family('smell_scan_wall_seconds', 'gauge', 'Wall-clock duration of the run.')
+    lines.append(f"smell_scan_wall_seconds {stats.wall_seconds!r}")
+    family('smell_scan_cpu_seconds', 'gauge', 'CPU time of the run, including worker processes.')
+    lines.append(f"smell_scan_cpu_seconds {stats.cpu_seconds!r}")
+    family('smell_scan_timestamp_seconds', 'gauge', 'Unix time the run finished.')
+    lines.append(f"smell_scan_timestamp_seconds {time.time()!r}")
+
+    lines.append('# EOF')
+    return '\n'.join(lines) + '\n'
+
+
+def write_metrics_file(stats, detector_names, path):
+    """
+    Write OpenMetrics text atomically, so a textfile collector never reads
+    a half-written file.
+    """
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(format_openmetrics(stats, detector_names))
+    os.replace(temp_path, path)
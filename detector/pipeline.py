@@ -0,0 +1,153 @@
+"""
+Prefetching file pipeline: discovery, reading and analysis overlap.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Files read ahead per I/O thread; bounds the sources held in memory
+PREFETCH_PER_THREAD = 4
+
+# How often a blocked discovery thread checks whether the scan stopped
+_POLL_SECONDS = 0.05
+
+_DONE = object()
+
+
+class PrefetchPipeline:
+    """
+    Reads files in a small thread pool while the caller analyzes them.
+
+    Three stages run at once: a discovery thread walks the file list and
+    submits each file to the I/O pool, which runs load(filepath) to read
+    and decode it; the caller takes the loaded files in discovery order,
+    so results come out in the same order as a serial scan. The queue
+    between the stages holds at most io_threads * PREFETCH_PER_THREAD
+    files. When it is full, discovery waits for analysis to catch up.
+
+    Stalls are measured on both sides: analysis waiting for a file that
+    isn't loaded yet means I/O is the bottleneck; discovery waiting on a
+    full queue means analysis is.
+    """
+
+    def __init__(self, files, load, io_threads=4):
+        """
+        Start the discovery thread and the I/O pool.
+
+        Args:
+            files: Iterable of file paths, consumed in the discovery thread
+            load: Callable reading one file; its return value is passed
+                through to the caller
+            io_threads: Threads reading files
+        """
+        self.io_threads = io_threads
+        self.queue_size = io_threads * PREFETCH_PER_THREAD
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._pool = ThreadPoolExecutor(max_workers=io_threads,
+                                        thread_name_prefix='smell-io')
+        self._stop = threading.Event()
+        self._load = load
+        self.stats = {
+            'io_threads': io_threads,
+            'queue_size': self.queue_size,
+            'files': 0,
+            'depth_samples': 0,
+            'depth_total': 0,
+            'max_depth': 0,
+            'analysis_stalls': 0,
+            'analysis_stall_seconds': 0.0,
+            'discovery_stalls': 0,
+            'discovery_stall_seconds': 0.0
+        }
+        self._discovery = threading.Thread(target=self._discover, args=(files,),
+                                           name='smell-discovery', daemon=True)
+        self._discovery.start()
+
+    def _discover(self, files):
+        try:
+            for filepath in files:
+                if not self._put((filepath, self._pool.submit(self._load, filepath))):
+                    return
+        except Exception as e:
+            self._put(e)
+            return
+        self._put(_DONE)
+
+    def _put(self, item):
+        """Queue an item, waiting while the queue is full; False once stopped."""
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            pass
+        start = time.perf_counter()
+        self.stats['discovery_stalls'] += 1
+        try:
+            while not self._stop.is_set():
+                try:
+                    self._queue.put(item, timeout=_POLL_SECONDS)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            self.stats['discovery_stall_seconds'] += time.perf_counter() - start
+
+    def __iter__(self):
+        """
+        Yield loaded files in discovery order.
+
+        Yields:
+            Tuple (filepath, value returned by load)
+
+        Raises:
+            Exception: Whatever iterating the file list or load raised
+        """
+        stats = self.stats
+        while True:
+            depth = self._queue.qsize()
+            stats['depth_samples'] += 1
+            stats['depth_total'] += depth
+            stats['max_depth'] = max(stats['max_depth'], depth)
+            start = time.perf_counter()
+            item = self._queue.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            filepath, future = item
+            stalled = depth == 0 or not future.done()
+            loaded = future.result()
+            if stalled:
+                stats['analysis_stalls'] += 1
+                stats['analysis_stall_seconds'] += time.perf_counter() - start
+            stats['files'] += 1
+            yield filepath, loaded
+
+    def close(self):
+        """Stop discovery and drop files read ahead but not analyzed."""
+        self._stop.set()
+        while True:
+            alive = self._discovery.is_alive()
+            try:
+                if alive:
+                    item = self._queue.get(timeout=_POLL_SECONDS)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                if alive:
+                    continue
+                break
+            if isinstance(item, tuple):
+                item[1].cancel()
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def report(self):
+        """Statistics of the run, with the mean queue depth seen by analysis."""
+        stats = dict(self.stats)
+        samples = stats.pop('depth_samples')
+        stats['mean_depth'] = stats.pop('depth_total') / samples if samples else 0.0
+        return stats
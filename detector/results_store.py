@@ -0,0 +1,490 @@
+"""
+SQLite store of scan results, for trends and comparisons across runs.
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+from datetime import datetime
+
+
+# Bump when the schema changes
+STORE_VERSION = '2'
+
+# Files written per transaction
+BATCH_FILES = 1000
+
+SEVERITIES = ('high', 'medium', 'low')
+
+
+def finding_keys(path, smells):
+    """
+    Identities of a file's findings across runs.
+
+    Numbers in the description are ignored, so a method that grew from 40
+    to 45 lines, or moved down the file, is still the same finding. That
+    makes findings such as two magic numbers in one file look alike, so
+    alike findings are told apart by their occurrence, counted from the
+    top of the file: a file with one more of them than before has exactly
+    one new finding, the last one.
+
+    Args:
+        path: File the findings are in
+        smells: The file's findings
+
+    Returns:
+        List of signed 64-bit integers (SQLite's integer range), one per
+        finding in the order of smells
+    """
+    keys = [None] * len(smells)
+    occurrences = {}
+    by_line = sorted(range(len(smells)), key=lambda index: smells[index].get('line_start') or 0)
+    for index in by_line:
+        smell = smells[index]
+        description = re.sub(r'\d+(\.\d+)?', '#', smell.get('description', ''))
+        text = f"{path}\0{smell['smell_type']}\0{description}"
+        occurrence = occurrences.get(text, 0)
+        occurrences[text] = occurrence + 1
+        text = f"{text}\0{occurrence}"
+        digest = hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=8).digest()
+        keys[index] = int.from_bytes(digest, 'big', signed=True)
+    return keys
+
+
+def parse_since(text):
+    """
+    Parse a --since date (YYYY-MM-DD or an ISO timestamp).
+
+    Returns:
+        ISO timestamp string, comparable with stored run timestamps
+
+    Raises:
+        ValueError: If the date is malformed
+    """
+    try:
+        return datetime.fromisoformat(text).isoformat()
+    except ValueError:
+        raise ValueError(f"invalid date '{text}' (expected e.g. 2026-10-01)")
+
+
+class ResultsStore:
+    """
+    Findings, per-file counts and metadata of every stored run.
+
+    A run is written in transactions of BATCH_FILES files and only becomes
+    visible to queries once its last batch is committed. Per-run totals by
+    smell type and severity are kept in their own table, so trends never
+    read the findings; the other queries go through indexes on run, file,
+    smell type and severity.
+    """
+
+    def __init__(self, path):
+        """
+        Open or create a store.
+
+        Args:
+            path: SQLite database file
+
+        Raises:
+            ValueError: If the file holds a store of another version
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self._create_schema()
+
+    def _create_schema(self):
+        with self.connection:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS runs (
+                    id INTEGER PRIMARY KEY,
+                    started_at TEXT NOT NULL,
+                    target TEXT NOT NULL,
+                    config_hash TEXT NOT NULL,
+                    detectors TEXT NOT NULL,
+                    files INTEGER NOT NULL DEFAULT 0,
+                    errors INTEGER NOT NULL DEFAULT 0,
+                    smells INTEGER NOT NULL DEFAULT 0,
+                    wall_seconds REAL,
+                    complete INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS runs_started ON runs (started_at);
+                CREATE TABLE IF NOT EXISTS files (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT UNIQUE NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS file_results (
+                    run_id INTEGER NOT NULL,
+                    file_id INTEGER NOT NULL,
+                    smells INTEGER NOT NULL,
+                    high INTEGER NOT NULL,
+                    medium INTEGER NOT NULL,
+                    low INTEGER NOT NULL,
+                    skipped INTEGER NOT NULL,
+                    error TEXT,
+                    PRIMARY KEY (run_id, file_id)
+                );
+                CREATE INDEX IF NOT EXISTS file_results_file ON file_results (file_id, run_id);
+                CREATE INDEX IF NOT EXISTS file_results_rank ON file_results (run_id, smells);
+                CREATE TABLE IF NOT EXISTS findings (
+                    run_id INTEGER NOT NULL,
+                    file_id INTEGER NOT NULL,
+                    key INTEGER NOT NULL,
+                    smell_type TEXT NOT NULL,
+                    severity TEXT NOT NULL,
+                    line_start INTEGER,
+                    line_end INTEGER,
+                    description TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS findings_run ON findings (run_id, key);
+                CREATE INDEX IF NOT EXISTS findings_file ON findings (file_id, run_id);
+                CREATE INDEX IF NOT EXISTS findings_type ON findings (smell_type, run_id);
+                CREATE INDEX IF NOT EXISTS findings_severity ON findings (severity, run_id);
+                CREATE TABLE IF NOT EXISTS run_totals (
+                    run_id INTEGER NOT NULL,
+                    smell_type TEXT NOT NULL,
+                    severity TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (run_id, smell_type, severity)
+                );
+            """)
+
+        stored = dict(self.connection.execute("SELECT key, value FROM meta"))
+        if not stored:
+            with self.connection:
+                self.connection.execute("INSERT INTO meta (key, value) VALUES ('version', ?)",
+                                        (STORE_VERSION,))
+        elif stored.get('version') != STORE_VERSION:
+            raise ValueError(f"Results store '{self.path}' has version {stored.get('version')}, "
+                             f"expected {STORE_VERSION}")
+
+    def close(self):
+        """Close the database."""
+        self.connection.close()
+
+    def _file_ids(self, paths):
+        """Ids of paths, adding the ones not seen before; the caller holds the transaction."""
+        self.connection.executemany("INSERT OR IGNORE INTO files (path) VALUES (?)",
+                                    ((path,) for path in paths))
+        ids = {}
+        for path in paths:
+            ids[path] = self.connection.execute("SELECT id FROM files WHERE path = ?",
+                                                (path,)).fetchone()[0]
+        return ids
+
+    def add_run(self, results, target, detectors, config_hash, wall_seconds=None,
+                started_at=None):
+        """
+        Store the results of one run.
+
+        Args:
+            results: Analysis results, as returned by analyze_paths()
+            target: Path (or ref, or archive) that was analyzed
+            detectors: Names of the active detectors
+            config_hash: Fingerprint of the detector configuration
+            wall_seconds: Duration of the run
+            started_at: Start time as datetime (default: now)
+
+        Returns:
+            Id of the new run
+        """
+        started_at = (started_at or datetime.now()).isoformat(timespec='seconds')
+        with self.connection:
+            run_id = self.connection.execute(
+                "INSERT INTO runs (started_at, target, config_hash, detectors) VALUES (?, ?, ?, ?)",
+                (started_at, target, config_hash, json.dumps(detectors))).lastrowid
+
+        totals = {}
+        errors = 0
+        try:
+            for start in range(0, len(results), BATCH_FILES):
+                batch = results[start:start + BATCH_FILES]
+                errors += sum(1 for result in batch if 'error' in result)
+                with self.connection:
+                    self._add_batch(run_id, batch, totals)
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT INTO run_totals (run_id, smell_type, severity, count) VALUES (?, ?, ?, ?)",
+                    ((run_id, smell_type, severity, count)
+                     for (smell_type, severity), count in sorted(totals.items())))
+                self.connection.execute(
+                    "UPDATE runs SET files = ?, errors = ?, smells = ?, wall_seconds = ?, "
+                    "complete = 1 WHERE id = ?",
+                    (len(results), errors, sum(totals.values()), wall_seconds, run_id))
+        except BaseException:
+            self._delete_run(run_id)
+            raise
+        return run_id
+
+    def _add_batch(self, run_id, results, totals):
+        file_ids = self._file_ids([result['file'] for result in results])
+        file_rows = []
+        finding_rows = []
+        for result in results:
+            path = result['file']
+            file_id = file_ids[path]
+            by_severity = {severity: 0 for severity in SEVERITIES}
+            keys = finding_keys(path, result['smells'])
+            for smell, identity in zip(result['smells'], keys):
+                severity = smell.get('severity', '')
+                if severity in by_severity:
+                    by_severity[severity] += 1
+                key = (smell['smell_type'], severity)
+                totals[key] = totals.get(key, 0) + 1
+                finding_rows.append((run_id, file_id, identity, smell['smell_type'],
+                                     severity, smell.get('line_start'), smell.get('line_end'),
+                                     smell.get('description', '')))
+            file_rows.append((run_id, file_id, len(result['smells']), by_severity['high'],
+                              by_severity['medium'], by_severity['low'],
+                              1 if result.get('skipped') else 0, result.get('error')))
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO file_results (run_id, file_id, smells, high, medium, low, "
+            "skipped, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", file_rows)
+        self.connection.executemany(
+            "INSERT INTO findings (run_id, file_id, key, smell_type, severity, line_start, "
+            "line_end, description) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", finding_rows)
+
+    def _delete_run(self, run_id):
+        """Drop a run that could not be stored completely."""
+        with self.connection:
+            for table in ('findings', 'file_results', 'run_totals'):
+                self.connection.execute(f"DELETE FROM {table} WHERE run_id = ?", (run_id,))
+            self.connection.execute("DELETE FROM runs WHERE id = ?", (run_id,))
+
+    def runs(self, since=None, last=None):
+        """
+        Completed runs, oldest first.
+
+        Args:
+            since: Only runs started at or after this ISO timestamp
+            last: Only the most recent this many runs
+
+        Returns:
+            List of run dictionaries
+        """
+        query = ("SELECT id, started_at, target, config_hash, files, errors, smells, wall_seconds "
+                 "FROM runs WHERE complete = 1 AND started_at >= ? ORDER BY id DESC")
+        params = [since or '']
+        if last is not None:
+            query += " LIMIT ?"
+            params.append(last)
+        columns = ('run', 'started_at', 'target', 'config_hash', 'files', 'errors', 'smells',
+                   'wall_seconds')
+        rows = self.connection.execute(query, params).fetchall()
+        return [dict(zip(columns, row)) for row in reversed(rows)]
+
+    def resolve_run(self, run=None, since=None):
+        """
+        Pick a run by id, by date or the latest.
+
+        Args:
+            run: Run id, or a negative number counting back from the
+                latest run (-1 is the latest, -2 the one before)
+            since: The first run started at or after this ISO timestamp
+
+        Returns:
+            Run id, or None if there is no such run
+        """
+        if since is not None:
+            row = self.connection.execute(
+                "SELECT id FROM runs WHERE complete = 1 AND started_at >= ? ORDER BY id LIMIT 1",
+                (since,)).fetchone()
+        elif run is None or run < 0:
+            offset = -run - 1 if run is not None else 0
+            row = self.connection.execute(
+                "SELECT id FROM runs WHERE complete = 1 ORDER BY id DESC LIMIT 1 OFFSET ?",
+                (offset,)).fetchone()
+        else:
+            row = self.connection.execute(
+                "SELECT id FROM runs WHERE complete = 1 AND id = ?", (run,)).fetchone()
+        return row[0] if row else None
+
+    def trend(self, since=None, last=None, smell_type=None, severity=None, path=None):
+        """
+        Number of findings per run.
+
+        Without a path, counts come from the per-run totals. With a path,
+        they come from that file's findings.
+
+        Args:
+            since: Only runs started at or after this ISO timestamp
+            last: Only the most recent this many runs
+            smell_type: Count only this smell type
+            severity: Count only this severity
+            path: Count only findings in this file
+
+        Returns:
+            List of run dictionaries, oldest first, with 'count' and
+            'by_type' added
+        """
+        runs = self.runs(since, last)
+        if not runs:
+            return []
+        conditions = ["run_id BETWEEN ? AND ?"]
+        params = [runs[0]['run'], runs[-1]['run']]
+        if smell_type:
+            conditions.append("smell_type = ?")
+            params.append(smell_type)
+        if severity:
+            conditions.append("severity = ?")
+            params.append(severity)
+        if path is not None:
+            conditions.append("file_id = (SELECT id FROM files WHERE path = ?)")
+            params.append(path)
+            count, source = "COUNT(*)", "findings"
+        else:
+            count, source = "SUM(count)", "run_totals"
+        rows = self.connection.execute(
+            f"SELECT run_id, smell_type, {count} FROM {source} "
+            f"WHERE {' AND '.join(conditions)} GROUP BY run_id, smell_type", params)
+
+        by_run = {run['run']: run for run in runs}
+        for run in runs:
+            run['count'] = 0
+            run['by_type'] = {}
+        for run_id, row_type, count in rows:
+            if run_id in by_run:
+                by_run[run_id]['by_type'][row_type] = count
+                by_run[run_id]['count'] += count
+        return runs
+
+    def top_offenders(self, run_id, limit=10, smell_type=None, severity=None):
+        """
+        Files with the most findings in a run.
+
+        Returns:
+            List of (path, count) tuples, most findings first
+        """
+        if not smell_type and not severity:
+            rows = self.connection.execute("""
+                SELECT f.path, r.smells
+                FROM file_results r JOIN files f ON f.id = r.file_id
+                WHERE r.run_id = ? AND r.smells > 0
+                ORDER BY r.smells DESC, f.path
+                LIMIT ?
+            """, (run_id, limit))
+            return rows.fetchall()
+        conditions = ["run_id = ?"]
+        params = [run_id]
+        if smell_type:
+            conditions.append("smell_type = ?")
+            params.append(smell_type)
+        if severity:
+            conditions.append("severity = ?")
+            params.append(severity)
+        params.append(limit)
+        rows = self.connection.execute(f"""
+            SELECT f.path, t.count
+            FROM (SELECT file_id, COUNT(*) AS count FROM findings
+                  WHERE {' AND '.join(conditions)} GROUP BY file_id) t
+            JOIN files f ON f.id = t.file_id
+            ORDER BY t.count DESC, f.path
+            LIMIT ?
+        """, params)
+        return rows.fetchall()
+
+    def diff(self, old_run, new_run, limit=None):
+        """
+        Compare two runs.
+
+        Findings are matched with finding_keys(): same file, smell type,
+        description apart from numbers, and occurrence among alike
+        findings of the file.
+
+        Args:
+            old_run: Id of the earlier run
+            new_run: Id of the later run
+            limit: Maximum findings and files listed per section
+
+        Returns:
+            Dictionary with 'new' and 'resolved' findings, and 'worse' and
+            'better' files with their counts in both runs
+        """
+        limit = -1 if limit is None else limit
+
+        def missing(run_id, other_run):
+            rows = self.connection.execute("""
+                SELECT f.path, x.smell_type, x.severity, x.line_start, x.line_end, x.description
+                FROM findings x JOIN files f ON f.id = x.file_id
+                WHERE x.run_id = ? AND NOT EXISTS (
+                    SELECT 1 FROM findings y WHERE y.run_id = ? AND y.key = x.key)
+                ORDER BY f.path, x.line_start
+                LIMIT ?
+            """, (run_id, other_run, limit))
+            columns = ('file', 'smell_type', 'severity', 'line_start', 'line_end', 'description')
+            return [dict(zip(columns, row)) for row in rows]
+
+        def changed(direction):
+            rows = self.connection.execute(f"""
+                SELECT f.path, COALESCE(a.smells, 0), COALESCE(b.smells, 0)
+                FROM (SELECT file_id FROM file_results WHERE run_id IN (?, ?)
+                      GROUP BY file_id) ids
+                JOIN files f ON f.id = ids.file_id
+                LEFT JOIN file_results a ON a.run_id = ? AND a.file_id = ids.file_id
+                LEFT JOIN file_results b ON b.run_id = ? AND b.file_id = ids.file_id
+                WHERE COALESCE(b.smells, 0) {direction} COALESCE(a.smells, 0)
+                ORDER BY ABS(COALESCE(b.smells, 0) - COALESCE(a.smells, 0)) DESC, f.path
+                LIMIT ?
+            """, (old_run, new_run, old_run, new_run, limit))
+            return [{'file': path, 'before': before, 'after': after}
+                    for path, before, after in rows]
+
+        return {
+            'from_run': old_run,
+            'to_run': new_run,
+            'new': missing(new_run, old_run),
+            'resolved': missing(old_run, new_run),
+            'worse': changed('>'),
+            'better': changed('<')
+        }
+
+
+def format_trend(runs):
+    """Text lines for trend()."""
+    lines = [f"{'Run':>5}  {'Started':<19}  {'Files':>7}  {'Smells':>7}  {'Change':>7}"]
+    previous = None
+    for run in runs:
+        change = '' if previous is None else f"{run['count'] - previous:+d}"
+        lines.append(f"{run['run']:>5}  {run['started_at']:<19}  {run['files']:>7}  "
+                     f"{run['count']:>7}  {change:>7}")
+        previous = run['count']
+    if not runs:
+        lines.append("No runs stored")
+    return lines
+
+
+def format_top(run_id, offenders):
+    """Text lines for top_offenders()."""
+    lines = [f"Top offenders in run {run_id}:"]
+    for path, count in offenders:
+        lines.append(f"{count:>7}  {path}")
+    if not offenders:
+        lines.append("  No findings")
+    return lines
+
+
+def format_diff(diff):
+    """Text lines for diff()."""
+    lines = [f"Run {diff['from_run']} -> run {diff['to_run']}: "
+             f"{len(diff['new'])} new, {len(diff['resolved'])} resolved finding(s)"]
+    for title, key in (('New findings', 'new'), ('Resolved findings', 'resolved')):
+        if diff[key]:
+            lines.append("")
+            lines.append(f"{title}:")
+            for finding in diff[key]:
+                lines.append(f"  {finding['file']}:{finding['line_start']} "
+                             f"{finding['smell_type']} [{finding['severity']}]")
+                lines.append(f"    {finding['description']}")
+    for title, key in (('Files that got worse', 'worse'), ('Files that got better', 'better')):
+        if diff[key]:
+            lines.append("")
+            lines.append(f"{title}:")
+            for change in diff[key]:
+                lines.append(f"  {change['before']:>5} -> {change['after']:<5} {change['file']}")
+    return lines
@@ -0,0 +1,304 @@
+"""
+Stratified random file sampling and smell-density estimates.
+"""
+
+import math
+import os
+import random
+
+
+# Upper bounds (bytes) of the file size strata; larger files form the last
+SIZE_BUCKETS = (2048, 8192, 32768, 131072)
+
+# Normal quantile for two-sided 95% confidence intervals
+Z_95 = 1.959963984540054
+
+
+def parse_sample_fraction(text):
+    """
+    Parse the --sample fraction.
+
+    Raises:
+        ValueError: If it is not a number in (0, 1]
+    """
+    try:
+        fraction = float(text)
+    except ValueError:
+        raise ValueError(f"Invalid sample fraction '{text}', expected a number such as 0.1")
+    if not 0 < fraction <= 1:
+        raise ValueError(f"Invalid sample fraction '{text}', must be greater than 0 and at most 1")
+    return fraction
+
+
+def _size_bucket(size):
+    for bucket, limit in enumerate(SIZE_BUCKETS):
+        if size < limit:
+            return bucket
+    return len(SIZE_BUCKETS)
+
+
+def _top_directory(filepath, root):
+    """First directory below root that holds the file ('.' for root itself)."""
+    relative = os.path.relpath(os.path.dirname(filepath) or '.', root)
+    return relative.split(os.sep)[0]
+
+
+def stratify(filepaths, sizes, sample_size):
+    """
+    Group files into strata by top-level directory and size bucket.
+
+    Every stratum should get at least two sampled files, or its variance
+    can't be estimated. When there are more strata than sample_size // 2,
+    the directory is dropped, then the size bucket.
+
+    Args:
+        filepaths: List of file paths
+        sizes: Dictionary of file sizes in bytes
+        sample_size: Number of files that will be sampled
+
+    Returns:
+        Dictionary mapping a stratum key (a tuple) to a sorted list of files
+    """
+    root = os.path.commonpath([os.path.abspath(p) for p in filepaths]) if filepaths else '.'
+    if os.path.isfile(root):
+        root = os.path.dirname(root)
+    keys = [
+        lambda p: (_top_directory(os.path.abspath(p), root), _size_bucket(sizes[p])),
+        lambda p: ('*', _size_bucket(sizes[p])),
+        lambda p: ('*', '*')
+    ]
+    for key in keys:
+        strata = {}
+        for filepath in filepaths:
+            strata.setdefault(key(filepath), []).append(filepath)
+        if len(strata) <= max(sample_size // 2, 1):
+            break
+    return {stratum: sorted(files) for stratum, files in strata.items()}
+
+
+def allocate(strata, sizes, sample_size):
+    """
+    Split sample_size over strata, favouring strata of large files.
+
+    This is Neyman allocation with the spread of a stratum's smell counts
+    taken to grow with the square root of its average file size, as for
+    counts of independent events. Each stratum gets one file first; the
+    rest is divided by unallocated files times that spread, with leftover
+    files going to the largest remainders. No stratum gets more files
+    than it has.
+
+    Returns:
+        Dictionary mapping a stratum key to its number of sampled files
+    """
+    counts = {stratum: 1 for stratum in strata}
+    average = {s: math.sqrt(max(sum(sizes[f] for f in files) / len(files), 1))
+               for s, files in strata.items()}
+    remaining = sample_size - len(strata)
+    while remaining > 0:
+        open_strata = {s: len(files) - counts[s] for s, files in strata.items()
+                       if len(files) > counts[s]}
+        if not open_strata:
+            break
+        weight = {s: room * average[s] for s, room in open_strata.items()}
+        capacity = sum(weight.values())
+        shares = {s: remaining * weight[s] / capacity for s in open_strata}
+        given = 0
+        for stratum, share in shares.items():
+            extra = min(int(share), open_strata[stratum])
+            counts[stratum] += extra
+            given += extra
+        leftover = remaining - given
+        by_remainder = sorted(shares, key=lambda s: (-(shares[s] - int(shares[s])), s))
+        for stratum in by_remainder:
+            if leftover == 0:
+                break
+            if counts[stratum] < len(strata[stratum]):
+                counts[stratum] += 1
+                leftover -= 1
+        remaining = leftover
+    return counts
+
+
+def draw_sample(filepaths, fraction=None, file_count=None, seed=0):
+    """
+    Draw a stratified random sample of files.
+
+    The sample depends only on the file list, their sizes and the seed.
+
+    Args:
+        filepaths: List of file paths
+        fraction: Share of the files to sample, or None
+        file_count: Number of files to sample, or None
+        seed: Seed of the random generator
+
+    Returns:
+        Tuple (sampled files in input order, plan) where plan maps each
+        stratum key to {'population': [...], 'sample': [...]}
+    """
+    sizes = {}
+    for filepath in filepaths:
+        try:
+            sizes[filepath] = os.path.getsize(filepath)
+        except OSError:
+            sizes[filepath] = 0
+
+    population = len(filepaths)
+    if file_count is not None:
+        sample_size = min(file_count, population)
+    else:
+        sample_size = min(max(round(fraction * population), 1), population)
+
+    strata = stratify(filepaths, sizes, sample_size)
+    counts = allocate(strata, sizes, sample_size)
+    rng = random.Random(seed)
+    plan = {}
+    chosen = set()
+    for stratum in sorted(strata, key=str):
+        files = strata[stratum]
+        sample = rng.sample(files, counts[stratum])
+        plan[stratum] = {'population': files, 'sample': sample}
+        chosen.update(sample)
+    return [filepath for filepath in filepaths if filepath in chosen], plan
+
+
+def _variance(values):
+    if len(values) < 2:
+        return None
+    mean = sum(values) / len(values)
+    return sum((v - mean) ** 2 for v in values) / (len(values) - 1)
+
+
+def _stratified_variance(plan, values_by_file, fallback):
+    """
+    Variance of a stratified total estimate, sum of N^2 (1 - n/N) s^2 / n.
+
+    Strata with a single sampled file use the variance of the whole
+    sample instead of their own.
+    """
+    variance = 0.0
+    for stratum in plan.values():
+        population = len(stratum['population'])
+        sampled = len(stratum['sample'])
+        if sampled == population:
+            continue
+        spread = _variance([values_by_file[f] for f in stratum['sample']])
+        if spread is None:
+            spread = fallback
+        variance += population ** 2 * (1 - sampled / population) * spread / sampled
+    return variance
+
+
+def estimate(plan, results, smell_types, line_counts):
+    """
+    Estimate full-scan totals and per-KLOC rates from a sample.
+
+    Totals use the stratified expansion estimator. Rates use the combined
+    ratio estimator (estimated smells / estimated KLOC) with its
+    linearized variance. Intervals are normal 95% intervals, clipped at 0.
+
+    Sampled files that failed to analyze are left out rather than counted
+    as smell-free: each stratum is estimated from its analyzed files
+    alone. Strata where every sampled file failed can't be estimated, and
+    their files are reported as unestimated.
+
+    Args:
+        plan: Plan returned by draw_sample()
+        results: Analysis results of the sampled files
+        smell_types: Smell types to report (the active detectors)
+        line_counts: Dictionary of line counts of the analyzed files, as
+            measured while analyzing them
+
+    Returns:
+        Dictionary with population and sample sizes, failed and
+        unestimated files, estimated lines and a 'detectors' mapping of
+        smell type to estimates
+    """
+    by_file = {result['file']: result for result in results}
+    analyzed = {}
+    failed_files = 0
+    unestimated_files = 0
+    for stratum, files in plan.items():
+        sample = [f for f in files['sample']
+                  if f in by_file and 'error' not in by_file[f] and f in line_counts]
+        failed_files += len(files['sample']) - len(sample)
+        if sample:
+            analyzed[stratum] = {'population': files['population'], 'sample': sample}
+        else:
+            unestimated_files += len(files['population'])
+    sampled_files = [f for stratum in analyzed.values() for f in stratum['sample']]
+    kloc = {filepath: line_counts[filepath] / 1000 for filepath in sampled_files}
+
+    def expand(values):
+        total = 0.0
+        for stratum in analyzed.values():
+            sample = stratum['sample']
+            total += len(stratum['population']) * sum(values[f] for f in sample) / len(sample)
+        return total
+
+    def interval(value, variance):
+        margin = Z_95 * math.sqrt(max(variance, 0.0))
+        return [max(value - margin, 0.0), value + margin]
+
+    estimated_kloc = expand(kloc)
+    kloc_variance = _stratified_variance(analyzed, kloc, _variance(list(kloc.values())) or 0.0)
+
+    detectors = {}
+    for smell_type in smell_types:
+        counts = {filepath: 0 for filepath in sampled_files}
+        for filepath in sampled_files:
+            for smell in by_file[filepath]['smells']:
+                if smell['smell_type'] == smell_type:
+                    counts[filepath] += 1
+        total = expand(counts)
+        total_variance = _stratified_variance(analyzed, counts,
+                                              _variance(list(counts.values())) or 0.0)
+
+        rate = total / estimated_kloc if estimated_kloc else 0.0
+        residuals = {f: counts[f] - rate * kloc[f] for f in sampled_files}
+        rate_variance = 0.0
+        if estimated_kloc:
+            rate_variance = _stratified_variance(
+                analyzed, residuals,
+                _variance(list(residuals.values())) or 0.0) / estimated_kloc ** 2
+
+        detectors[smell_type] = {
+            'sample_count': sum(counts.values()),
+            'estimated_total': total,
+            'total_ci95': interval(total, total_variance),
+            'per_kloc': rate,
+            'per_kloc_ci95': interval(rate, rate_variance)
+        }
+
+    return {
+        'population_files': sum(len(stratum['population']) for stratum in plan.values()),
+        'sampled_files': sum(len(stratum['sample']) for stratum in plan.values()),
+        'failed_files': failed_files,
+        'unestimated_files': unestimated_files,
+        'strata': len(plan),
+        'estimated_kloc': estimated_kloc,
+        'kloc_ci95': interval(estimated_kloc, kloc_variance),
+        'detectors': detectors
+    }
+
+
+def format_sample_report(sample):
+    """Text report lines for the estimates from estimate()."""
+    lines = [
+        f"Sample: {sample['sampled_files']} of {sample['population_files']} file(s) "
+        f"in {sample['strata']} strata (seed {sample['seed']})",
+        f"Estimated size: {sample['estimated_kloc']:.1f} KLOC "
+        f"(95% CI {sample['kloc_ci95'][0]:.1f}-{sample['kloc_ci95'][1]:.1f})"
+    ]
+    if sample['failed_files']:
+        lines.append(f"{sample['failed_files']} sampled file(s) failed to analyze and are left out "
+                     "of the estimates")
+    if sample['unestimated_files']:
+        lines.append(f"{sample['unestimated_files']} file(s) are in strata with no analyzed "
+                     "sample and are not estimated")
+    lines.append("Estimated smells for a full scan (95% confidence intervals):")
+    for smell_type, values in sample['detectors'].items():
+        low, high = values['total_ci95']
+        rate_low, rate_high = values['per_kloc_ci95']
+        lines.append(f"  {smell_type}: {values['estimated_total']:.0f} ({low:.0f}-{high:.0f}), "
+                     f"{values['per_kloc']:.2f}/KLOC ({rate_low:.2f}-{rate_high:.2f})")
+    return lines
@@ -0,0 +1,109 @@
+"""
+Cost model and longest-processing-time-first ordering for parallel scans.
+"""
+
+import json
+import os
+
+
+class CostModel:
+    """Predicts how long a file takes to analyze from its size and past runs."""
+
+    DEFAULT_HISTORY_PATH = '.smell_history.json'
+
+    # Rate used before any run has been recorded (roughly 1 second per MB)
+    DEFAULT_SECONDS_PER_BYTE = 1e-6
+
+    # Keep the history file small; least recently recorded files are dropped
+    MAX_ENTRIES = 50000
+
+    def __init__(self, history_path=None):
+        """
+        Initialize the model, loading earlier timings if available.
+
+        Args:
+            history_path: JSON file holding timings from earlier runs
+        """
+        self.history_path = history_path or self.DEFAULT_HISTORY_PATH
+        self.history = self._load_history()
+
+    def _load_history(self):
+        """Load recorded timings, starting empty if the file is unusable."""
+        if not os.path.exists(self.history_path):
+            return {}
+        try:
+            with open(self.history_path, 'r', encoding='utf-8') as f:
+                history = json.load(f)
+            return history.get('files', {})
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+    def seconds_per_byte(self):
+        """Average analysis rate over every recorded file."""
+        total_bytes = sum(entry['size'] for entry in self.history.values())
+        total_seconds = sum(entry['seconds'] for entry in self.history.values())
+        if total_bytes <= 0 or total_seconds <= 0:
+            return self.DEFAULT_SECONDS_PER_BYTE
+        return total_seconds / total_bytes
+
+    def predict(self, filepath, size, rate=None):
+        """
+        Predict the analysis time of one file.
+
+        A file seen before is predicted from its own timing, scaled by how
+        much it grew or shrank. Other files use the average rate.
+
+        Args:
+            filepath: Path of the file
+            size: Current size of the file in bytes
+            rate: Precomputed seconds_per_byte(), to avoid recomputing it
+
+        Returns:
+            Predicted time in seconds
+        """
+        entry = self.history.get(filepath)
+        if entry and entry['size'] > 0:
+            return entry['seconds'] * size / entry['size']
+        if entry:
+            return entry['seconds']
+        return (rate if rate is not None else self.seconds_per_byte()) * size
+
+    def record(self, filepath, size, seconds):
+        """Record the measured analysis time of one file."""
+        self.history.pop(filepath, None)
+        self.history[filepath] = {'size': size, 'seconds': seconds}
+
+    def save(self):
+        """Write the history file, keeping only the most recent entries."""
+        entries = list(self.history.items())[-self.MAX_ENTRIES:]
+        temp_path = self.history_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'files': dict(entries)}, f)
+        os.replace(temp_path, self.history_path)
+
+
+def lpt_order(filepaths, cost_model):
+    """
+    Order files longest-processing-time first.
+
+    Handing the most expensive files out first keeps one large file from
+    starting last and leaving the other workers idle at the end of a run.
+
+    Args:
+        filepaths: List of file paths
+        cost_model: CostModel used for predictions
+
+    Returns:
+        Tuple (ordered file paths, {path: (size, predicted seconds)})
+    """
+    rate = cost_model.seconds_per_byte()
+    predictions = {}
+    for filepath in filepaths:
+        try:
+            size = os.path.getsize(filepath)
+        except OSError:
+            size = 0
+        predictions[filepath] = (size, cost_model.predict(filepath, size, rate))
+
+    ordered = sorted(filepaths, key=lambda p: (-predictions[p][1], p))
+    return ordered, predictions
@@ -0,0 +1,142 @@
+"""
+Deterministic work sharding across CI nodes and merging of shard reports.
+"""
+
+import json
+import os
+
+
+def parse_shard_spec(spec):
+    """
+    Parse a shard specification of the form 'i/N'.
+
+    Args:
+        spec: String such as '2/4' (shards are numbered from 1)
+
+    Returns:
+        Tuple (index, count) with a 1-based index
+
+    Raises:
+        ValueError: If the specification is malformed or out of range
+    """
+    try:
+        index_text, count_text = spec.split('/')
+        index, count = int(index_text), int(count_text)
+    except ValueError:
+        raise ValueError(f"Invalid shard '{spec}', expected the form i/N (e.g. 1/4)")
+
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Invalid shard '{spec}', index must be between 1 and {max(count, 1)}")
+    return index, count
+
+
+def assign_shards(filepaths, count):
+    """
+    Split files into shards of roughly equal total byte size.
+
+    Files are handed out largest first, each to the currently lightest
+    shard (ties go to the lowest shard number). The order only depends on
+    file sizes and paths, so every node computes the same assignment for
+    the same checkout.
+
+    Args:
+        filepaths: List of file paths
+        count: Number of shards
+
+    Returns:
+        List of `count` lists of file paths, each in the input order
+    """
+    sizes = {}
+    for filepath in filepaths:
+        try:
+            sizes[filepath] = os.path.getsize(filepath)
+        except OSError:
+            sizes[filepath] = 0
+
+    loads = [0] * count
+    owner = {}
+    for filepath in sorted(filepaths, key=lambda p: (-sizes[p], p)):
+        shard = min(range(count), key=lambda s: (loads[s], s))
+        owner[filepath] = shard
+        loads[shard] += sizes[filepath]
+
+    shards = [[] for _ in range(count)]
+    for filepath in filepaths:
+        shards[owner[filepath]].append(filepath)
+    return shards
+
+
+def select_shard(filepaths, index, count):
+    """
+    Return the files belonging to one shard.
+
+    Args:
+        filepaths: List of file paths
+        index: 1-based shard number
+        count: Number of shards
+
+    Returns:
+        List of file paths assigned to shard `index`
+    """
+    return assign_shards(filepaths, count)[index - 1]
+
+
+def merge_reports(report_paths):
+    """
+    Combine per-shard JSON reports into one report.
+
+    The reports must be one complete set: each written with --shard, all
+    with the same shard count, and every shard from 1 to N exactly once.
+    Results are ordered by file path, which is the order a single-node run
+    produces, and totals are recomputed from the merged results.
+
+    Args:
+        report_paths: Paths to JSON reports written with --format json
+
+    Returns:
+        Tuple (active_detectors, results)
+
+    Raises:
+        ValueError: If a shard is missing, duplicated or from a run with
+            another shard count, the shards were run with different
+            detectors, or the same file appears in more than one shard
+    """
+    active_detectors = None
+    results_by_file = {}
+    shard_count = None
+    seen_shards = {}
+
+    for report_path in report_paths:
+        with open(report_path, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+
+        if 'shard' not in report:
+            raise ValueError(f"'{report_path}' has no shard; write shard reports with --shard")
+        index, count = parse_shard_spec(str(report['shard']))
+        if shard_count is None:
+            shard_count = count
+        elif count != shard_count:
+            raise ValueError(f"'{report_path}' is shard {index}/{count}, but other reports "
+                             f"are from {shard_count} shards")
+        if index in seen_shards:
+            raise ValueError(f"Shard {index}/{count} appears twice: "
+                             f"'{seen_shards[index]}' and '{report_path}'")
+        seen_shards[index] = report_path
+
+        if active_detectors is None:
+            active_detectors = report.get('active_detectors', [])
+        elif report.get('active_detectors', []) != active_detectors:
+            raise ValueError(f"'{report_path}' was produced with different active detectors "
+                             f"({', '.join(report.get('active_detectors', []))})")
+
+        for result in report.get('results', []):
+            if result['file'] in results_by_file:
+                raise ValueError(f"File '{result['file']}' appears in more than one shard")
+            results_by_file[result['file']] = result
+
+    missing = [str(index) for index in range(1, (shard_count or 0) + 1) if index not in seen_shards]
+    if missing:
+        raise ValueError(f"Missing shard(s) {', '.join(missing)} of {shard_count}")
+
+    results = [results_by_file[filepath] for filepath in sorted(results_by_file)]
+    return active_detectors or [], results
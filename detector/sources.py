@@ -0,0 +1,349 @@
+"""
+Readers that feed source code to the detector without a checked-out file.
+"""
+
+import io
+import os
+import re
+import subprocess
+import sys
+import threading
+import tokenize
+
+
+def decode_source(data):
+    """
+    Decode Python source bytes the way the interpreter does.
+
+    The encoding comes from a BOM or a PEP 263 coding comment, falling
+    back to UTF-8. Line endings are translated to '\n', as reading the
+    file in text mode would, so '\r\n' and lone '\r' files get the
+    same line numbers and text as '\n' files.
+
+    Args:
+        data: Source code as bytes
+
+    Returns:
+        Source code as string
+
+    Raises:
+        SyntaxError: If the coding comment names an unknown encoding
+        UnicodeDecodeError: If the bytes don't match the encoding
+    """
+    encoding, _ = tokenize.detect_encoding(io.BytesIO(data).readline)
+    return data.decode(encoding).replace('\r\n', '\n').replace('\r', '\n')
+
+
+class SourceTooLarge(Exception):
+    """Raised when a source is larger than the configured size limit."""
+
+
+def check_source_size(size, limit):
+    """
+    Enforce a maximum source size.
+
+    Args:
+        size: Size of the source in bytes
+        limit: Largest allowed size in bytes, or None for no limit
+
+    Raises:
+        SourceTooLarge: If size exceeds limit
+    """
+    if limit is not None and size > limit:
+        raise SourceTooLarge(f"File too large: {size} bytes (limit {limit})")
+
+
+def read_source_file(path, max_size=None):
+    """
+    Read a Python file once, as bytes, and decode it like decode_source().
+
+    The size is checked before anything is read, and the read stops one
+    byte past the limit in case the file grew in the meantime.
+
+    Args:
+        path: File to read
+        max_size: Largest file to read in bytes, or None for no limit
+
+    Returns:
+        Source code as string
+
+    Raises:
+        OSError: If the file can't be read
+        SourceTooLarge: If the file is larger than max_size
+        SyntaxError: If the coding comment names an unknown encoding
+        UnicodeDecodeError: If the bytes don't match the encoding
+    """
+    with open(path, 'rb') as f:
+        if max_size is None:
+            data = f.read()
+        else:
+            check_source_size(os.fstat(f.fileno()).st_size, max_size)
+            data = f.read(max_size + 1)
+            check_source_size(len(data), max_size)
+    return decode_source(data)
+
+
+class GitError(Exception):
+    """Raised when a git command fails."""
+
+
+def run_git(repo, *args):
+    """Run a git command in repo and return its stdout as bytes."""
+    try:
+        completed = subprocess.run(['git', '-C', repo] + list(args),
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        raise GitError(f"Could not run git: {e}")
+    if completed.returncode != 0:
+        message = completed.stderr.decode('utf-8', 'replace').strip()
+        raise GitError(message or f"git {args[0]} failed")
+    return completed.stdout
+
+
+def list_tree_blobs(repo, treeish):
+    """
+    List the Python files of a tree-ish.
+
+    Like `git ls-tree`, only the part of the tree below `repo` is listed
+    when `repo` is a subdirectory of the worktree. Paths are relative to
+    the repository root, so 'treeish:path' is a valid git object name.
+
+    Args:
+        repo: Repository directory (or a subdirectory of it)
+        treeish: Commit, branch, tag or tree to list
+
+    Returns:
+        List of (path, blob SHA) tuples in path order
+    """
+    output = run_git(repo, 'ls-tree', '-r', '-z', '--full-name', treeish)
+    blobs = []
+    for entry in output.split(b'\0'):
+        if not entry:
+            continue
+        meta, _, path = entry.partition(b'\t')
+        _, object_type, sha = meta.split(b' ')
+        path = path.decode('utf-8', 'surrogateescape')
+        if object_type == b'blob' and path.endswith('.py'):
+            blobs.append((path, sha.decode('ascii')))
+    return blobs
+
+
+HUNK_HEADER = re.compile(rb'^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@')
+
+
+def _diff_path(raw):
+    """Decode a path from a diff header, undoing git's C-style quoting."""
+    if raw.startswith(b'"') and raw.endswith(b'"'):
+        raw = raw[1:-1].decode('unicode_escape').encode('latin-1')
+    return raw.decode('utf-8', 'surrogateescape')
+
+
+def list_staged_changes(repo):
+    """
+    Find staged Python files and the line ranges their staged hunks touch.
+
+    Line numbers refer to the staged (index) version of each file. A hunk
+    that only deletes lines is recorded as the two lines around the
+    deletion.
+
+    Args:
+        repo: Repository directory (or a subdirectory of it)
+
+    Returns:
+        Dictionary mapping paths relative to the repository root to lists
+        of (first line, last line) tuples
+    """
+    output = run_git(repo, 'diff', '--cached', '-U0', '--no-color', '--no-ext-diff',
+                     '--diff-filter=ACMR', '--', '*.py')
+
+    changes = {}
+    current = None
+    for line in output.split(b'\n'):
+        if line.startswith(b'+++ '):
+            # git appends a tab to names that contain spaces
+            target = line[4:].rstrip(b'\t')
+            if target == b'/dev/null':
+                current = None
+                continue
+            current = _diff_path(target)
+            if current.startswith('b/'):
+                current = current[2:]
+            changes.setdefault(current, [])
+        elif line.startswith(b'@@') and current is not None:
+            match = HUNK_HEADER.match(line)
+            if not match:
+                continue
+            start = int(match.group(1))
+            count = int(match.group(2)) if match.group(2) is not None else 1
+            if count == 0:
+                changes[current].append((start, start + 1))
+            else:
+                changes[current].append((start, start + count - 1))
+    return changes
+
+
+def iter_staged_sources(repo, paths):
+    """
+    Stream the staged (index) contents of files.
+
+    Args:
+        repo: Repository directory (or a subdirectory of it)
+        paths: Paths relative to the repository root
+
+    Yields:
+        Tuple (path, bytes)
+    """
+    for name, data in iter_blob_contents(repo, [':' + path for path in paths]):
+        if data is not None:
+            yield name[1:], data
+
+
+def iter_blob_contents(repo, object_names):
+    """
+    Stream object contents through a single `git cat-file --batch` process.
+
+    Args:
+        repo: Repository directory
+        object_names: Blob SHAs or other object names git understands
+            (e.g. ':path' for the index)
+
+    Yields:
+        Tuple (object name, bytes), or (object name, None) when the
+        object does not exist
+    """
+    object_names = list(object_names)
+    if not object_names:
+        return
+
+    process = subprocess.Popen(['git', '-C', repo, 'cat-file', '--batch'],
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    # Feed names from a thread so a full stdout pipe can't block the writer
+    def feed():
+        try:
+            for name in object_names:
+                process.stdin.write(name.encode('utf-8', 'surrogateescape') + b'\n')
+            process.stdin.close()
+        except (BrokenPipeError, ValueError):
+            pass
+
+    writer = threading.Thread(target=feed, daemon=True)
+    writer.start()
+    try:
+        for name in object_names:
+            header = process.stdout.readline()
+            if not header:
+                raise GitError("git cat-file exited early")
+            parts = header.split()
+            if len(parts) < 3 or parts[-1] == b'missing':
+                yield name, None
+                continue
+            size = int(parts[2])
+            data = process.stdout.read(size)
+            process.stdout.read(1)
+            yield name, data
+    finally:
+        process.stdout.close()
+        process.kill()
+        process.wait()
+        writer.join()
+
+
+def iter_git_sources(repo, treeish):
+    """
+    Stream the Python sources of a tree-ish without a checkout.
+
+    Args:
+        repo: Repository directory (or a subdirectory of it)
+        treeish: Commit, branch, tag or tree to read
+
+    Yields:
+        Tuple (name, bytes) where name is 'treeish:path'
+    """
+    blobs = list_tree_blobs(repo, treeish)
+    paths_by_sha = {}
+    for path, sha in blobs:
+        paths_by_sha.setdefault(sha, []).append(path)
+
+    # Identical files share one blob, so each one is only read once
+    for sha, data in iter_blob_contents(repo, list(paths_by_sha)):
+        if data is None:
+            continue
+        for path in paths_by_sha[sha]:
+            yield f"{treeish}:{path}", data
+
+
+# Release artifacts and archives analyzed member by member
+ZIP_SUFFIXES = ('.whl', '.zip', '.egg')
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+
+class ArchiveError(Exception):
+    """Raised when an archive can't be read."""
+
+
+def is_archive(path):
+    """Check whether a path names a zip or tar archive by its suffix."""
+    return path.lower().endswith(ZIP_SUFFIXES + TAR_SUFFIXES)
+
+
+def iter_archive_sources(path):
+    """
+    Stream the Python files of a wheel, sdist, zip or tar archive.
+
+    Nothing is extracted to disk. Zip members are read in the order of
+    their local headers, so the file is read front to back; tar archives
+    are opened as a stream ('r|*'), which never seeks. Members that can't
+    be read (e.g. encrypted ones) are skipped with a warning.
+
+    Args:
+        path: Archive file
+
+    Yields:
+        Tuple (name, bytes) where name is 'archive!/member'
+
+    Raises:
+        ArchiveError: If the archive is corrupt or of an unknown kind
+    """
+    if path.lower().endswith(ZIP_SUFFIXES):
+        yield from _iter_zip_sources(path)
+    else:
+        yield from _iter_tar_sources(path)
+
+
+def _iter_zip_sources(path):
+    import zipfile
+
+    try:
+        archive = zipfile.ZipFile(path)
+    except (zipfile.BadZipFile, OSError) as e:
+        raise ArchiveError(f"Could not read '{path}': {e}")
+    with archive:
+        members = [info for info in archive.infolist()
+                   if not info.is_dir() and info.filename.endswith('.py')]
+        members.sort(key=lambda info: info.header_offset)
+        for info in members:
+            try:
+                data = archive.read(info)
+            except (zipfile.BadZipFile, RuntimeError, NotImplementedError, OSError) as e:
+                print(f"Warning: Skipping {path}!/{info.filename}: {e}", file=sys.stderr)
+                continue
+            yield f"{path}!/{info.filename}", data
+
+
+def _iter_tar_sources(path):
+    import tarfile
+
+    try:
+        archive = tarfile.open(path, mode='r|*')
+    except (tarfile.TarError, OSError) as e:
+        raise ArchiveError(f"Could not read '{path}': {e}")
+    with archive:
+        try:
+            for member in archive:
+                if not (member.isfile() and member.name.endswith('.py')):
+                    continue
+                data = archive.extractfile(member).read()
+                yield f"{path}!/{member.name}", data
+        except (tarfile.TarError, EOFError, OSError) as e:
+            raise ArchiveError(f"Could not read '{path}': {e}")
@@ -0,0 +1,144 @@
+"""
+Unit tests for the persistent cross-file clone index.
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import clone_index
+from clone_index import CloneIndex
+
+
+ORIGINAL = """def total_price(items, tax_rate):
+    subtotal = 0
+    for item in items:
+        if item.quantity > 0:
+            subtotal += item.price * item.quantity
+    discount = subtotal * 0.05 if subtotal > 100 else 0
+    return (subtotal - discount) * (1 + tax_rate)
+"""
+
+# The same method under another name, with one variable renamed
+RENAMED = """import math
+
+
+def order_total(items, tax_rate):
+    subtotal = 0
+    for entry in items:
+        if entry.quantity > 0:
+            subtotal += entry.price * entry.quantity
+    discount = subtotal * 0.05 if subtotal > 100 else 0
+    return (subtotal - discount) * (1 + tax_rate)
+"""
+
+UNRELATED = """def parse_header(line):
+    key, _, value = line.partition(':')
+    key = key.strip().lower()
+    value = value.strip()
+    if not key:
+        raise ValueError(line)
+    return key, value
+"""
+
+
+def variant(number):
+    """ORIGINAL with a different final constant, so no two variants are identical."""
+    return ORIGINAL.replace('(1 + tax_rate)', f'(1 + tax_rate) + {number}')
+
+
+class CloneIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.index = CloneIndex(os.path.join(self.tmp.name, 'clones.db'))
+
+    def tearDown(self):
+        self.index.close()
+        self.tmp.cleanup()
+
+    def duplicates(self, path, source):
+        return [(smell['duplicate_of']['file'], smell['duplicate_of']['name'])
+                for smell in self.index.query(path, source)]
+
+    def posting_counts_match(self):
+        """Every postings count equals the number of fingerprint rows it counts."""
+        rows = self.index.connection.execute("""
+            SELECT hash, count FROM postings
+            EXCEPT
+            SELECT hash, COUNT(*) FROM fingerprints GROUP BY hash
+        """).fetchall()
+        return rows == []
+
+
+class TestUpdates(CloneIndexTestCase):
+    """Files are added, replaced and removed one at a time."""
+
+    def test_unchanged_file_is_not_reindexed(self):
+        self.assertTrue(self.index.replace_file('a.py', ORIGINAL))
+        self.assertFalse(self.index.replace_file('a.py', ORIGINAL))
+        self.assertEqual(self.index.files(), ['a.py'])
+
+    def test_replacing_a_file_drops_its_old_methods(self):
+        self.index.replace_file('a.py', ORIGINAL)
+        self.index.replace_file('b.py', UNRELATED)
+        self.assertEqual(self.duplicates('new.py', ORIGINAL), [('a.py', 'total_price')])
+
+        self.assertTrue(self.index.replace_file('a.py', UNRELATED))
+        self.assertEqual(self.duplicates('new.py', ORIGINAL), [])
+        self.assertEqual(self.duplicates('new.py', UNRELATED),
+                         [('a.py', 'parse_header'), ('b.py', 'parse_header')])
+        self.assertTrue(self.posting_counts_match())
+
+    def test_removing_a_file_leaves_no_rows(self):
+        self.index.replace_file('a.py', ORIGINAL)
+        self.index.replace_file('b.py', variant(1))
+        self.assertTrue(self.index.remove_file('a.py'))
+        self.assertFalse(self.index.remove_file('a.py'))
+        self.assertEqual(self.index.files(), ['b.py'])
+        self.assertEqual(self.duplicates('new.py', UNRELATED), [])
+        self.assertTrue(self.posting_counts_match())
+
+        self.index.remove_file('b.py')
+        for table in ('files', 'methods', 'fingerprints', 'postings'):
+            count = self.index.connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            self.assertEqual(count, 0, table)
+
+    def test_file_is_never_its_own_duplicate(self):
+        self.index.replace_file('a.py', ORIGINAL)
+        self.assertEqual(self.duplicates('a.py', ORIGINAL), [])
+
+    def test_other_settings_are_rejected(self):
+        path = os.path.join(self.tmp.name, 'clones.db')
+        with self.assertRaisesRegex(ValueError, 'other settings'):
+            CloneIndex(path, min_lines=10)
+
+
+class TestMatching(CloneIndexTestCase):
+    """Winnowed fingerprints find near copies without scanning the index."""
+
+    def test_renamed_copy_in_another_file_is_found(self):
+        self.index.replace_file('pricing.py', ORIGINAL)
+        self.index.replace_file('headers.py', UNRELATED)
+        smells = self.index.query('orders.py', RENAMED)
+        self.assertEqual(len(smells), 1)
+        self.assertEqual(smells[0]['duplicate_of'],
+                         {'file': 'pricing.py', 'name': 'total_price', 'line_start': 1, 'line_end': 7})
+        self.assertEqual((smells[0]['line_start'], smells[0]['line_end']), (4, 10))
+        self.assertIn("'order_total'", smells[0]['description'])
+
+    def test_common_fingerprints_are_ignored_past_max_postings(self):
+        for number in range(4):
+            self.index.replace_file(f"copy{number}.py", variant(number))
+        self.assertEqual(len(self.duplicates('new.py', variant(9))), 4)
+
+        # Every shared fingerprint now has more postings than the cap
+        with mock.patch.object(clone_index, 'MAX_POSTINGS', 3):
+            self.assertEqual(self.duplicates('new.py', variant(9)), [])
+            # Identical text is still found through its text hash
+            self.assertEqual(self.duplicates('new.py', variant(2)), [('copy2.py', 'total_price')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,398 @@
+"""
+Unit tests for CodeSmellDetector: prefiltering, caching, executors, the
+async API, --fail-fast and profiles.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import main
+
+from main import CodeSmellDetector
+from incremental import DefinitionCache
+from detectors.long_method import LongMethodDetector
+from detectors.magic_numbers import MagicNumbersDetector
+
+
+def make_detector(detectors, **settings):
+    """Detector with only the given detector configurations enabled."""
+    config = {'detectors': {name: dict(values, enabled=True) for name, values in detectors.items()},
+              'prefilter': True}
+    config.update(settings)
+    detector = CodeSmellDetector(config=config)
+    detector.initialize_detectors()
+    return detector
+
+
+class TestPrefilter(unittest.TestCase):
+    """The prefilter skips detectors, never error reporting."""
+
+    def test_file_no_detector_could_flag_is_not_parsed(self):
+        """A skipped file is never parsed, so its syntax errors go unreported."""
+        detector = make_detector({'LongMethod': {'threshold': 30}})
+        result = detector.analyze_source("def broken(:\n    pass\n", 'broken.py')
+        self.assertTrue(result['skipped'])
+        self.assertNotIn('error', result)
+        report = detector.generate_report([result])
+        self.assertIn('Not parsed: 1 file(s)', report)
+
+    def test_file_no_detector_could_flag_is_skipped(self):
+        """A short valid file skips parsing and the detectors."""
+        detector = make_detector({'LongMethod': {'threshold': 30}})
+        result = detector.analyze_source("def small():\n    return None\n", 'small.py')
+        self.assertTrue(result['skipped'])
+        self.assertEqual(result['smells'], [])
+
+    def test_no_prefilter_parses_every_file(self):
+        """With the prefilter off, nothing is skipped and syntax errors are reported."""
+        detector = make_detector({'LongMethod': {'threshold': 30}}, prefilter=False)
+        self.assertNotIn('skipped', detector.analyze_source("def small():\n    return None\n"))
+        result = detector.analyze_source("def broken(:\n    pass\n", 'broken.py')
+        self.assertIn('Syntax error', result['error'])
+
+    def test_magic_numbers_may_fire(self):
+        """MagicNumbers looks for a literal that isn't allowed, or a flagged True/False."""
+        detector = MagicNumbersDetector({'allowed_numbers': [0, 1, -1, 2]})
+        self.assertFalse(detector.may_fire("x = y + z\nflag = True\n", 2))
+        self.assertFalse(detector.may_fire("item2 = items[1] * 2.0 + 1e0\n", 1))
+        for source in ("x = 42\n", "x = 0x10\n", "x = .5\n", "x = 3j\n", "x = 1_000\n",
+                       "s = f'{x * 7}'\n", "version = '3.11.7'\n"):
+            self.assertTrue(detector.may_fire(source, 1), source)
+        strict = MagicNumbersDetector({'allowed_numbers': [0]})
+        self.assertTrue(strict.may_fire("flag = True\n", 1))
+
+    def test_prefilter_does_not_change_findings(self):
+        """Files the prefilter skips would have had no findings anyway."""
+        sources = {'allowed.py': "def double(a):\n    return a * 2 + 1\n",
+                   'magic.py': "def compute(a):\n    return a * 42\n",
+                   'flags.py': "ENABLED = True\nRATIO = 0.0\n"}
+        with_prefilter = make_detector({'MagicNumbers': {}})
+        without = make_detector({'MagicNumbers': {}}, prefilter=False)
+        skipped = []
+        for name, source in sources.items():
+            result = with_prefilter.analyze_source(source, name)
+            if result.get('skipped'):
+                skipped.append(name)
+            self.assertEqual(result['smells'], without.analyze_source(source, name)['smells'])
+        self.assertEqual(skipped, ['allowed.py', 'flags.py'])
+
+
+NESTED = """LIMIT = 10
+
+
+def outer(a, b, c, d, e, f):
+    def inner(x):
+        return x * 37
+    return inner(a) + 99
+
+
+class Shape:
+    SIDES = 4
+
+    def area(self, other):
+        return other.width * other.height * other.depth * 3.5
+
+    class Inner:
+        def method(self, a, b, c, d, e, f):
+            return 12
+
+
+def later(a, b, c, d, e, f):
+    return [1, 2, 300]
+"""
+
+
+class TestCachedOrder(unittest.TestCase):
+    """--cache reports findings in the same order as a plain run."""
+
+    DETECTORS = {'MagicNumbers': {}, 'LargeParameterList': {'threshold': 5},
+                 'LongMethod': {'threshold': 1},
+                 'FeatureEnvy': {'min_external_calls': 2, 'external_call_ratio': 0.5}}
+
+    def analyze(self, cached, source):
+        detector = make_detector(self.DETECTORS)
+        if cached:
+            detector.definition_cache = DefinitionCache(None, detector.config_fingerprint())
+        return json.dumps(detector.analyze_source(source, 'nested.py'))
+
+    def test_cached_output_matches_uncached(self):
+        """Nested definitions keep their ast.walk() order across chunks."""
+        self.assertEqual(self.analyze(True, NESTED), self.analyze(False, NESTED))
+
+    def test_cache_hits_keep_order(self):
+        """Findings reused from the cache are ordered the same way."""
+        detector = make_detector(self.DETECTORS)
+        detector.definition_cache = DefinitionCache(None, detector.config_fingerprint())
+        detector.analyze_source(NESTED, 'nested.py')
+        again = json.dumps(detector.analyze_source(NESTED, 'nested.py'))
+        self.assertEqual(again, self.analyze(False, NESTED))
+
+
+class TestExecutors(unittest.TestCase):
+    """Thread pools are created once, whichever thread asks first."""
+
+    def test_detector_executor_created_once_under_concurrency(self):
+        """Concurrent first calls share one detector executor."""
+        detector = make_detector({'LongMethod': {'threshold': 30}})
+        detector.detector_threads = 2
+        barrier = threading.Barrier(8)
+        executors = []
+
+        def fetch():
+            barrier.wait()
+            executors.append(detector._get_detector_executor())
+
+        threads = [threading.Thread(target=fetch) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        detector.close()
+        self.assertEqual(len({id(executor) for executor in executors}), 1)
+
+    def test_threaded_detection_matches_serial(self):
+        """Detectors run in threads report what the serial loop reports."""
+        source = "def compute(a, b, c, d, e, f):\n    return a * 42 + b * 17\n"
+        serial = make_detector({'MagicNumbers': {}, 'LargeParameterList': {'threshold': 5}})
+        threaded = make_detector({'MagicNumbers': {}, 'LargeParameterList': {'threshold': 5}})
+        threaded.detector_threads = 2
+        threaded.PARALLEL_MIN_LINES = 0
+        try:
+            self.assertEqual(serial.analyze_source(source, 'c.py'),
+                             threaded.analyze_source(source, 'c.py'))
+            self.assertIsNotNone(threaded._detector_executor)
+        finally:
+            threaded.close()
+
+
+class TestAsyncAPI(unittest.TestCase):
+    """Async calls run concurrently, stay bounded, and can be cancelled."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.files = []
+        for index in range(6):
+            path = os.path.join(self.tmp.name, f"module{index}.py")
+            with open(path, 'w') as f:
+                f.write(f"def compute(x):\n    return x * {index + 40}\n")
+            self.files.append(path)
+        self.detector = make_detector({'MagicNumbers': {}})
+        self.detector.max_workers = 2
+
+    def tearDown(self):
+        self.detector.close()
+        self.tmp.cleanup()
+
+    def block_analysis(self):
+        """Make analyze_file wait for self.release; returns the started files."""
+        self.release = threading.Event()
+        started = []
+        analyze_file = self.detector.analyze_file
+
+        def blocked(filepath):
+            started.append(filepath)
+            self.release.wait(5)
+            return analyze_file(filepath)
+
+        self.detector.analyze_file = blocked
+        return started
+
+    def test_concurrent_calls_match_sync_results(self):
+        sources = [f"LIMIT = {n}\n" for n in range(100, 110)]
+
+        async def run():
+            return await asyncio.gather(*(self.detector.analyze_source_async(source, f"s{n}.py")
+                                          for n, source in enumerate(sources)))
+
+        results = asyncio.run(run())
+        self.assertEqual(results, [self.detector.analyze_source(source, f"s{n}.py")
+                                   for n, source in enumerate(sources)])
+
+    def test_paths_yield_every_file_with_bounded_submissions(self):
+        in_flight = []
+        peak = []
+        lock = threading.Lock()
+        analyze_file = self.detector.analyze_file
+
+        def counted(filepath):
+            with lock:
+                in_flight.append(filepath)
+                peak.append(len(in_flight))
+            try:
+                return analyze_file(filepath)
+            finally:
+                with lock:
+                    in_flight.remove(filepath)
+
+        self.detector.analyze_file = counted
+
+        async def run():
+            return [result async for result in
+                    self.detector.analyze_paths_async([self.tmp.name], max_in_flight=2)]
+
+        results = asyncio.run(run())
+        self.assertEqual(sorted(result['file'] for result in results), self.files)
+        self.assertTrue(all(result['smell_count'] == 1 for result in results))
+        self.assertLessEqual(max(peak), 2)
+
+    def test_cancelling_consumer_cancels_queued_files(self):
+        self.detector.max_workers = 1
+        started = self.block_analysis()
+
+        async def consume():
+            async for _ in self.detector.analyze_paths_async([self.tmp.name], max_in_flight=3):
+                pass
+
+        async def run():
+            task = asyncio.create_task(consume())
+            while not started:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run())
+        self.release.set()
+        self.detector.close()
+        self.assertEqual(started, self.files[:1])
+
+    def test_close_cancels_queued_work_and_can_be_repeated(self):
+        self.detector.max_workers = 1
+        started = self.block_analysis()
+        executor = self.detector._get_executor()
+        futures = [executor.submit(self.detector.analyze_file, path) for path in self.files]
+        while not started:
+            threading.Event().wait(0.01)
+        self.detector.close()
+        self.detector.close()
+        self.release.set()
+        self.assertTrue(all(future.cancelled() for future in futures[1:]))
+        self.assertEqual(futures[0].result()['smell_count'], 1)
+        self.assertIsNot(self.detector._get_executor(), executor)
+
+    def test_main_closes_the_detector(self):
+        output = os.path.join(self.tmp.name, 'report.txt')
+        config = os.path.join(os.path.dirname(os.path.abspath(main.__file__)), 'config.yaml')
+        argv = ['main.py', self.tmp.name, '--config', config, '--output', output]
+        with mock.patch('sys.argv', argv), \
+                mock.patch.object(main.CodeSmellDetector, 'close', autospec=True) as close:
+            main.main()
+        self.assertEqual(close.call_count, 1)
+        self.assertTrue(os.path.exists(output))
+
+
+class TestFailFast(unittest.TestCase):
+    """--fail-fast exits with EXIT_SMELLS_FOUND without analyzing every file."""
+
+    FILES = 40
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tree = os.path.join(self.tmp.name, 'tree')
+        os.mkdir(self.tree)
+        # First in walk order, and the largest file so --jobs schedules it first
+        with open(os.path.join(self.tree, 'a_smelly.py'), 'w') as f:
+            f.write('# padding\n' * 200 + "def area(radius):\n    return radius * radius * 3.14159\n")
+        for number in range(self.FILES - 1):
+            with open(os.path.join(self.tree, f"clean{number:02d}.py"), 'w') as f:
+                f.write(f"def step{number}(value):\n    return value + 1\n")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_main(self, *options):
+        output = os.path.join(self.tmp.name, 'report.json')
+        config = os.path.join(os.path.dirname(os.path.abspath(main.__file__)), 'config.yaml')
+        argv = ['main.py', self.tree, '--config', config, '--format', 'json', '--output', output,
+                '--history', os.path.join(self.tmp.name, 'history.json'), *options]
+        with mock.patch('sys.argv', argv), self.assertRaises(SystemExit) as exit_status:
+            main.main()
+        with open(output) as f:
+            return exit_status.exception.code, json.load(f)
+
+    def assert_stops_early(self, *options):
+        code, report = self.run_main('--fail-on', 'low', '--fail-fast', *options)
+        self.assertEqual(code, main.EXIT_SMELLS_FOUND)
+        self.assertEqual(report['stopped_at'], os.path.join(self.tree, 'a_smelly.py'))
+        self.assertLess(report['files_analyzed'], self.FILES)
+        return report
+
+    def test_serial_run_stops_at_first_smelly_file(self):
+        report = self.assert_stops_early()
+        self.assertEqual(report['files_analyzed'], 1)
+
+    def test_prefetching_run_stops_early(self):
+        report = self.assert_stops_early('--io-threads', '2')
+        self.assertEqual(report['files_analyzed'], 1)
+
+    def test_process_run_stops_early(self):
+        self.assert_stops_early('--jobs', '2')
+
+    def test_fail_on_alone_analyzes_every_file(self):
+        code, report = self.run_main('--fail-on', 'low')
+        self.assertEqual(code, main.EXIT_SMELLS_FOUND)
+        self.assertEqual(report['files_analyzed'], self.FILES)
+        self.assertNotIn('stopped_at', report)
+
+
+PROFILES = {
+    'strict': {'LongMethod': {'threshold': 3}, 'MagicNumbers': {'allowed_numbers': []}},
+    'default': {},
+    'legacy': {'LongMethod': {'threshold': 8}, 'GodClass': {'method_threshold': 2}},
+}
+
+PROFILED = """class Ledger:
+    def total(self, entries):
+        amount = 0
+        for entry in entries:
+            amount += entry.value * 1.2
+        return amount
+
+    def empty(self):
+        return True
+"""
+
+
+class TestProfileFacts(unittest.TestCase):
+    """Profile instances share per-node facts, and report what separate runs would."""
+
+    DETECTORS = {'LongMethod': {'threshold': 5}, 'MagicNumbers': {},
+                 'GodClass': {'method_threshold': 10}, 'FeatureEnvy': {}}
+
+    def make_profiled(self, profiles):
+        config = {'detectors': {name: dict(values, enabled=True)
+                                for name, values in self.DETECTORS.items()},
+                  'profiles': PROFILES}
+        detector = CodeSmellDetector(config=config)
+        detector.initialize_detectors(profiles=profiles)
+        return detector
+
+    def test_facts_are_collected_once_per_file(self):
+        detector = self.make_profiled(list(PROFILES))
+        self.assertEqual(len([name for name in detector.active_detectors
+                              if name.startswith('LongMethod[')]), 3)
+        with mock.patch.object(LongMethodDetector, 'collect_facts', autospec=True,
+                               side_effect=LongMethodDetector.collect_facts) as collect:
+            detector.analyze_source(PROFILED, 'ledger.py')
+        self.assertEqual(collect.call_count, 1)
+
+    def test_each_profile_reports_what_it_reports_alone(self):
+        def untagged(smells):
+            return sorted(json.dumps({key: value for key, value in smell.items()
+                                      if key != 'profiles'}) for smell in smells)
+
+        together = self.make_profiled(list(PROFILES)).analyze_source(PROFILED, 'ledger.py')
+        for profile in PROFILES:
+            alone = self.make_profiled([profile]).analyze_source(PROFILED, 'ledger.py')
+            tagged = [smell for smell in together['smells'] if profile in smell['profiles']]
+            self.assertTrue(alone['smells'], profile)
+            self.assertEqual(untagged(tagged), untagged(alone['smells']), profile)
+
+
+if __name__ == '__main__':
+    unittest.main()
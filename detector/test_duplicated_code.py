@@ -0,0 +1,64 @@
+"""
+Unit tests for DuplicatedCode's similarity pruning and parallel tiles.
+"""
+
+import ast
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from detectors.duplicated_code import DuplicatedCodeDetector, TILE_SIZE
+
+
+def make_source(count):
+    """Functions of a few shapes, so some pairs are near-duplicates."""
+    functions = []
+    for index in range(count):
+        shape = index % 4
+        functions.append(
+            f"def function_{index}(values):\n"
+            f"    total = {shape}\n"
+            f"    for value in values:\n"
+            f"        total += value * {shape + 3}\n"
+            f"    return total{' + 1' * (shape * 8)}\n")
+    return '\n\n'.join(functions)
+
+
+def detect(source, stats=None, prune=True, **config):
+    detector = DuplicatedCodeDetector(dict({'min_lines': 3, 'similarity_threshold': 0.9}, **config))
+    detector.prune = prune
+    return detector.detect_cached(ast.parse(source), source, 'dup.py', None, stats=stats)
+
+
+class TestPruning(unittest.TestCase):
+    """Upper bounds only skip pairs that would score below the threshold."""
+
+    def test_pruned_findings_match_unpruned(self):
+        source = make_source(40)
+        pruned_stats = DuplicatedCodeDetector.new_comparison_stats()
+        pruned = detect(source, stats=pruned_stats)
+        self.assertEqual(pruned, detect(source, prune=False))
+        self.assertTrue(pruned)
+        self.assertGreater(pruned_stats['pruned_length'] + pruned_stats['pruned_counts'], 0)
+        self.assertLess(pruned_stats['compared'], pruned_stats['pairs'])
+
+
+class TestParallelTiles(unittest.TestCase):
+    """Tiles compared in worker processes report what the serial loop reports."""
+
+    def setUp(self):
+        self.source = make_source(TILE_SIZE + 20)
+        self.serial = detect(self.source)
+
+    def test_parallel_matches_serial(self):
+        parallel = detect(self.source, processes=2, parallel_min_methods=TILE_SIZE)
+        self.assertEqual(parallel, self.serial)
+
+    def test_parallel_from_detector_thread(self):
+        """Workers are started safely from a thread, as with --threads."""
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            future = pool.submit(detect, self.source, processes=2, parallel_min_methods=TILE_SIZE)
+            self.assertEqual(future.result(timeout=120), self.serial)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+"""
+Unit tests for bounded-memory, repository-wide clone detection.
+"""
+
+import random
+import tracemalloc
+import unittest
+from unittest import mock
+
+import external_clones
+from external_clones import ExternalCloneFinder, RECORD
+
+
+def method(name, body):
+    lines = [f"def {name}(value):"] + [f"    {line}" for line in body] + ["    return value"]
+    return '\n'.join(lines) + '\n'
+
+
+# Ten distinct bodies, several of them shared by many files
+BODIES = [[f"value = value * {n} + {k}" for k in range(3)] for n in range(10)]
+
+
+def corpus(files=30, methods_per_file=3, seed=7):
+    rng = random.Random(seed)
+    sources = []
+    for number in range(files):
+        picks = [rng.randrange(len(BODIES)) for _ in range(methods_per_file)]
+        sources.append((f"pkg/module{number}.py",
+                        '\n'.join(method(f"f{index}", BODIES[pick]) for index, pick in enumerate(picks))))
+    return sources
+
+
+def find_groups(finder, sources):
+    try:
+        for path, source in sources:
+            finder.add_file(path, source)
+        return list(finder.finish()), finder.stats
+    finally:
+        finder.close()
+
+
+def random_record(rng):
+    """A record with large values, the most expensive kind to hold unpacked."""
+    return RECORD.pack(rng.getrandbits(63) - (1 << 62), rng.randrange(1 << 20),
+                       rng.randrange(1000, 50000), rng.randrange(1000, 50000))
+
+
+class TestMergePasses(unittest.TestCase):
+    """Merging many small runs in passes gives the groups of one in-memory pass."""
+
+    def test_multi_pass_merge_matches_single_pass(self):
+        sources = corpus()
+        single, single_stats = find_groups(ExternalCloneFinder(min_lines=3), sources)
+        self.assertEqual((single_stats['runs'], single_stats['merge_passes']), (1, 1))
+
+        finder = ExternalCloneFinder(min_lines=3)
+        finder.chunk_records = 4
+        with mock.patch.object(external_clones, 'MAX_FAN_IN', 3):
+            multi, multi_stats = find_groups(finder, sources)
+        self.assertGreater(multi_stats['runs'], 9)
+        self.assertGreaterEqual(multi_stats['merge_passes'], 3)
+
+        self.assertEqual(multi, single)
+        self.assertEqual(len(single), len(BODIES))
+        self.assertEqual(multi_stats['duplicated_methods'], 90)
+        self.assertEqual(multi_stats['groups'], single_stats['groups'])
+
+    def test_large_groups_are_truncated_but_counted(self):
+        sources = [(f"m{number}.py", method('f', BODIES[0])) for number in range(5)]
+        with mock.patch.object(external_clones, 'MAX_GROUP_MEMBERS', 2):
+            groups, stats = find_groups(ExternalCloneFinder(min_lines=3), sources)
+        self.assertEqual(groups, [[('m0.py', 1, 5), ('m1.py', 1, 5)]])
+        self.assertEqual(stats['duplicated_methods'], 5)
+
+
+class TestMemoryLimit(unittest.TestCase):
+    """Sorting a full buffer and merging runs stay within --memory-limit."""
+
+    LIMIT = 4 * 1024 ** 2
+
+    def setUp(self):
+        self.finder = ExternalCloneFinder(memory_limit=self.LIMIT)
+        self.rng = random.Random(1)
+        self.addCleanup(self.finder.close)
+
+    def fill_buffer(self):
+        for _ in range(self.finder.chunk_records):
+            self.finder.buffer += random_record(self.rng)
+        self.finder.buffered = self.finder.chunk_records
+
+    def test_sorting_a_full_buffer_fits_the_limit(self):
+        tracemalloc.start()
+        try:
+            start = tracemalloc.get_traced_memory()[0]
+            self.fill_buffer()
+            self.finder._flush()
+            peak = tracemalloc.get_traced_memory()[1] - start
+        finally:
+            tracemalloc.stop()
+        self.assertLessEqual(peak, self.LIMIT)
+        # The estimate is close, not just safe
+        self.assertGreater(peak, self.LIMIT * 0.75)
+
+    def test_merging_runs_fits_the_limit(self):
+        for _ in range(4):
+            self.fill_buffer()
+            self.finder._flush()
+        tracemalloc.start()
+        try:
+            start = tracemalloc.get_traced_memory()[0]
+            for _ in self.finder.finish():
+                pass
+            peak = tracemalloc.get_traced_memory()[1] - start
+        finally:
+            tracemalloc.stop()
+        self.assertLessEqual(peak, self.LIMIT)
+
+
+if __name__ == '__main__':
+    unittest.main()
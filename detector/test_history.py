@@ -0,0 +1,83 @@
+"""
+Unit tests for smell trends over git history.
+"""
+
+import os
+import subprocess
+import tempfile
+import unittest
+
+from main import CodeSmellDetector
+from history import scan_history, classify_changes, format_history, BlobResultCache
+
+
+def git(repo, *args):
+    subprocess.run(['git', '-c', 'user.name=Test', '-c', 'user.email=test@example.com',
+                    '-c', 'commit.gpgsign=false', *args],
+                   cwd=repo, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+CLEAN = "def area(radius):\n    return radius * radius\n"
+ONE = "def area(radius):\n    return radius * radius * 3.14\n"
+TWO = "def area(radius):\n    return radius * radius * 3.14\n\n\nSCALE = 10\n"
+
+
+class TestClassifyChanges(unittest.TestCase):
+    """Smells are matched per file and smell type."""
+
+    def test_counts_are_split_into_new_resolved_and_unchanged(self):
+        before = {'a.py': {'MagicNumbers': 3, 'LongMethod': 1}, 'gone.py': {'GodClass': 1}}
+        after = {'a.py': {'MagicNumbers': 2, 'FeatureEnvy': 1}, 'added.py': {'GodClass': 1}}
+        self.assertEqual(classify_changes(before, after),
+                         {'new': 2, 'resolved': 3, 'unchanged': 2})
+
+    def test_first_commit_is_all_new(self):
+        self.assertEqual(classify_changes({}, {'a.py': {'MagicNumbers': 2}}),
+                         {'new': 2, 'resolved': 0, 'unchanged': 0})
+
+
+class TestScanHistory(unittest.TestCase):
+    """Each commit is compared with the one before it, reusing blob results."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.repo = self.tmp.name
+        git(self.repo, 'init', '-q')
+        # (a.py, b.py) per commit, oldest first
+        for a_source, b_source in [(ONE, CLEAN), (ONE, ONE), (CLEAN, ONE), (CLEAN, TWO)]:
+            for name, source in (('a.py', a_source), ('b.py', b_source)):
+                with open(os.path.join(self.repo, name), 'w') as f:
+                    f.write(source)
+            git(self.repo, 'add', 'a.py', 'b.py')
+            git(self.repo, 'commit', '-q', '-m', 'change')
+        self.detector = CodeSmellDetector(config={'detectors': {}})
+        self.detector.initialize_detectors(only=['MagicNumbers'])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_commits_are_classified(self):
+        history = scan_history(self.detector, self.repo)
+        changes = [(entry['total_smells'], entry['new'], entry['resolved'], entry['unchanged'])
+                   for entry in history['commits']]
+        self.assertEqual(changes, [
+            (1, 1, 0, 0),   # a.py gets 3.14
+            (2, 1, 0, 1),   # b.py gets 3.14, a.py is untouched
+            (1, 0, 1, 1),   # a.py is fixed
+            (2, 1, 0, 1),   # b.py gets 10 on a new line, 3.14 stays
+        ])
+        self.assertIn('New', format_history(history))
+
+    def test_each_unique_blob_is_analyzed_once(self):
+        cache = BlobResultCache()
+        history = scan_history(self.detector, self.repo, cache=cache)
+        self.assertEqual(history['commits_scanned'], 4)
+        self.assertEqual((history['unique_blobs'], history['blobs_analyzed']), (3, 3))
+
+        again = scan_history(self.detector, self.repo, cache=cache)
+        self.assertEqual(again['blobs_analyzed'], 0)
+        self.assertEqual(again['commits'], history['commits'])
+
+
+if __name__ == '__main__':
+    unittest.main()
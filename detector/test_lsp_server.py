@@ -0,0 +1,155 @@
+"""
+Unit tests for the LSP server's message handling and incremental findings.
+"""
+
+import io
+import json
+import unittest
+
+from main import CodeSmellDetector
+from lsp_server import LanguageServer, PARSE_ERROR, INVALID_PARAMS, INTERNAL_ERROR
+from incremental import IncrementalAnalyzer
+
+
+def make_detector(detectors):
+    """Detector with only the given detector configurations enabled."""
+    config = {'detectors': {name: dict(values, enabled=True) for name, values in detectors.items()}}
+    detector = CodeSmellDetector(config=config)
+    detector.initialize_detectors()
+    return detector
+
+
+def frame(payload):
+    """Content-Length framing of one message (payload may be raw bytes)."""
+    body = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+    return f"Content-Length: {len(body)}\r\n\r\n".encode('ascii') + body
+
+
+def read_responses(data):
+    """Decode every framed message written by the server."""
+    messages = []
+    while data:
+        header, _, rest = data.partition(b'\r\n\r\n')
+        length = int(header.split(b':')[1])
+        messages.append(json.loads(rest[:length]))
+        data = rest[length:]
+    return messages
+
+
+class TestDispatch(unittest.TestCase):
+    """A bad message never stops the server."""
+
+    def run_server(self, *messages, server_setup=None):
+        reader = io.BytesIO(b''.join(frame(m) for m in messages))
+        writer = io.BytesIO()
+        server = LanguageServer(make_detector({'LongMethod': {'threshold': 30}}),
+                                reader=reader, writer=writer, debounce=60, module_debounce=60)
+        if server_setup:
+            server_setup(server)
+        exit_code = server.serve()
+        for document in server.documents.values():
+            server._cancel_timers(document)
+        return exit_code, read_responses(writer.getvalue())
+
+    def test_change_without_content_changes_is_dropped(self):
+        exit_code, responses = self.run_server(
+            {'jsonrpc': '2.0', 'method': 'textDocument/didOpen',
+             'params': {'textDocument': {'uri': 'file:///a.py', 'text': 'x = 1\n', 'version': 1}}},
+            {'jsonrpc': '2.0', 'method': 'textDocument/didChange',
+             'params': {'textDocument': {'uri': 'file:///a.py', 'version': 2}}},
+            {'jsonrpc': '2.0', 'id': 1, 'method': 'shutdown'},
+            {'jsonrpc': '2.0', 'method': 'exit'})
+        self.assertEqual(exit_code, 0)
+        self.assertIn({'jsonrpc': '2.0', 'id': 1, 'result': None}, responses)
+
+    def test_malformed_json_gets_parse_error(self):
+        exit_code, responses = self.run_server(
+            b'{"jsonrpc": "2.0", "id": 1,',
+            {'jsonrpc': '2.0', 'id': 2, 'method': 'shutdown'},
+            {'jsonrpc': '2.0', 'method': 'exit'})
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(responses[0]['error']['code'], PARSE_ERROR)
+        self.assertEqual(responses[1], {'jsonrpc': '2.0', 'id': 2, 'result': None})
+
+    def test_failing_request_gets_error_response(self):
+        def break_initialize(server):
+            server._initialize = lambda params: params['missing']
+
+        exit_code, responses = self.run_server(
+            {'jsonrpc': '2.0', 'id': 1, 'method': 'initialize', 'params': {}},
+            {'jsonrpc': '2.0', 'id': 2, 'method': 'shutdown'},
+            {'jsonrpc': '2.0', 'method': 'exit'},
+            server_setup=break_initialize)
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(responses[0]['id'], 1)
+        self.assertEqual(responses[0]['error']['code'], INVALID_PARAMS)
+        self.assertEqual(responses[1]['result'], None)
+
+    def test_internal_error_code(self):
+        def break_initialize(server):
+            server._initialize = lambda params: 1 / 0
+
+        _, responses = self.run_server(
+            {'jsonrpc': '2.0', 'id': 1, 'method': 'initialize', 'params': {}},
+            {'jsonrpc': '2.0', 'method': 'exit'},
+            server_setup=break_initialize)
+        self.assertEqual(responses[0]['error']['code'], INTERNAL_ERROR)
+
+
+DUPLICATES = '''def first(values):
+    total = 0
+    for value in values:
+        total += value * 3
+    return total
+
+
+def second(values):
+    total = 0
+    for value in values:
+        total += value * 3
+    return total
+'''
+
+
+class TestModuleScopeShift(unittest.TestCase):
+    """Module-scoped findings follow edits until they are recomputed."""
+
+    def setUp(self):
+        detector = make_detector({'DuplicatedCode': {'min_lines': 3, 'similarity_threshold': 0.8}})
+        self.analyzer = IncrementalAnalyzer(detector, 'dup.py')
+        self.analyzer.update(DUPLICATES)
+        self.analyzer.update_module_scope(DUPLICATES)
+        self.assertTrue(self.analyzer.module_smells)
+
+    def fresh_module_smells(self, text):
+        detector = make_detector({'DuplicatedCode': {'min_lines': 3, 'similarity_threshold': 0.8}})
+        analyzer = IncrementalAnalyzer(detector, 'dup.py')
+        analyzer.update(text)
+        analyzer.update_module_scope(text)
+        return analyzer.module_smells
+
+    def lines(self, smells):
+        return [(smell['line_start'], smell['line_end']) for smell in smells]
+
+    def test_lines_inserted_above_shift_findings(self):
+        edited = "import os\nimport sys\n\n" + DUPLICATES
+        self.analyzer.update(edited)
+        self.assertEqual(self.lines(self.analyzer.module_smells),
+                         self.lines(self.fresh_module_smells(edited)))
+
+    def test_findings_overlapping_an_edit_are_dropped(self):
+        edited = DUPLICATES.replace("    total = 0\n", "    total = 0\n    count = 0\n", 1)
+        self.analyzer.update(edited)
+        for line_start, line_end in self.lines(self.analyzer.module_smells):
+            self.assertFalse(line_start <= 2 <= line_end)
+
+    def test_module_lane_replaces_shifted_findings(self):
+        edited = "import os\n" + DUPLICATES
+        self.analyzer.update(edited)
+        self.analyzer.update_module_scope(edited)
+        self.analyzer.update(edited)
+        self.assertEqual(self.analyzer.module_smells, self.fresh_module_smells(edited))
+
+
+if __name__ == '__main__':
+    unittest.main()
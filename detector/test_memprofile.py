@@ -0,0 +1,82 @@
+"""
+Unit tests for the --memprofile allocation report.
+"""
+
+import unittest
+
+from main import CodeSmellDetector
+from memprofile import MemoryProfiler, format_memory_report
+
+
+def record_file(profiler, filepath, peak, ast_bytes=None):
+    """Record a file's measurements the way nested measure() calls do."""
+    if ast_bytes is not None:
+        profiler._record('parse', 'ast.parse', filepath, peak // 2, ast_bytes)
+    profiler._record('detector', 'LongMethod', filepath, peak // 4, 0)
+    profiler._record('file', filepath, None, peak, 512)
+
+
+GOLDEN = [
+    "MEMORY PROFILE",
+    "  Per detector (peak / mean peak / retained over all files):",
+    "    LongMethod: 4.0 KiB / 2.1 KiB / 0.0 KiB (4 calls, peak in big.py)",
+    "  Files with the highest peaks (peak / AST / retained):",
+    "    big.py: 16.0 KiB / 3.0 KiB / 0.5 KiB",
+    "    tie_first.py: 8.0 KiB / 0.0 KiB / 0.5 KiB",
+    "  Top allocation sites at end of run:",
+]
+
+
+class TestMemoryReport(unittest.TestCase):
+    """Only the files with the highest peaks are kept and reported."""
+
+    def make_profiler(self):
+        profiler = MemoryProfiler(top_files=2)
+        record_file(profiler, 'small.py', 1024, ast_bytes=256)
+        record_file(profiler, 'tie_first.py', 8192)
+        record_file(profiler, 'big.py', 16384, ast_bytes=3072)
+        record_file(profiler, 'tie_second.py', 8192)
+        return profiler
+
+    def test_report_matches_golden(self):
+        report = self.make_profiler().report()
+        self.assertEqual(report['top_sites'], [])
+        self.assertEqual(format_memory_report(report), GOLDEN)
+
+    def test_only_top_files_are_kept(self):
+        profiler = self.make_profiler()
+        self.assertEqual(len(profiler.files), 2)
+        self.assertEqual(profiler._parses, {})
+        files = profiler.report()['files']
+        self.assertEqual(files[0], {'parse_peak_bytes': 8192, 'ast_bytes': 3072,
+                                    'peak_bytes': 16384, 'retained_bytes': 512, 'file': 'big.py'})
+
+    def test_no_files_kept_when_top_files_is_zero(self):
+        profiler = MemoryProfiler(top_files=0)
+        record_file(profiler, 'a.py', 1024, ast_bytes=10)
+        self.assertEqual(profiler.report()['files'], [])
+        self.assertEqual(profiler.report()['detectors']['LongMethod']['calls'], 1)
+
+    def test_profiled_run_reports_files_and_detectors(self):
+        detector = CodeSmellDetector(config={'detectors': {}})
+        detector.initialize_detectors(only=['LongMethod', 'MagicNumbers'])
+        detector.memory = MemoryProfiler(top_files=3)
+        detector.memory.start()
+        try:
+            for index in range(5):
+                source = "def f():\n    return [%d] * 1000\n" % (index + 10)
+                detector.analyze_source(source * (index + 1), f"f{index}.py")
+        finally:
+            detector.memory.stop()
+        report = detector.memory.report()
+        self.assertEqual(set(report['detectors']), {'LongMethod', 'MagicNumbers'})
+        self.assertEqual(report['detectors']['MagicNumbers']['calls'], 5)
+        self.assertEqual(len(report['files']), 3)
+        peaks = [entry['peak_bytes'] for entry in report['files']]
+        self.assertEqual(peaks, sorted(peaks, reverse=True))
+        self.assertTrue(all(entry['ast_bytes'] > 0 for entry in report['files']))
+        self.assertTrue(report['top_sites'])
+
+
+if __name__ == '__main__':
+    unittest.main()
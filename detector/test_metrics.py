@@ -0,0 +1,136 @@
+"""
+Unit tests for scan statistics and their OpenMetrics exposition.
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from metrics import ScanStats, Histogram, new_file_timings, format_openmetrics, write_metrics_file
+
+
+def timings(**values):
+    file_timings = new_file_timings()
+    file_timings.update(values)
+    return file_timings
+
+
+def make_stats():
+    """A finished run of four files, with small buckets and exact binary times."""
+    stats = ScanStats()
+    stats.file_latency = Histogram((0.01, 0.1))
+    stats.parse_latency = Histogram((0.01, 0.1))
+    stats.detector_latency = {'LongMethod': Histogram((0.01, 0.1)),
+                              'Magic "N"': Histogram((0.01, 0.1))}
+    stats.record_file(timings(seconds=0.0078125, parse=0.001953125, bytes=120,
+                              detectors={'LongMethod': 0.0009765625, 'Magic "N"': 0.0625},
+                              findings={'LongMethod': 2}))
+    stats.record_file(timings(seconds=0.0625, parse=0.03125, bytes=80,
+                              detectors={'LongMethod': 0.015625}, findings={'LongMethod': 1},
+                              cache_hits=3, cache_misses=1))
+    stats.record_file(timings(seconds=0.5, skipped=True))
+    stats.record_file(timings(seconds=0.25, parse=0.25, parse_failed=True, error=True))
+    stats.wall_seconds = 1.5
+    stats.cpu_seconds = 1.25
+    return stats
+
+
+GOLDEN = r"""# TYPE smell_files_scanned counter
+# HELP smell_files_scanned Files handed to the detector.
+smell_files_scanned_total 4
+# TYPE smell_files_skipped counter
+# HELP smell_files_skipped Files skipped by the prefilter without parsing.
+smell_files_skipped_total 1
+# TYPE smell_parsed_bytes counter
+# HELP smell_parsed_bytes Bytes of source code parsed.
+smell_parsed_bytes_total 200
+# TYPE smell_parse_failures counter
+# HELP smell_parse_failures Files that failed to parse.
+smell_parse_failures_total 1
+# TYPE smell_errors counter
+# HELP smell_errors Files that could not be analyzed, including parse failures.
+smell_errors_total 1
+# TYPE smell_findings counter
+# HELP smell_findings Smells reported, by detector.
+smell_findings_total{detector="LongMethod"} 3
+smell_findings_total{detector="Magic \"N\""} 0
+smell_findings_total{detector="GodClass"} 0
+# TYPE smell_file_duration_seconds histogram
+# HELP smell_file_duration_seconds Time to analyze one file.
+smell_file_duration_seconds_bucket{le="0.01"} 1
+smell_file_duration_seconds_bucket{le="0.1"} 2
+smell_file_duration_seconds_bucket{le="+Inf"} 4
+smell_file_duration_seconds_count 4
+smell_file_duration_seconds_sum 0.8203125
+# TYPE smell_parse_duration_seconds histogram
+# HELP smell_parse_duration_seconds Time spent in ast.parse per file.
+smell_parse_duration_seconds_bucket{le="0.01"} 1
+smell_parse_duration_seconds_bucket{le="0.1"} 2
+smell_parse_duration_seconds_bucket{le="+Inf"} 3
+smell_parse_duration_seconds_count 3
+smell_parse_duration_seconds_sum 0.283203125
+# TYPE smell_detector_duration_seconds histogram
+# HELP smell_detector_duration_seconds Time spent in detect() per file, by detector.
+smell_detector_duration_seconds_bucket{detector="LongMethod",le="0.01"} 1
+smell_detector_duration_seconds_bucket{detector="LongMethod",le="0.1"} 2
+smell_detector_duration_seconds_bucket{detector="LongMethod",le="+Inf"} 2
+smell_detector_duration_seconds_count{detector="LongMethod"} 2
+smell_detector_duration_seconds_sum{detector="LongMethod"} 0.0166015625
+smell_detector_duration_seconds_bucket{detector="Magic \"N\"",le="0.01"} 0
+smell_detector_duration_seconds_bucket{detector="Magic \"N\"",le="0.1"} 1
+smell_detector_duration_seconds_bucket{detector="Magic \"N\"",le="+Inf"} 1
+smell_detector_duration_seconds_count{detector="Magic \"N\""} 1
+smell_detector_duration_seconds_sum{detector="Magic \"N\""} 0.0625
+# TYPE smell_cache_hits counter
+# HELP smell_cache_hits Cache lookups that found a stored result.
+smell_cache_hits_total 3
+# TYPE smell_cache_misses counter
+# HELP smell_cache_misses Cache lookups that had to analyze.
+smell_cache_misses_total 1
+# TYPE smell_cache_hit_ratio gauge
+# HELP smell_cache_hit_ratio Share of cache lookups that hit.
+smell_cache_hit_ratio 0.75
+# TYPE smell_scan_wall_seconds gauge
+# HELP smell_scan_wall_seconds Wall-clock duration of the run.
+smell_scan_wall_seconds 1.5
+# TYPE smell_scan_cpu_seconds gauge
+# HELP smell_scan_cpu_seconds CPU time of the run, including worker processes.
+smell_scan_cpu_seconds 1.25
+# TYPE smell_scan_timestamp_seconds gauge
+# HELP smell_scan_timestamp_seconds Unix time the run finished.
+smell_scan_timestamp_seconds 1700000000.0
+# EOF
+"""
+
+
+class TestOpenMetrics(unittest.TestCase):
+    """The exposition matches a reviewed golden copy, byte for byte."""
+
+    DETECTORS = ['LongMethod', 'Magic "N"', 'GodClass']
+
+    maxDiff = None
+
+    def test_exposition_matches_golden(self):
+        with mock.patch('metrics.time.time', return_value=1700000000.0):
+            self.assertEqual(format_openmetrics(make_stats(), self.DETECTORS), GOLDEN)
+
+    def test_no_cache_lookups_means_no_hit_ratio(self):
+        text = format_openmetrics(ScanStats(), [])
+        self.assertNotIn('smell_cache_hit_ratio', text)
+        self.assertTrue(text.endswith('# EOF\n'))
+
+    def test_metrics_file_is_replaced_whole(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'smells.prom')
+            with open(path, 'w') as f:
+                f.write('stale')
+            with mock.patch('metrics.time.time', return_value=1700000000.0):
+                write_metrics_file(make_stats(), self.DETECTORS, path)
+            with open(path) as f:
+                self.assertEqual(f.read(), GOLDEN)
+            self.assertEqual(os.listdir(tmp), ['smells.prom'])
+
+
+if __name__ == '__main__':
+    unittest.main()
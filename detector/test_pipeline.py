@@ -0,0 +1,57 @@
+"""
+Unit tests for the prefetching file pipeline.
+"""
+
+import time
+import unittest
+
+from pipeline import PrefetchPipeline
+
+
+class TestPrefetchPipeline(unittest.TestCase):
+    """Files come out in discovery order, and stalls are measured honestly."""
+
+    def run_pipeline(self, files, load, io_threads=2, wait=0):
+        pipeline = PrefetchPipeline(files, load, io_threads=io_threads)
+        try:
+            time.sleep(wait)
+            loaded = list(pipeline)
+        finally:
+            pipeline.close()
+        return loaded, pipeline.report()
+
+    def test_discovery_order(self):
+        def load(name):
+            time.sleep(0.02 if name == 'a' else 0)
+            return name.upper()
+
+        loaded, stats = self.run_pipeline(['a', 'b', 'c'], load)
+        self.assertEqual(loaded, [('a', 'A'), ('b', 'B'), ('c', 'C')])
+        self.assertEqual(stats['files'], 3)
+
+    def test_loaded_files_are_not_stalls(self):
+        """Files already waiting in the queue add no stall time."""
+        loaded, stats = self.run_pipeline(['a', 'b', 'c'], str.upper, io_threads=1, wait=0.2)
+        self.assertEqual(len(loaded), 3)
+        self.assertEqual(stats['analysis_stalls'], 0)
+        self.assertEqual(stats['analysis_stall_seconds'], 0.0)
+
+    def test_slow_reads_are_stalls(self):
+        def load(name):
+            time.sleep(0.05)
+            return name
+
+        _, stats = self.run_pipeline(['a', 'b'], load, io_threads=1)
+        self.assertGreaterEqual(stats['analysis_stalls'], 1)
+        self.assertGreater(stats['analysis_stall_seconds'], 0.04)
+
+    def test_load_errors_reach_the_caller(self):
+        def load(name):
+            raise OSError(f"can't read {name}")
+
+        with self.assertRaisesRegex(OSError, "can't read a"):
+            self.run_pipeline(['a'], load)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+"""
+Unit tests for the detector registry: plugin discovery, overrides and errors.
+"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+from main import CodeSmellDetector
+from detectors import registry
+from detectors.registry import DetectorRegistry
+
+
+PLUGIN_MODULE = '''
+from detectors.base_detector import BaseDetector
+
+
+class TodoDetector(BaseDetector):
+    def get_name(self):
+        return "Todo"
+
+    def detect(self, ast_tree, source_code, filename):
+        return [self.format_smell(filename, number, number, "TODO left in code", 'low')
+                for number, line in enumerate(source_code.split('\\n'), 1) if 'TODO' in line]
+'''
+
+
+def entry_point(name, value):
+    return types.SimpleNamespace(name=name, value=value, dist=None)
+
+
+class RegistryTestCase(unittest.TestCase):
+    """Installs a fake 'acme_todo' plugin package and entry points."""
+
+    ENTRY_POINTS = [entry_point('Todo', 'acme_todo:TodoDetector'),
+                    entry_point('LongMethod', 'acme_todo:TodoDetector')]
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.tmp.name, 'acme_todo.py'), 'w') as f:
+            f.write(PLUGIN_MODULE)
+        sys.path.insert(0, self.tmp.name)
+        self.scans = 0
+
+        def iter_entry_points():
+            self.scans += 1
+            return list(self.ENTRY_POINTS)
+
+        patcher = mock.patch.object(registry, '_iter_entry_points', iter_entry_points)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, registry, '_installed', None)
+        registry._installed = None
+
+    def tearDown(self):
+        sys.path.remove(self.tmp.name)
+        sys.modules.pop('acme_todo', None)
+        self.tmp.cleanup()
+
+    def make_detector(self, detectors=None, plugins=None, only=None):
+        config = {'detectors': detectors or {'LongMethod': {'enabled': True}}}
+        if plugins is not None:
+            config['plugins'] = plugins
+        detector = CodeSmellDetector(config=config)
+        detector.initialize_detectors(only=only)
+        return detector
+
+
+class TestDiscovery(RegistryTestCase):
+    """Entry points are read lazily, once per process."""
+
+    def test_builtin_run_does_not_read_entry_points(self):
+        detector = self.make_detector()
+        self.assertEqual(detector.active_detectors[0], 'LongMethod')
+        self.assertEqual(self.scans, 0)
+
+    def test_enabled_plugin_is_discovered_once(self):
+        for _ in range(3):
+            detector = self.make_detector({'Todo': {'enabled': True}})
+            self.assertIn('Todo', detector.active_detectors)
+        self.assertEqual(self.scans, 1)
+        result = detector.analyze_source("x = 1  # TODO\n", 'todo.py')
+        self.assertEqual([smell['smell_type'] for smell in result['smells']], ['Todo'])
+
+    def test_installed_plugins_are_disabled_by_default(self):
+        detector = CodeSmellDetector(config={'detectors': {}})
+        self.assertIn('Todo', list(detector.registry))
+        self.assertFalse(detector.registry.spec('Todo').enabled_by_default)
+        detector.initialize_detectors()
+        self.assertNotIn('Todo', detector.active_detectors)
+
+    def test_shared_registry_is_not_changed(self):
+        before = CodeSmellDetector.DETECTOR_CLASSES.known()
+        self.make_detector({'Todo': {'enabled': True}},
+                           plugins={'Extra': {'class': 'acme_todo:TodoDetector'}})
+        self.assertEqual(CodeSmellDetector.DETECTOR_CLASSES.known(), before)
+        self.assertNotIn('Extra', CodeSmellDetector.DETECTOR_CLASSES.known())
+
+
+class TestOverrides(RegistryTestCase):
+    """Built-ins shadow installed plugins; config plugins shadow both."""
+
+    def test_builtin_wins_over_entry_point(self):
+        spec = DetectorRegistry().spec('LongMethod')
+        self.assertEqual(spec.source, 'builtin')
+
+    def test_config_plugin_wins_over_builtin(self):
+        detector = self.make_detector(
+            plugins={'LongMethod': {'class': 'acme_todo:TodoDetector', 'version': '2.0'}},
+            only=['LongMethod'])
+        spec = detector.registry.spec('LongMethod')
+        self.assertEqual((spec.source, spec.version), ('config', '2.0'))
+        self.assertEqual(type(detector.detectors['LongMethod']).__name__, 'TodoDetector')
+
+    def test_metadata_only_entry_describes_installed_plugin(self):
+        plugins = {'Todo': {'node_types': ['Constant'], 'version': '1.2'}}
+        spec = DetectorRegistry().with_plugins(plugins).spec('Todo')
+        self.assertEqual((spec.source, spec.node_types, spec.version),
+                         ('entry point', ('Constant',), '1.2'))
+        self.assertEqual(registry.installed_detectors()[0].node_types, ())
+
+
+class TestErrors(RegistryTestCase):
+    """Unknown and broken plugins are reported, not ignored."""
+
+    def test_unknown_only_name_is_an_error(self):
+        with self.assertRaisesRegex(ValueError, "Unknown detector 'Nope'"):
+            self.make_detector(only=['LongMethod', 'Nope'])
+
+    def test_unknown_name_is_a_key_error(self):
+        with self.assertRaises(KeyError):
+            DetectorRegistry().spec('Nope')
+        self.assertNotIn('Nope', DetectorRegistry())
+
+    def test_plugin_that_does_not_import_is_skipped_with_warning(self):
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            detector = self.make_detector(plugins={'Broken': {'class': 'no_such_module:Detector'}})
+        self.assertNotIn('Broken', detector.active_detectors)
+        self.assertIn("Could not load detector 'Broken'", stderr.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
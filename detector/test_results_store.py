@@ -0,0 +1,76 @@
+"""
+Unit tests for matching findings across runs in the results store.
+"""
+
+import os
+import tempfile
+import unittest
+
+from main import CodeSmellDetector
+from results_store import ResultsStore, finding_keys
+
+
+def make_detector(detectors):
+    """Detector with only the given detector configurations enabled."""
+    config = {'detectors': {name: dict(values, enabled=True) for name, values in detectors.items()}}
+    detector = CodeSmellDetector(config=config)
+    detector.initialize_detectors()
+    return detector
+
+
+BEFORE = """def area(radius):
+    return radius * radius * 3.14
+"""
+
+AFTER = """def area(radius):
+    return radius * radius * 3.14
+
+
+def volume(radius):
+    return area(radius) * radius * 4
+"""
+
+
+class TestDiff(unittest.TestCase):
+    """diff() reports every added or removed finding, even alike ones."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = ResultsStore(os.path.join(self.tmp.name, 'results.db'))
+        self.detector = make_detector({'MagicNumbers': {}})
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def add_run(self, source):
+        result = self.detector.analyze_source(source, 'shapes.py')
+        return self.store.add_run([result], 'shapes.py', ['MagicNumbers'], 'config')
+
+    def test_second_magic_number_is_new(self):
+        old_run = self.add_run(BEFORE)
+        new_run = self.add_run(AFTER)
+        diff = self.store.diff(old_run, new_run)
+        self.assertEqual([(f['file'], f['line_start']) for f in diff['new']], [('shapes.py', 6)])
+        self.assertEqual(diff['resolved'], [])
+        self.assertEqual(diff['worse'], [{'file': 'shapes.py', 'before': 1, 'after': 2}])
+
+        diff = self.store.diff(new_run, old_run)
+        self.assertEqual([f['line_start'] for f in diff['resolved']], [6])
+        self.assertEqual(diff['new'], [])
+
+    def test_unchanged_file_has_no_changes(self):
+        old_run = self.add_run(AFTER)
+        new_run = self.add_run("\n\n" + AFTER)
+        diff = self.store.diff(old_run, new_run)
+        self.assertEqual((diff['new'], diff['resolved']), ([], []))
+
+    def test_alike_findings_get_distinct_keys(self):
+        smells = self.detector.analyze_source(AFTER, 'shapes.py')['smells']
+        keys = finding_keys('shapes.py', smells)
+        self.assertEqual(len(set(keys)), 2)
+        self.assertEqual(finding_keys('shapes.py', list(reversed(smells))), list(reversed(keys)))
+
+
+if __name__ == '__main__':
+    unittest.main()
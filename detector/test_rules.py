@@ -0,0 +1,199 @@
+"""
+Unit tests for the declarative rule engine (detectors/rules.py).
+"""
+
+import ast
+import contextlib
+import io
+import unittest
+from unittest import mock
+
+from detectors.rules import RuleEngineDetector
+from detectors.long_method import LongMethodDetector
+from detectors.god_class import GodClassDetector
+
+
+def make_rules(*rules):
+    return RuleEngineDetector({'rules': list(rules)})
+
+
+def rule_lines(detector, source, rule_id=None):
+    """(rule, line_start) of every finding, optionally for one rule."""
+    smells = detector.detect(ast.parse(source), source, 'sample.py')
+    return [(smell['rule'], smell['line_start']) for smell in smells
+            if rule_id is None or smell['rule'] == rule_id]
+
+
+LOOPS = """import os
+import requests
+
+def fetch(urls):
+    for url in urls:
+        requests.get(url)
+        os.system('true')
+    while urls:
+        open(urls.pop())
+    return open('done')
+"""
+
+
+class TestDispatch(unittest.TestCase):
+    """Rules are grouped by node type, and a file is walked once."""
+
+    def test_rules_are_keyed_by_node_type_and_called_name(self):
+        detector = make_rules(
+            {'id': 'loops', 'node': ['For', 'While']},
+            {'id': 'returns', 'node': 'Return'},
+            {'id': 'get', 'node': 'Call', 'where': {'func_name': ['requests.get', 'get']}},
+            {'id': 'open', 'node': 'Call', 'where': {'func_name': 'open'}})
+        self.assertEqual({t.__name__: [r.id for r in rules] for t, rules in detector.dispatch.items()},
+                         {'For': ['loops'], 'While': ['loops'], 'Return': ['returns']})
+        by_name = detector.call_dispatch[ast.Call]
+        self.assertEqual({name: [r.id for r in rules] for name, rules in by_name.items()},
+                         {'get': ['get'], 'open': ['open']})
+
+    def test_call_checks_only_rules_naming_its_function(self):
+        detector = make_rules(
+            {'id': 'open', 'node': 'Call', 'where': {'func_name': 'open'}},
+            {'id': 'system', 'node': 'Call', 'where': {'func_name': 'os.system'}})
+        checked = []
+        original = type(detector.rules[0]).matches
+
+        def matches(rule, node, ancestors):
+            checked.append((rule.id, ast.unparse(node.func)))
+            return original(rule, node, ancestors)
+
+        with mock.patch.object(type(detector.rules[0]), 'matches', matches):
+            rule_lines(detector, LOOPS)
+        self.assertEqual(sorted(checked), [('open', 'open'), ('open', 'open'),
+                                           ('system', 'os.system')])
+
+    def test_many_rules_cost_one_walk(self):
+        rules = [{'id': f'rule-{n}', 'node': ['Call', 'Name', 'For'],
+                  'where': {'inside': 'FunctionDef'}} for n in range(50)]
+        detector = make_rules(*rules)
+        tree = ast.parse(LOOPS)
+        with mock.patch('ast.iter_child_nodes', wraps=ast.iter_child_nodes) as children:
+            smells = detector.detect(tree, LOOPS, 'sample.py')
+        self.assertEqual(children.call_count, len(list(ast.walk(tree))))
+        self.assertEqual(len(smells) % 50, 0)
+        self.assertTrue(smells)
+
+
+class TestPredicates(unittest.TestCase):
+    """Each 'where' predicate filters matches as documented."""
+
+    def test_func_name_matches_dotted_name_or_last_component(self):
+        detector = make_rules({'id': 'get', 'node': 'Call',
+                               'where': {'func_name': 'get'}},
+                              {'id': 'system', 'node': 'Call',
+                               'where': {'func_name': 'os.system'}})
+        self.assertEqual(rule_lines(detector, LOOPS), [('get', 6), ('system', 7)])
+
+    def test_inside_and_not_inside(self):
+        detector = make_rules(
+            {'id': 'in-loop', 'node': 'Call',
+             'where': {'func_name': 'open', 'inside': ['For', 'While']}},
+            {'id': 'outside', 'node': 'Call',
+             'where': {'func_name': 'open', 'not_inside': ['For', 'While']}})
+        self.assertEqual(rule_lines(detector, LOOPS), [('in-loop', 9), ('outside', 10)])
+
+    def test_name_and_min_lines(self):
+        source = "def get_a():\n    return 1\n\ndef get_b():\n    x = 1\n    return x\n\ndef put():\n    pass\n"
+        detector = make_rules({'id': 'getter', 'node': 'FunctionDef',
+                               'where': {'name': '^get_', 'min_lines': 3}})
+        self.assertEqual(rule_lines(detector, source), [('getter', 4)])
+
+    def test_count_bounds(self):
+        source = "def one(x):\n    return x\n\ndef two(x):\n    if x:\n        return 1\n    return 2\n"
+        detector = make_rules(
+            {'id': 'at-least-two', 'node': 'FunctionDef', 'where': {'count': {'node': 'Return', 'min': 2}}},
+            {'id': 'at-most-one', 'node': 'FunctionDef',
+             'where': {'count': {'node': 'Return', 'min': 0, 'max': 1}}})
+        self.assertEqual(rule_lines(detector, source), [('at-most-one', 1), ('at-least-two', 4)])
+        smell = detector.detect(ast.parse(source), source, 'sample.py')[1]
+        self.assertEqual(smell['description'], '[at-least-two] at-least-two')
+
+    def test_count_skips_nested_scopes(self):
+        source = ("def outer():\n"
+                  "    def inner():\n        return 1\n"
+                  "    helper = lambda: 2\n"
+                  "    class Local:\n        def method(self):\n            return 3\n"
+                  "    return inner\n")
+        detector = make_rules({'id': 'returns', 'node': 'FunctionDef',
+                               'where': {'count': {'node': 'Return', 'min': 1}},
+                               'message': '{name}: {count}'})
+        smells = detector.detect(ast.parse(source), source, 'sample.py')
+        self.assertEqual([smell['description'] for smell in smells],
+                         ['[returns] outer: 1', '[returns] inner: 1', '[returns] method: 1'])
+
+    def test_invalid_rules_are_skipped_with_warning(self):
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            detector = make_rules({'id': 'bad-node', 'node': 'Nope'},
+                                  {'id': 'bad-where', 'node': 'Call', 'where': {'colour': 'red'}},
+                                  {'id': 'ok', 'node': 'Return'})
+        self.assertEqual([rule.id for rule in detector.rules], ['ok'])
+        self.assertIn("unknown node type 'Nope'", stderr.getvalue())
+        self.assertIn("unknown predicate 'colour'", stderr.getvalue())
+
+
+CLASSES = """class Small:
+    def a(self):
+        return 1
+
+class Wide:
+    def a(self):
+        pass
+    def b(self):
+        def nested():
+            pass
+        return nested
+    async def c(self):
+        pass
+
+def long_function(items):
+    total = 0
+    for item in items:
+        total += item
+    if total:
+        total -= 1
+    return total
+
+async def long_coroutine(items):
+    for item in items:
+        await item
+    for item in items:
+        await item
+    return None
+"""
+
+
+class TestConvertedDetectors(unittest.TestCase):
+    """Built-in detectors written as rules report the same findings."""
+
+    def lines(self, smells):
+        return sorted((smell['line_start'], smell['line_end']) for smell in smells)
+
+    def test_long_method_as_rule(self):
+        tree = ast.parse(CLASSES)
+        for threshold in (2, 5, 6):
+            builtin = LongMethodDetector({'threshold': threshold}).detect(tree, CLASSES, 'c.py')
+            rules = make_rules({'id': 'long-method', 'node': ['FunctionDef', 'AsyncFunctionDef'],
+                                'where': {'min_lines': threshold + 1}}).detect(tree, CLASSES, 'c.py')
+            self.assertTrue(builtin)
+            self.assertEqual(self.lines(rules), self.lines(builtin), threshold)
+
+    def test_god_class_method_count_as_rule(self):
+        tree = ast.parse(CLASSES)
+        builtin = GodClassDetector({'method_threshold': 3, 'line_threshold': 1000})
+        rules = make_rules({'id': 'god-class', 'node': 'ClassDef',
+                            'where': {'count': {'node': ['FunctionDef', 'AsyncFunctionDef'],
+                                                'min': 3}}})
+        found = builtin.detect(tree, CLASSES, 'c.py')
+        self.assertEqual(self.lines(found), [(5, 13)])
+        self.assertEqual(self.lines(rules.detect(tree, CLASSES, 'c.py')), self.lines(found))
+
+
+if __name__ == '__main__':
+    unittest.main()
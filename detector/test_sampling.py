@@ -0,0 +1,165 @@
+"""
+Unit tests for stratified file sampling and smell-density estimates.
+"""
+
+import os
+import random
+import unittest
+from unittest import mock
+
+from sampling import draw_sample, stratify, allocate, estimate
+
+
+def synthetic_corpus(seed=3):
+    """
+    A tree of 1200 fake files with sizes, line counts and smell counts.
+
+    Smell counts grow with file size and are noisier in large files, like
+    real trees.
+
+    Returns:
+        Tuple (sizes, line counts, smell counts), each keyed by path
+    """
+    rng = random.Random(seed)
+    sizes, lines, smells = {}, {}, {}
+    for directory in ('core', 'tests', 'tools'):
+        for number in range(400):
+            path = os.path.join('/repo', directory, f"module{number}.py")
+            size = int(rng.lognormvariate(8.5, 1.2))
+            sizes[path] = size
+            lines[path] = max(size // 30, 1)
+            mean = size / 4000 * (2 if directory == 'core' else 1)
+            smells[path] = sum(1 for _ in range(int(mean * 4) + 1) if rng.random() < 0.25)
+    return sizes, lines, smells
+
+
+def sample_corpus(sizes, fraction, seed):
+    with mock.patch('sampling.os.path.getsize', sizes.__getitem__):
+        return draw_sample(sorted(sizes), fraction=fraction, seed=seed)
+
+
+def results_for(files, smells, errors=()):
+    results = []
+    for path in files:
+        if path in errors:
+            results.append({'file': path, 'error': 'Syntax error', 'smells': []})
+        else:
+            results.append({'file': path, 'smells': [{'smell_type': 'LongMethod'}] * smells[path]})
+    return results
+
+
+class TestDrawSample(unittest.TestCase):
+    """Samples depend only on the files, their sizes and the seed."""
+
+    def setUp(self):
+        self.sizes = synthetic_corpus()[0]
+
+    def test_same_seed_gives_same_sample(self):
+        files, plan = sample_corpus(self.sizes, 0.1, seed=7)
+        again, again_plan = sample_corpus(self.sizes, 0.1, seed=7)
+        self.assertEqual(files, again)
+        self.assertEqual(plan, again_plan)
+        self.assertEqual(len(files), 120)
+        self.assertEqual(files, sorted(files))
+
+    def test_other_seed_gives_other_sample(self):
+        files, _ = sample_corpus(self.sizes, 0.1, seed=7)
+        other, _ = sample_corpus(self.sizes, 0.1, seed=8)
+        self.assertNotEqual(files, other)
+        self.assertEqual(len(other), len(files))
+
+    def test_file_count_is_capped_at_population(self):
+        with mock.patch('sampling.os.path.getsize', return_value=100):
+            files, _ = draw_sample(['a.py', 'b.py'], file_count=5)
+        self.assertEqual(files, ['a.py', 'b.py'])
+
+
+class TestAllocation(unittest.TestCase):
+    """Strata of larger files get more of the sample."""
+
+    def test_allocation_favours_large_files(self):
+        strata = {('small', 0): [f"s{n}" for n in range(100)],
+                  ('large', 4): [f"l{n}" for n in range(100)],
+                  ('tiny', 0): ['t0', 't1']}
+        sizes = {f: 1000 for f in strata[('small', 0)] + strata[('tiny', 0)]}
+        sizes.update({f: 100000 for f in strata[('large', 4)]})
+        counts = allocate(strata, sizes, 40)
+        self.assertEqual(sum(counts.values()), 40)
+        self.assertEqual(counts[('tiny', 0)], 1)
+        # Neyman weights: 100 * sqrt(100000) against 100 * sqrt(1000)
+        self.assertEqual((counts[('large', 4)], counts[('small', 0)]), (35, 4))
+
+    def test_no_stratum_gets_more_files_than_it_has(self):
+        strata = {'a': ['a0', 'a1'], 'b': [f"b{n}" for n in range(10)]}
+        sizes = {'a0': 10 ** 6, 'a1': 10 ** 6}
+        sizes.update({f"b{n}": 10 for n in range(10)})
+        counts = allocate(strata, sizes, 8)
+        self.assertEqual(counts, {'a': 2, 'b': 6})
+
+    def test_strata_are_merged_when_the_sample_is_small(self):
+        sizes = synthetic_corpus()[0]
+        by_directory = stratify(sorted(sizes), sizes, 100)
+        self.assertEqual({key[0] for key in by_directory}, {'core', 'tests', 'tools'})
+        by_size = stratify(sorted(sizes), sizes, 10)
+        self.assertEqual({key[0] for key in by_size}, {'*'})
+        self.assertEqual(stratify(sorted(sizes), sizes, 2), {('*', '*'): sorted(sizes)})
+
+
+class TestEstimate(unittest.TestCase):
+    """Intervals cover the true totals, and failed files are left out."""
+
+    def setUp(self):
+        self.sizes, self.lines, self.smells = synthetic_corpus()
+
+    def test_intervals_cover_true_totals(self):
+        true_total = sum(self.smells.values())
+        true_rate = true_total / (sum(self.lines.values()) / 1000)
+        covered = rate_covered = 0
+        runs = 200
+        for seed in range(runs):
+            files, plan = sample_corpus(self.sizes, 0.1, seed)
+            stats = estimate(plan, results_for(files, self.smells), ['LongMethod'], self.lines)
+            values = stats['detectors']['LongMethod']
+            low, high = values['total_ci95']
+            covered += low <= true_total <= high
+            rate_low, rate_high = values['per_kloc_ci95']
+            rate_covered += rate_low <= true_rate <= rate_high
+        # 95% intervals; 200 runs put the observed share within about 3 points
+        self.assertGreaterEqual(covered / runs, 0.89)
+        self.assertGreaterEqual(rate_covered / runs, 0.89)
+        self.assertLessEqual(covered / runs, 0.99)
+
+    def test_full_sample_is_exact(self):
+        files, plan = sample_corpus(self.sizes, 1.0, seed=0)
+        stats = estimate(plan, results_for(files, self.smells), ['LongMethod'], self.lines)
+        values = stats['detectors']['LongMethod']
+        self.assertAlmostEqual(values['estimated_total'], sum(self.smells.values()))
+        self.assertAlmostEqual(values['total_ci95'][1] - values['total_ci95'][0], 0.0)
+
+    def test_failed_files_are_left_out(self):
+        files, plan = sample_corpus(self.sizes, 0.1, seed=1)
+        failed = {files[0], files[5]}
+        stats = estimate(plan, results_for(files, self.smells, failed), ['LongMethod'],
+                         {f: self.lines[f] for f in files if f not in failed})
+
+        without = {stratum: {'population': entry['population'],
+                             'sample': [f for f in entry['sample'] if f not in failed]}
+                   for stratum, entry in plan.items()}
+        expected = estimate(without, results_for(files, self.smells), ['LongMethod'], self.lines)
+        self.assertEqual(stats['failed_files'], 2)
+        self.assertEqual(stats['sampled_files'], len(files))
+        self.assertEqual(stats['detectors'], expected['detectors'])
+        self.assertEqual(stats['estimated_kloc'], expected['estimated_kloc'])
+
+    def test_strata_without_analyzed_files_are_not_estimated(self):
+        plan = {'ok': {'population': ['a', 'b', 'c', 'd'], 'sample': ['a', 'b']},
+                'broken': {'population': ['x', 'y', 'z'], 'sample': ['x']}}
+        results = results_for(['a', 'b', 'x'], {'a': 1, 'b': 3}, errors={'x'})
+        stats = estimate(plan, results, ['LongMethod'], {'a': 500, 'b': 1500})
+        self.assertEqual((stats['failed_files'], stats['unestimated_files']), (1, 3))
+        self.assertEqual(stats['detectors']['LongMethod']['estimated_total'], 8.0)
+        self.assertEqual(stats['estimated_kloc'], 4.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
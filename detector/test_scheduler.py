@@ -0,0 +1,141 @@
+"""
+Unit tests for the cost model and longest-first ordering of --jobs scans.
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+from main import CodeSmellDetector
+from scheduler import CostModel, lpt_order
+
+
+def write_file(directory, name, size):
+    path = os.path.join(directory, name)
+    with open(path, 'w') as f:
+        f.write('#' * (size - 1) + '\n')
+    return path
+
+
+class SchedulerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.history_path = os.path.join(self.tmp.name, 'history.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+
+class TestLptOrder(SchedulerTestCase):
+    """The files predicted to take longest are handed out first."""
+
+    def test_without_history_largest_files_come_first(self):
+        small = write_file(self.tmp.name, 'a.py', 10)
+        large = write_file(self.tmp.name, 'b.py', 5000)
+        medium = write_file(self.tmp.name, 'c.py', 300)
+        ordered, predictions = lpt_order([small, large, medium], CostModel(self.history_path))
+        self.assertEqual(ordered, [large, medium, small])
+        self.assertEqual(predictions[large][0], 5000)
+        self.assertAlmostEqual(predictions[large][1], 5000 * CostModel.DEFAULT_SECONDS_PER_BYTE)
+
+    def test_ties_are_ordered_by_path(self):
+        paths = [write_file(self.tmp.name, name, 100) for name in ('c.py', 'a.py', 'b.py')]
+        ordered, _ = lpt_order(paths, CostModel(self.history_path))
+        self.assertEqual(ordered, sorted(paths))
+
+    def test_missing_file_is_predicted_as_empty(self):
+        missing = os.path.join(self.tmp.name, 'gone.py')
+        present = write_file(self.tmp.name, 'here.py', 100)
+        ordered, predictions = lpt_order([missing, present], CostModel(self.history_path))
+        self.assertEqual(ordered, [present, missing])
+        self.assertEqual(predictions[missing], (0, 0.0))
+
+
+class TestCostModel(SchedulerTestCase):
+    """Predictions come from measured timings once there are some."""
+
+    def test_slow_small_file_is_scheduled_first_after_it_was_measured(self):
+        slow = write_file(self.tmp.name, 'slow.py', 100)
+        large = write_file(self.tmp.name, 'large.py', 10000)
+        model = CostModel(self.history_path)
+        model.record(slow, 100, 2.0)
+        model.record(large, 10000, 0.5)
+        ordered, predictions = lpt_order([large, slow], model)
+        self.assertEqual(ordered, [slow, large])
+        self.assertEqual(predictions[slow], (100, 2.0))
+
+    def test_prediction_scales_with_size_and_average_rate(self):
+        model = CostModel(self.history_path)
+        model.record('seen.py', 1000, 0.1)
+        model.record('other.py', 3000, 0.1)
+        self.assertAlmostEqual(model.predict('seen.py', 2000), 0.2)
+        self.assertAlmostEqual(model.seconds_per_byte(), 0.2 / 4000)
+        self.assertAlmostEqual(model.predict('new.py', 4000), 0.2)
+
+    def test_history_survives_a_save(self):
+        model = CostModel(self.history_path)
+        model.record('a.py', 10, 0.5)
+        model.save()
+        self.assertEqual(CostModel(self.history_path).predict('a.py', 20), 1.0)
+
+    def test_save_keeps_most_recently_recorded_entries(self):
+        model = CostModel(self.history_path)
+        model.MAX_ENTRIES = 2
+        for name in ('a.py', 'b.py', 'c.py'):
+            model.record(name, 10, 0.1)
+        model.record('a.py', 10, 0.3)
+        model.save()
+        with open(self.history_path) as f:
+            self.assertEqual(list(json.load(f)['files']), ['c.py', 'a.py'])
+
+    def test_unreadable_history_starts_empty(self):
+        with open(self.history_path, 'w') as f:
+            f.write('not json')
+        model = CostModel(self.history_path)
+        self.assertEqual(model.history, {})
+        self.assertEqual(model.seconds_per_byte(), CostModel.DEFAULT_SECONDS_PER_BYTE)
+
+
+SOURCES = {
+    'tiny.py': "VALUE = 42\n",
+    'params.py': "def build(a, b, c, d, e, f):\n    return a + b * 7\n",
+    'long.py': "def long():\n" + "".join(f"    x{n} = {n}\n" for n in range(40)) + "    return x1\n",
+}
+
+
+class TestScheduledScan(SchedulerTestCase):
+    """Scheduling changes the order work is done in, never the findings."""
+
+    def make_detector(self, jobs):
+        config = {'detectors': {name: {'enabled': True}
+                                for name in ('LongMethod', 'LargeParameterList', 'MagicNumbers')}}
+        detector = CodeSmellDetector(config=config, jobs=jobs, history_path=self.history_path)
+        detector.initialize_detectors()
+        return detector
+
+    def test_findings_match_serial_run_and_timings_are_recorded(self):
+        source_dir = os.path.join(self.tmp.name, 'src')
+        os.mkdir(source_dir)
+        for name, source in SOURCES.items():
+            with open(os.path.join(source_dir, name), 'w') as f:
+                f.write(source)
+
+        serial = self.make_detector(1).analyze_paths([source_dir])
+        scheduled_detector = self.make_detector(2)
+        scheduled = scheduled_detector.analyze_paths([source_dir])
+        self.assertEqual(scheduled, serial)
+        self.assertTrue(all(result['smells'] for result in serial))
+
+        stats = scheduled_detector.schedule_stats
+        self.assertEqual(stats['workers'], 2)
+        self.assertEqual(sorted(entry['file'] for entry in stats['files']),
+                         sorted(result['file'] for result in serial))
+        history = CostModel(self.history_path).history
+        self.assertEqual(set(history), {result['file'] for result in serial})
+        self.assertTrue(all(entry['seconds'] > 0 for entry in history.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+"""
+Unit tests for shard assignment and merging of shard reports.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from sharding import parse_shard_spec, assign_shards, select_shard, merge_reports
+
+
+DETECTOR_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestShardAssignment(unittest.TestCase):
+    """Every file lands in exactly one shard, the same way on every node."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.files = []
+        for index in range(7):
+            path = os.path.join(self.tmp.name, f'mod{index}.py')
+            with open(path, 'w') as f:
+                f.write('x = 1\n' * (index * 10 + 1))
+            self.files.append(path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_parse_shard_spec(self):
+        self.assertEqual(parse_shard_spec('2/4'), (2, 4))
+        for spec in ('0/4', '5/4', '1/0', 'x/4', '2'):
+            with self.assertRaises(ValueError):
+                parse_shard_spec(spec)
+
+    def test_shards_partition_the_files(self):
+        shards = assign_shards(self.files, 3)
+        self.assertEqual(sorted(f for shard in shards for f in shard), sorted(self.files))
+        self.assertEqual(select_shard(self.files, 2, 3), shards[1])
+        self.assertEqual(assign_shards(list(reversed(self.files)), 3)[0],
+                         [f for f in reversed(self.files) if f in shards[0]])
+
+
+class TestMergeReports(unittest.TestCase):
+    """merge_reports() only accepts one complete set of shard reports."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, shard, files, detectors=('LongMethod',)):
+        report = {'active_detectors': list(detectors),
+                  'results': [{'file': f, 'smells': []} for f in files]}
+        if shard is not None:
+            report['shard'] = shard
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w') as f:
+            json.dump(report, f)
+        return path
+
+    def test_complete_set_is_merged_in_path_order(self):
+        paths = [self.write('b.json', '2/2', ['b.py', 'a.py']), self.write('a.json', '1/2', ['c.py'])]
+        detectors, results = merge_reports(paths)
+        self.assertEqual(detectors, ['LongMethod'])
+        self.assertEqual([r['file'] for r in results], ['a.py', 'b.py', 'c.py'])
+
+    def test_missing_shard_is_an_error(self):
+        paths = [self.write('1.json', '1/3', ['a.py']), self.write('3.json', '3/3', ['c.py'])]
+        with self.assertRaisesRegex(ValueError, 'Missing shard'):
+            merge_reports(paths)
+
+    def test_duplicate_shard_is_an_error(self):
+        paths = [self.write('1.json', '1/2', ['a.py']), self.write('1b.json', '1/2', ['b.py'])]
+        with self.assertRaisesRegex(ValueError, 'appears twice'):
+            merge_reports(paths)
+
+    def test_mismatched_shard_count_is_an_error(self):
+        paths = [self.write('1.json', '1/2', ['a.py']), self.write('2.json', '2/3', ['b.py'])]
+        with self.assertRaisesRegex(ValueError, 'shards'):
+            merge_reports(paths)
+
+    def test_report_without_shard_is_an_error(self):
+        with self.assertRaisesRegex(ValueError, 'no shard'):
+            merge_reports([self.write('full.json', None, ['a.py'])])
+
+    def test_different_detectors_are_an_error(self):
+        paths = [self.write('1.json', '1/2', ['a.py']),
+                 self.write('2.json', '2/2', ['b.py'], detectors=('GodClass',))]
+        with self.assertRaisesRegex(ValueError, 'different active detectors'):
+            merge_reports(paths)
+
+    def test_merge_command_exits_non_zero_on_missing_shard(self):
+        path = self.write('1.json', '1/2', ['a.py'])
+        completed = subprocess.run([sys.executable, 'main.py', 'merge', path], cwd=DETECTOR_DIR,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        self.assertEqual(completed.returncode, 1)
+        self.assertIn('Missing shard(s) 2 of 2', completed.stdout)
+
+
+class TestShardCombinations(unittest.TestCase):
+    """Options that only apply to files on disk are rejected elsewhere."""
+
+    def run_main(self, *args):
+        return subprocess.run([sys.executable, 'main.py'] + list(args), cwd=DETECTOR_DIR,
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+    def test_shard_with_git_ref_is_rejected(self):
+        completed = self.run_main('--shard', '1/2', '--git-ref', 'HEAD', '.')
+        self.assertEqual(completed.returncode, 1)
+        self.assertIn("--shard can't be combined with --git-ref", completed.stdout)
+
+    def test_jobs_and_io_threads_with_staged_are_rejected(self):
+        completed = self.run_main('--jobs', '2', '--io-threads', '2', '--staged', '.')
+        self.assertEqual(completed.returncode, 1)
+        self.assertIn("--jobs, --io-threads can't be combined with --staged", completed.stdout)
+
+    def test_shard_with_clones_is_rejected(self):
+        for action in ('update', 'query', 'scan'):
+            completed = self.run_main('clones', action, '--shard', '1/2', '.')
+            self.assertEqual(completed.returncode, 1)
+            self.assertIn("--shard can't be combined with clones", completed.stdout)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+Unit tests for reading and decoding sources from bytes.
+"""
+
+import io
+import os
+import tarfile
+import tempfile
+import unittest
+import zipfile
+
+from sources import (decode_source, read_source_file, iter_archive_sources,
+                     SourceTooLarge)
+from clone_index import read_source
+
+
+SOURCE = "def f():\n    return 'café'\n"
+
+
+class TestDecodeSource(unittest.TestCase):
+    """Bytes decode to the text a text-mode read would give."""
+
+    def test_line_endings_are_translated(self):
+        for newline in ('\r\n', '\r'):
+            data = SOURCE.replace('\n', newline).encode('utf-8')
+            self.assertEqual(decode_source(data), SOURCE)
+
+    def test_coding_comment_is_honoured(self):
+        text = "# -*- coding: latin-1 -*-\n" + SOURCE
+        self.assertEqual(decode_source(text.encode('latin-1')), text)
+
+    def test_utf8_bom_is_dropped(self):
+        self.assertEqual(decode_source(b'\xef\xbb\xbf' + SOURCE.encode('utf-8')), SOURCE)
+
+    def test_unknown_coding_is_a_syntax_error(self):
+        with self.assertRaises(SyntaxError):
+            decode_source(b"# coding: no-such-codec\nx = 1\n")
+
+
+class TestReadSourceFile(unittest.TestCase):
+    """Files on disk and in archives are read the same way."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, data):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_cr_only_file(self):
+        path = self.write('mac.py', SOURCE.replace('\n', '\r').encode('utf-8'))
+        self.assertEqual(read_source_file(path), SOURCE)
+
+    def test_size_limit(self):
+        path = self.write('big.py', b'x = 1\n' * 10)
+        self.assertEqual(read_source_file(path, max_size=60), 'x = 1\n' * 10)
+        with self.assertRaises(SourceTooLarge):
+            read_source_file(path, max_size=59)
+
+    def test_clone_index_reads_coding_comment(self):
+        text = "# coding: latin-1\n" + SOURCE
+        source, error = read_source(self.write('latin.py', text.replace('\n', '\r\n').encode('latin-1')))
+        self.assertIsNone(error)
+        self.assertEqual(source, text)
+
+    def test_clone_index_returns_errors(self):
+        source, error = read_source(self.write('bad.py', b"# coding: no-such-codec\n"))
+        self.assertIsNone(source)
+        self.assertIn('no-such-codec', error)
+
+    def test_archive_members_in_order(self):
+        zip_path = os.path.join(self.tmp.name, 'pkg.zip')
+        with zipfile.ZipFile(zip_path, 'w') as archive:
+            archive.writestr('pkg/b.py', SOURCE.replace('\n', '\r\n'))
+            archive.writestr('pkg/a.py', SOURCE)
+            archive.writestr('pkg/data.txt', 'not python')
+        tar_path = os.path.join(self.tmp.name, 'pkg.tar.gz')
+        with tarfile.open(tar_path, 'w:gz') as archive:
+            for name in ('pkg/b.py', 'pkg/a.py'):
+                data = SOURCE.encode('utf-8')
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+        for path in (zip_path, tar_path):
+            members = [(name, decode_source(data)) for name, data in iter_archive_sources(path)]
+            self.assertEqual(members, [(f'{path}!/pkg/b.py', SOURCE), (f'{path}!/pkg/a.py', SOURCE)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+"""
+Unit tests for Chrome trace-event recording.
+"""
+
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from tracing import Tracer
+
+
+GOLDEN = {
+    'traceEvents': [
+        {'ph': 'M', 'name': 'process_name', 'pid': 100, 'tid': 0, 'args': {'name': 'main'}},
+        {'ph': 'M', 'name': 'thread_name', 'pid': 100, 'tid': 7, 'args': {'name': 'MainThread'}},
+        {'ph': 'M', 'name': 'process_name', 'pid': 200, 'tid': 0, 'args': {'name': 'worker 200'}},
+        {'ph': 'M', 'name': 'thread_name', 'pid': 200, 'tid': 9, 'args': {'name': 'MainThread'}},
+        {'ph': 'X', 'name': 'file', 'cat': 'file', 'ts': 1000, 'dur': 50, 'pid': 100, 'tid': 7,
+         'args': {'file': 'a.py'}},
+        {'ph': 'X', 'name': 'ast.parse', 'cat': 'parse', 'ts': 1010, 'dur': 20, 'pid': 100,
+         'tid': 7},
+        {'ph': 'X', 'name': 'LongMethod', 'cat': 'detect', 'ts': 1020, 'dur': 5, 'pid': 200,
+         'tid': 9, 'args': {'file': 'b.py'}},
+    ],
+    'displayTimeUnit': 'ms'
+}
+
+
+class TestTraceFile(unittest.TestCase):
+    """Written traces have the Trace Event Format shape viewers expect."""
+
+    maxDiff = None
+
+    def record(self, pid, tid, times, process_name, spans):
+        clock = iter(times)
+        with mock.patch('tracing.os.getpid', return_value=pid), \
+                mock.patch('tracing.threading.get_native_id', return_value=tid), \
+                mock.patch('tracing._now_us', lambda: next(clock)):
+            tracer = Tracer(process_name=process_name)
+            spans(tracer)
+        return tracer
+
+    def test_trace_matches_golden(self):
+        def main_spans(tracer):
+            with tracer.span('file', 'file', file='a.py'):
+                with tracer.span('ast.parse', 'parse'):
+                    pass
+
+        def worker_spans(tracer):
+            with tracer.span('LongMethod', 'detect', file='b.py'):
+                pass
+
+        tracer = self.record(100, 7, [1000, 1010, 1030, 1050], 'main', main_spans)
+        worker = self.record(200, 9, [1020, 1025], 'worker 200', worker_spans)
+        tracer.extend(worker.drain())
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'trace.json')
+            tracer.write(path)
+            with open(path) as f:
+                self.assertEqual(json.load(f), GOLDEN)
+
+    def test_each_drained_batch_names_its_threads(self):
+        batches = []
+
+        def spans(tracer):
+            for name in ('one', 'two'):
+                with tracer.span(name, 'x'):
+                    pass
+                batches.append([event['name'] for event in tracer.drain()])
+
+        tracer = self.record(100, 7, [1, 2, 3, 4], 'main', spans)
+        self.assertEqual(batches, [['process_name', 'thread_name', 'one'], ['thread_name', 'two']])
+        self.assertEqual(tracer.events, [])
+
+    def test_disabled_tracer_records_nothing(self):
+        tracer = Tracer(enabled=False)
+        with tracer.span('file', 'file'):
+            pass
+        self.assertEqual(tracer.events, [])
+
+
+if __name__ == '__main__':
+    unittest.main()